@@ -0,0 +1,1194 @@
+#
+# A stand-in for the `lldb` module with a configurable, fully synthetic
+# inferior.
+#
+# Only the part of the SB API that vim-lldb uses is implemented. The shape of
+# the stopped process is set by a World:
+#
+#   import fake_lldb
+#   fake_lldb.world = fake_lldb.World(threads=1000, frames=50, breakpoints=20,
+#                                     variables=100, source="/tmp/main.c")
+#   sys.modules['lldb'] = fake_lldb
+#
+# Stepping moves the PC of the selected thread one line down and produces a
+# stopped event, like a real step would. Frames are "unwound" on demand; the
+# World counts how many were unwound and can spin for unwind_cost seconds per
+# frame to model the cost of a real unwinder.
+#
+
+import collections
+import itertools
+import json
+import os
+import time
+
+# ----------------------------------------------------------------------
+# Constants
+
+(eStateInvalid, eStateUnloaded, eStateConnected, eStateAttaching, eStateLaunching,
+ eStateStopped, eStateRunning, eStateStepping, eStateCrashed, eStateDetached,
+ eStateExited, eStateSuspended) = range(12)
+
+(eStopReasonInvalid, eStopReasonNone, eStopReasonTrace, eStopReasonBreakpoint,
+ eStopReasonWatchpoint, eStopReasonSignal, eStopReasonException, eStopReasonExec,
+ eStopReasonPlanComplete, eStopReasonThreadExiting, eStopReasonInstrumentation) = range(11)
+
+(eDescriptionLevelBrief, eDescriptionLevelFull, eDescriptionLevelVerbose,
+ eDescriptionLevelInitial) = range(4)
+
+(eByteOrderInvalid, eByteOrderBig, eByteOrderPDP, eByteOrderLittle) = range(4)
+
+(eSymbolTypeInvalid, eSymbolTypeAbsolute, eSymbolTypeCode) = range(3)
+
+eTypeClassBuiltin = 1 << 0
+eTypeClassEnumeration = 1 << 5
+eTypeClassPointer = 1 << 13
+eTypeClassStruct = 1 << 16
+
+LLDB_INVALID_ADDRESS = 0xffffffffffffffff
+
+# Words that synthetic symbol names are made of
+SYMBOL_WORDS = ["vector", "map", "string", "alloc", "node", "parse", "handle", "request",
+                "server", "buffer", "insert", "erase", "find", "update", "detail", "socket"]
+
+
+class World(object):
+    """ Shape of the synthetic inferior """
+
+    def __init__(self, threads=1, frames=10, breakpoints=0, variables=10,
+                 source=None, unwind_cost=0.0, base_line=10, symbols=100, latency=0.0,
+                 stacks=0, runs=False):
+        self.threads = threads
+        self.frames = frames
+        self.breakpoints = breakpoints
+        self.variables = variables
+        self.source = source or os.path.abspath("bench_main.c")
+        self.unwind_cost = unwind_cost
+        self.base_line = base_line
+        self.symbols = symbols
+
+        # Seconds per packet to a remote lldb-server; with a latency, the target is on
+        # a remote-linux platform and every variable or register read is a round trip
+        self.latency = latency
+
+        # With stacks, thread N is parked in the same stack (same PCs) as the threads
+        # whose index ID is N modulo stacks
+        self.stacks = stacks
+
+        # With runs, a continued process runs until it is stopped (SBProcess.Stop)
+        # instead of stopping again at once, like a step
+        self.runs = runs
+
+        # Statistics
+        self.unwound_frames = 0
+        self.round_trips = 0
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+world = World()
+
+
+def spin(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+# ----------------------------------------------------------------------
+# Plain data objects
+
+class SBError(object):
+
+    def __init__(self, message=None):
+        self.message = message
+
+    def Success(self):
+        return self.message is None
+
+    def Fail(self):
+        return self.message is not None
+
+    def SetErrorString(self, message):
+        self.message = message
+
+    def GetCString(self):
+        return self.message
+
+    def __str__(self):
+        return self.message or "success"
+
+
+class SBStream(object):
+
+    def __init__(self):
+        self.data = []
+
+    def Print(self, s):
+        self.data.append(s)
+
+    def GetData(self):
+        return "".join(self.data)
+
+
+class SBStringList(object):
+
+    def __init__(self):
+        self.strings = []
+
+    def AppendString(self, s):
+        self.strings.append(s)
+
+    def GetSize(self):
+        return len(self.strings)
+
+    def GetStringAtIndex(self, i):
+        return self.strings[i]
+
+
+class SBFileSpec(object):
+
+    def __init__(self, path=None, resolve=False):
+        self.path = path
+
+    def IsValid(self):
+        return self.path is not None
+
+    def GetDirectory(self):
+        return os.path.dirname(self.path) if self.path else None
+
+    def GetFilename(self):
+        return os.path.basename(self.path) if self.path else None
+
+    def __bool__(self):
+        return self.IsValid()
+    __nonzero__ = __bool__
+
+
+class SBLineEntry(object):
+
+    def __init__(self, path=None, line=0, column=0):
+        self.spec = SBFileSpec(path)
+        self.line = line
+        self.column = column
+
+    def IsValid(self):
+        return self.spec.IsValid()
+
+    def GetFileSpec(self):
+        return self.spec
+
+    def GetLine(self):
+        return self.line
+
+    def GetColumn(self):
+        return self.column
+
+
+class SBModule(object):
+
+    def __init__(self, path=None):
+        self.spec = SBFileSpec(path)
+
+    def IsValid(self):
+        return self.spec.IsValid()
+
+    def GetFileSpec(self):
+        return self.spec
+
+    def GetUUIDString(self):
+        return "00000000-0000-0000-0000-%012x" % (hash(self.spec.path) & 0xffffffffffff)
+
+    def GetNumSymbols(self):
+        return world.symbols
+
+    def GetSymbolAtIndex(self, i):
+        w = SYMBOL_WORDS
+        n = len(w)
+        return SBSymbol("%s::%s::%s_%d(int, char const*)" % (
+            w[i % n], w[(i // n) % n], w[(i // (n * n)) % n], i), 0x1000 + 16 * i)
+
+    def ResolveFileAddress(self, addr):
+        return SBAddress(addr)
+
+    def GetNumCompileUnits(self):
+        return 1
+
+
+class SBAddress(object):
+
+    def __init__(self, addr=LLDB_INVALID_ADDRESS):
+        self.addr = addr
+
+    def IsValid(self):
+        return self.addr != LLDB_INVALID_ADDRESS
+
+    def GetLoadAddress(self, target):
+        return self.addr
+
+    def GetFileAddress(self):
+        return self.addr
+
+    def GetModule(self):
+        return SBModule("/tmp/a.out")
+
+    def GetSymbol(self):
+        # The function of the frame whose PC this is (see SBFrame.GetPC)
+        return SBSymbol("function_%d" % ((self.addr % 0x10000) // 0x40 % 7),
+                        self.addr - self.addr % 16)
+
+
+class SBSymbol(object):
+
+    def __init__(self, name=None, start=LLDB_INVALID_ADDRESS):
+        self.name = name
+        self.start = start
+
+    def IsValid(self):
+        return self.name is not None
+
+    def GetName(self):
+        return self.name
+
+    def GetType(self):
+        return eSymbolTypeCode
+
+    def GetStartAddress(self):
+        return SBAddress(self.start)
+
+
+class SBBlock(object):
+
+    def __init__(self, key):
+        self.key = key
+
+    def IsValid(self):
+        return True
+
+    def GetDescription(self, stream):
+        stream.Print("block %s" % (self.key,))
+        return True
+
+
+class SBType(object):
+
+    def __init__(self, name, type_class=eTypeClassBuiltin, size=4):
+        self.name = name
+        self.type_class = type_class
+        self.size = size
+
+    def GetTypeClass(self):
+        return self.type_class
+
+    def GetByteSize(self):
+        return self.size
+
+
+class SBData(object):
+
+    def __init__(self):
+        self.data = b""
+
+    def SetData(self, error, data, byte_order, address_size):
+        self.data = bytes(data)
+
+
+class SBValue(object):
+
+    def __init__(self, name, type_name, value, children=None, address=None):
+        self.name = name
+        self.type_name = type_name
+        self.value = value
+        self.children = children or []
+        # Stack address of a variable; reading its value is then a memory read
+        self.address = address
+
+    def IsValid(self):
+        return True
+
+    def GetLoadAddress(self):
+        return self.address if self.address is not None else LLDB_INVALID_ADDRESS
+
+    def GetType(self):
+        return SBType(self.type_name, eTypeClassBuiltin if self.type_name == "int" else
+                      eTypeClassStruct)
+
+    def CreateValueFromData(self, name, data, type):
+        return SBValue(name, type.name, str(int.from_bytes(data.data, "little")))
+
+    def GetName(self):
+        return self.name
+
+    def GetTypeName(self):
+        return self.type_name
+
+    def GetValue(self):
+        if self.address is not None:
+            world.round_trip()
+        return self.value
+
+    def GetValueAsUnsigned(self, fail_value=0):
+        try:
+            return int(self.value, 0)
+        except (TypeError, ValueError):
+            return fail_value
+
+    def GetSummary(self):
+        return None
+
+    def GetError(self):
+        return SBError()
+
+    def GetNumChildren(self):
+        return len(self.children)
+
+    def GetChildAtIndex(self, i):
+        return self.children[i]
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def __len__(self):
+        return len(self.children)
+
+
+class SBValueList(object):
+
+    def __init__(self, values):
+        self.values = values
+
+    def GetSize(self):
+        return len(self.values)
+
+    def GetValueAtIndex(self, i):
+        return self.values[i]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+
+# ----------------------------------------------------------------------
+# Events
+
+class SBEvent(object):
+
+    def __init__(self):
+        self.process = None
+        self.state = eStateInvalid
+        self.type = 0
+
+    def set(self, other):
+        self.process = other.process
+        self.state = other.state
+        self.type = other.type
+
+    def IsValid(self):
+        return self.process is not None
+
+    def GetType(self):
+        return self.type
+
+
+class SBBroadcaster(object):
+
+    def __init__(self):
+        self.listeners = []
+
+    def AddListener(self, listener, mask):
+        # Like lldb, adding a listener again adds to the events it gets
+        for (i, (l, m)) in enumerate(self.listeners):
+            if l is listener:
+                self.listeners[i] = (l, m | mask)
+                return mask
+        self.listeners.append((listener, mask))
+        return mask
+
+    def RemoveListener(self, listener, mask=0):
+        self.listeners = [(l, m) for (l, m) in self.listeners if l is not listener]
+        return True
+
+    def broadcast(self, event):
+        for (listener, mask) in self.listeners:
+            if mask & event.type:
+                listener.queue.append(event)
+
+
+class SBListener(object):
+
+    def __init__(self, name=""):
+        self.name = name
+        self.queue = collections.deque()
+
+    def IsValid(self):
+        return True
+
+    def PeekAtNextEvent(self, event):
+        if len(self.queue) == 0:
+            return False
+        event.set(self.queue[0])
+        return True
+
+    def GetNextEvent(self, event):
+        if len(self.queue) == 0:
+            return False
+        event.set(self.queue.popleft())
+        return True
+
+    def WaitForEvent(self, seconds, event):
+        # Nothing runs concurrently in the fake world, so there is nothing to wait for
+        if not self.GetNextEvent(event):
+            # Like lldb, a timeout leaves the event invalid
+            event.set(SBEvent())
+            return False
+        return True
+
+
+# ----------------------------------------------------------------------
+# Process model
+
+class SBFrame(object):
+
+    def __init__(self, thread, index):
+        self.thread = thread
+        self.index = index
+
+    def IsValid(self):
+        return self.thread is not None
+
+    def GetFrameID(self):
+        return self.index
+
+    def GetThread(self):
+        return self.thread
+
+    def GetPC(self):
+        stack = self.thread.index_id
+        if world.stacks:
+            stack = stack % world.stacks
+        return 0x100000000 + stack * 0x10000 + self.index * 0x40 + 1 + self.line() % 15
+
+    def GetSP(self):
+        return 0x7ff000000000 - self.thread.index_id * 0x100000 - self.index * 0x80
+
+    def GetPCAddress(self):
+        return SBAddress(self.GetPC())
+
+    def GetModule(self):
+        return SBModule("/usr/lib/libbench.so" if self.index % 3 else "/tmp/a.out")
+
+    def GetFunctionName(self):
+        if self.index == self.thread.num_frames - 1:
+            return "main"
+        return "function_%d" % (self.index % 7)
+
+    GetDisplayFunctionName = GetFunctionName
+
+    def GetSymbol(self):
+        return SBSymbol(self.GetFunctionName(), self.GetPC() - self.GetPC() % 16)
+
+    def line(self):
+        return self.thread.line if self.index == 0 else world.base_line + self.index % 50
+
+    def GetLineEntry(self):
+        return SBLineEntry(world.source, self.line(), 1)
+
+    def GetBlock(self):
+        return SBBlock((self.thread.index_id, self.index))
+
+    def GetVariables(self, arguments, locals, statics, in_scope_only):
+        stop = self.thread.process.stop_id
+        return SBValueList([SBValue("var%d" % i, "int", str((stop * (i + 1)) % 97),
+                                    address=self.GetSP() + 16 + 4 * i)
+                            for i in range(world.variables)])
+
+    def FindVariable(self, name):
+        for v in self.GetVariables(True, True, True, True):
+            if v.GetName() == name:
+                return v
+        return SBValue(name, None, None)
+
+    GetValueForVariablePath = FindVariable
+
+    def EvaluateExpression(self, expression):
+        return SBValue(expression, "int", "0")
+
+    def GetRegisters(self):
+        world.round_trip()
+        stop = self.thread.process.stop_id
+        sets = []
+        for (name, count) in (("General Purpose Registers", 24),
+                              ("Floating Point Registers", 16),
+                              ("Exception State Registers", 3)):
+            regs = [SBValue("r%d" % i, "unsigned long", "0x%016x" % ((stop + 1) * (i + 1)))
+                    for i in range(count)]
+            sets.append(SBValue(name, None, None, regs))
+        return SBValueList(sets)
+
+    def GetDescription(self, stream):
+        stream.Print("frame #%d: 0x%016x a.out`%s at %s:%d\n" % (
+            self.index, self.GetPC(), self.GetFunctionName(),
+            os.path.basename(world.source), self.line()))
+        return True
+
+    def __bool__(self):
+        return self.IsValid()
+    __nonzero__ = __bool__
+
+
+class SBThread(object):
+
+    def __init__(self, process, index_id):
+        self.process = process
+        self.index_id = index_id
+        self.num_frames = world.frames
+        self.unwound = 0
+        self.selected_frame = 0
+        self.line = world.base_line
+        # The breakpoint location the last step stopped at, if any
+        self.hit = None
+
+    def IsValid(self):
+        return self.process is not None
+
+    def GetIndexID(self):
+        return self.index_id
+
+    def GetThreadID(self):
+        return 0x1000 + self.index_id
+
+    def GetName(self):
+        return "worker-%d" % (self.index_id % 16) if self.index_id > 1 else "main"
+
+    def GetProcess(self):
+        return self.process
+
+    def GetStopReason(self):
+        if self is self.process.selected_thread():
+            if self.hit is None and self.process.stop_id > 1:
+                return eStopReasonPlanComplete
+            return eStopReasonBreakpoint
+        return eStopReasonNone
+
+    def GetStopReasonDataAtIndex(self, i):
+        return 0
+
+    def GetStopDescription(self, size):
+        if self is self.process.selected_thread():
+            if self.hit is not None:
+                return "breakpoint %d.%d" % (self.hit.breakpoint.id, self.hit.index + 1)
+            return "step over" if self.process.stop_id > 1 else "breakpoint 1.1"
+        return None
+
+    def unwind(self, index):
+        if index >= self.unwound:
+            count = min(index + 1, self.num_frames) - self.unwound
+            world.unwound_frames += count
+            if world.unwind_cost:
+                spin(count * world.unwind_cost)
+            self.unwound += count
+
+    def GetNumFrames(self):
+        self.unwind(self.num_frames - 1)
+        return self.num_frames
+
+    def GetFrameAtIndex(self, i):
+        self.unwind(i)
+        if 0 <= i < self.num_frames:
+            return SBFrame(self, i)
+        return SBFrame(None, 0)
+
+    def GetSelectedFrame(self):
+        return self.GetFrameAtIndex(self.selected_frame)
+
+    def SetSelectedFrame(self, i):
+        if 0 <= i < self.num_frames:
+            self.selected_frame = i
+            return SBFrame(self, i)
+        return SBFrame(None, 0)
+
+    def step(self, lines):
+        self.line += lines
+        self.selected_frame = 0
+        self.hit = None
+        for bp in self.process.target.breakpoints:
+            for loc in bp.locations:
+                if bp.enabled and loc.line == self.line:
+                    self.hit = loc
+        self.process.stopped()
+
+    def StepOver(self, *args):
+        self.step(1)
+
+    def StepInto(self, *args):
+        self.step(1)
+
+    def StepOut(self, *args):
+        self.step(2)
+
+    def StepInstruction(self, step_over, *args):
+        self.step(0)
+
+    def __iter__(self):
+        return (self.GetFrameAtIndex(i) for i in range(self.GetNumFrames()))
+
+    def __bool__(self):
+        return self.IsValid()
+    __nonzero__ = __bool__
+
+
+_pids = itertools.count(4242)
+
+
+class SBProcess(object):
+    eBroadcastBitStateChanged = 1 << 0
+    eBroadcastBitInterrupt = 1 << 1
+    eBroadcastBitSTDOUT = 1 << 2
+    eBroadcastBitSTDERR = 1 << 3
+    eBroadcastBitProfileData = 1 << 4
+    eBroadcastBitStructuredData = 1 << 5
+
+    def __init__(self, target=None):
+        self.target = target
+        self.state = eStateStopped
+        self.stop_id = 0
+        self.pid = next(_pids)
+        self.threads = [SBThread(self, i + 1) for i in range(world.threads)] if target else []
+        self.selected = 0
+        self.broadcaster = SBBroadcaster()
+        self.stdout = ""
+        self.stderr = ""
+
+    def IsValid(self):
+        return self.target is not None
+
+    def GetTarget(self):
+        return self.target
+
+    def GetProcessID(self):
+        return self.pid
+
+    def GetState(self):
+        return self.state
+
+    def GetStopID(self, include_expression_stops=False):
+        return self.stop_id
+
+    def GetBroadcaster(self):
+        return self.broadcaster
+
+    def GetNumThreads(self):
+        return len(self.threads)
+
+    def GetThreadAtIndex(self, i):
+        if 0 <= i < len(self.threads):
+            return self.threads[i]
+        return SBThread(None, 0)
+
+    def GetThreadByIndexID(self, index_id):
+        for t in self.threads:
+            if t.index_id == index_id:
+                return t
+        return SBThread(None, 0)
+
+    def selected_thread(self):
+        return self.threads[self.selected] if self.threads else SBThread(None, 0)
+
+    def GetSelectedThread(self):
+        return self.selected_thread()
+
+    def SetSelectedThreadByIndexID(self, index_id):
+        for (i, t) in enumerate(self.threads):
+            if t.index_id == index_id:
+                self.selected = i
+                return True
+        return False
+
+    def SetSelectedThread(self, thread):
+        return self.SetSelectedThreadByIndexID(thread.GetIndexID())
+
+    def stopped(self):
+        """ Model the process stopping: new stop ID, caches invalidated, event sent """
+        self.stop_id += 1
+        self.state = eStateStopped
+        for t in self.threads:
+            t.unwound = 0
+        event = SBEvent()
+        event.process = self
+        event.state = eStateStopped
+        event.type = SBProcess.eBroadcastBitStateChanged
+        self.broadcaster.broadcast(event)
+
+    def Continue(self):
+        if not world.runs:
+            self.stopped()
+            return SBError()
+        self.state = eStateRunning
+        event = SBEvent()
+        event.process = self
+        event.state = eStateRunning
+        event.type = SBProcess.eBroadcastBitStateChanged
+        self.broadcaster.broadcast(event)
+        return SBError()
+
+    def Stop(self):
+        if self.state == eStateRunning:
+            self.stopped()
+        return SBError()
+
+    def Kill(self):
+        self.state = eStateExited
+        return SBError()
+
+    def Destroy(self):
+        return self.Kill()
+
+    def Detach(self):
+        self.state = eStateDetached
+        return SBError()
+
+    def write(self, text, stderr=False):
+        """ Simulates the inferior writing text """
+        if stderr:
+            self.stderr += text
+        else:
+            self.stdout += text
+        event = SBEvent()
+        event.process = self
+        event.type = SBProcess.eBroadcastBitSTDERR if stderr else SBProcess.eBroadcastBitSTDOUT
+        self.broadcaster.broadcast(event)
+
+    def GetByteOrder(self):
+        return eByteOrderLittle
+
+    def GetAddressByteSize(self):
+        return 8
+
+    def GetMemoryRegionInfo(self, address, region):
+        world.round_trip()
+        region.base = address - address % 0x100000
+        region.end = region.base + 0x100000
+        return SBError()
+
+    def ReadMemory(self, address, size, error):
+        """ Stack memory holds the variables of the frames of the selected thread """
+        world.round_trip()
+        memory = bytearray(size)
+        thread = self.selected_thread()
+        for i in set([0, thread.selected_frame]):
+            for v in SBFrame(thread, i).GetVariables(True, True, True, True):
+                offset = v.address - address
+                if 0 <= offset and offset + 4 <= size:
+                    memory[offset:offset + 4] = int(v.value).to_bytes(4, "little")
+        return bytes(memory)
+
+    def GetSTDOUT(self, size):
+        (data, self.stdout) = (self.stdout[:size], self.stdout[size:])
+        return data
+
+    def GetSTDERR(self, size):
+        (data, self.stderr) = (self.stderr[:size], self.stderr[size:])
+        return data
+
+    def __iter__(self):
+        return iter(list(self.threads))
+
+    def __bool__(self):
+        return self.IsValid()
+    __nonzero__ = __bool__
+
+    @staticmethod
+    def GetStateFromEvent(event):
+        return event.state
+
+    @staticmethod
+    def GetProcessFromEvent(event):
+        return event.process or SBProcess()
+
+    @staticmethod
+    def EventIsProcessEvent(event):
+        return event.process is not None
+
+    @staticmethod
+    def GetRestartedFromEvent(event):
+        return False
+
+
+class SBBreakpointLocation(object):
+
+    def __init__(self, breakpoint, index, line):
+        self.breakpoint = breakpoint
+        self.index = index
+        self.line = line
+
+    def IsValid(self):
+        return True
+
+    def IsResolved(self):
+        return True
+
+    def GetLoadAddress(self):
+        return 0x100000000 + self.line * 4
+
+    def GetAddress(self):
+        return SBAddress(self.GetLoadAddress())
+
+    def GetBreakpoint(self):
+        return self.breakpoint
+
+    def GetDescription(self, stream, level=eDescriptionLevelBrief):
+        stream.Print("%d.%d: where = a.out`function_%d + 4 at %s:%d:3, address = 0x%016x, resolved, hit count = 0" % (
+            self.breakpoint.id, self.index + 1, self.line % 7, world.source, self.line,
+            self.GetLoadAddress()))
+        return True
+
+
+class SBBreakpoint(object):
+
+    def __init__(self, bp_id=0, lines=()):
+        self.id = bp_id
+        self.locations = [SBBreakpointLocation(self, i, l) for (i, l) in enumerate(lines)]
+        self.enabled = True
+        self.callback = None
+
+    def IsValid(self):
+        return self.id != 0
+
+    def SetScriptCallbackFunction(self, name):
+        self.callback = name
+
+    def GetID(self):
+        return self.id
+
+    def GetNumLocations(self):
+        return len(self.locations)
+
+    def GetNumResolvedLocations(self):
+        return len(self.locations)
+
+    def GetLocationAtIndex(self, i):
+        return self.locations[i]
+
+    def IsEnabled(self):
+        return self.enabled
+
+    def SetEnabled(self, enabled):
+        self.enabled = enabled
+
+    def __bool__(self):
+        return self.IsValid()
+    __nonzero__ = __bool__
+
+
+class SBBreakpointList(object):
+
+    def __init__(self, target):
+        self.breakpoints = []
+
+    def Append(self, bp):
+        self.breakpoints.append(bp)
+
+    def GetSize(self):
+        return len(self.breakpoints)
+
+    def GetBreakpointAtIndex(self, i):
+        return self.breakpoints[i]
+
+
+class SBMemoryRegionInfo(object):
+
+    def __init__(self):
+        self.base = self.end = 0
+
+    def IsReadable(self):
+        return True
+
+    def GetRegionBase(self):
+        return self.base
+
+    def GetRegionEnd(self):
+        return self.end
+
+
+class SBPlatform(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def IsValid(self):
+        return True
+
+    def GetName(self):
+        return self.name
+
+
+class SBWatchpoint(object):
+    pass
+
+
+class SBLaunchInfo(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.listener = None
+
+    def SetListener(self, listener):
+        self.listener = listener
+
+
+class SBTarget(object):
+
+    def __init__(self, debugger=None, exe=None):
+        self.debugger = debugger
+        self.exe = exe
+        self.process = SBProcess()
+        self.breakpoints = []
+        self.next_bp_id = 1
+        if exe is not None:
+            for i in range(world.breakpoints):
+                self.add_breakpoint([world.base_line + i])
+
+    def IsValid(self):
+        return self.exe is not None
+
+    def ResolveLoadAddress(self, addr):
+        return SBAddress(addr)
+
+    def __bool__(self):
+        return self.IsValid()
+    __nonzero__ = __bool__
+
+    def GetExecutable(self):
+        return SBFileSpec(self.exe)
+
+    def GetProcess(self):
+        return self.process
+
+    def GetDebugger(self):
+        return self.debugger
+
+    def GetPlatform(self):
+        return SBPlatform("remote-linux" if world.latency else "host")
+
+    def GetBroadcaster(self):
+        return SBBroadcaster()
+
+    def Launch(self, launch_info, error):
+        self.process = SBProcess(self)
+        self.process.state = eStateLaunching
+        if launch_info.listener is not None:
+            self.process.broadcaster.AddListener(launch_info.listener,
+                                                 SBProcess.eBroadcastBitStateChanged)
+        self.process.stopped()
+        return self.process
+
+    def LoadCore(self, core, error=None):
+        self.process = SBProcess(self)
+        self.process.stop_id = 1
+        return self.process
+
+    def GetNumModules(self):
+        return 2
+
+    def GetModuleAtIndex(self, i):
+        return SBModule(("/tmp/a.out", "/usr/lib/libbench.so")[i])
+
+    def AttachToProcessWithName(self, listener, name, wait_for, error):
+        self.process = SBProcess(self)
+        self.process.broadcaster.AddListener(listener, SBProcess.eBroadcastBitStateChanged)
+        self.process.stopped()
+        return self.process
+
+    def add_breakpoint(self, lines):
+        bp = SBBreakpoint(self.next_bp_id, lines)
+        self.next_bp_id += 1
+        self.breakpoints.append(bp)
+        return bp
+
+    def GetNumBreakpoints(self):
+        return len(self.breakpoints)
+
+    def BreakpointsWriteToFile(self, spec, bp_list, append=False):
+        with open(spec.path, "w") as f:
+            json.dump([[l.line for l in bp.locations] for bp in bp_list.breakpoints], f)
+        return SBError()
+
+    def BreakpointsCreateFromFile(self, spec, bp_list):
+        try:
+            with open(spec.path) as f:
+                saved = json.load(f)
+        except (IOError, ValueError) as e:
+            return SBError(str(e))
+        for lines in saved:
+            bp_list.Append(self.add_breakpoint(lines))
+        return SBError()
+
+    def GetBreakpointAtIndex(self, i):
+        return self.breakpoints[i]
+
+    def FindBreakpointByID(self, bp_id):
+        for bp in self.breakpoints:
+            if bp.id == bp_id:
+                return bp
+        return SBBreakpoint()
+
+    def BreakpointCreateByLocation(self, file, line):
+        return self.add_breakpoint([line])
+
+    def BreakpointCreateByName(self, name, module=None):
+        return self.add_breakpoint([world.base_line])
+
+    def BreakpointCreateBySBAddress(self, address):
+        return self.add_breakpoint([world.base_line])
+
+    def BreakpointDelete(self, bp_id):
+        n = len(self.breakpoints)
+        self.breakpoints = [bp for bp in self.breakpoints if bp.id != bp_id]
+        return len(self.breakpoints) != n
+
+
+class SBCommandReturnObject(object):
+
+    def __init__(self):
+        self.output = ""
+        self.error = ""
+        self.status = True
+
+    def Succeeded(self):
+        return self.status
+
+    def GetOutput(self):
+        return self.output
+
+    def GetError(self):
+        return self.error
+
+    def Clear(self):
+        self.__init__()
+
+
+class SBCommandInterpreter(object):
+    """ Produces canned output of roughly the right size for the commands the panes run """
+
+    def __init__(self, debugger):
+        self.debugger = debugger
+
+    def HandleCompletion(self, line, cursor, match_start, max_return, matches):
+        return 0
+
+    def HandleCommand(self, cmd, result, add_to_history=False):
+        target = self.debugger.GetSelectedTarget()
+        process = target.GetProcess()
+        words = cmd.split()
+        lines = []
+        if words[:2] == ["breakpoint", "list"]:
+            for bp in target.breakpoints:
+                lines.append("%d: file = '%s', locations = %d" % (
+                    bp.id, world.source, bp.GetNumLocations()))
+                for loc in bp.locations:
+                    s = SBStream()
+                    loc.GetDescription(s)
+                    lines.append("  " + s.GetData())
+        elif words[:2] == ["breakpoint", "set"] and "-l" in words:
+            bp = target.add_breakpoint([int(words[words.index("-l") + 1])])
+            lines.append("Breakpoint %d: where = a.out`main at %s" % (bp.id, world.source))
+        elif words[:2] == ["breakpoint", "delete"]:
+            for w in words[2:]:
+                target.BreakpointDelete(int(w))
+        elif words[:1] == ["disassemble"]:
+            pc = process.GetSelectedThread().GetFrameAtIndex(0).GetPC() if process else 0
+            for i in range(20):
+                lines.append("%s 0x%x <+%d>: movl   $0x%x, -0x%x(%%rbp)" % (
+                    "->" if i == 0 else "  ", pc + 4 * i, 4 * i, i, 4 * i))
+        elif words[:2] == ["process", "status"]:
+            lines.append("Process %d stopped" % process.GetProcessID())
+        elif words[:2] == ["thread", "list"]:
+            for t in process:
+                lines.append("  thread #%d: tid = 0x%x" % (t.index_id, t.GetThreadID()))
+        elif words[:1] == ["bt"]:
+            t = process.GetSelectedThread()
+            for f in t:
+                s = SBStream()
+                f.GetDescription(s)
+                lines.append("  " + s.GetData())
+        result.output = "\n".join(lines)
+        result.status = True
+        return 0
+
+
+class SBDebugger(object):
+
+    @staticmethod
+    def Create(source_init_files=False):
+        return SBDebugger()
+
+    @staticmethod
+    def Initialize():
+        pass
+
+    def __init__(self):
+        self.async_mode = True
+        self.targets = []
+        self.selected = None
+        self.interpreter = SBCommandInterpreter(self)
+
+    def IsValid(self):
+        return True
+
+    def SetAsync(self, async_mode):
+        self.async_mode = async_mode
+
+    def GetAsync(self):
+        return self.async_mode
+
+    def SetUseColor(self, use_color):
+        return True
+
+    @staticmethod
+    def StateAsCString(state):
+        return {eStateStopped: "stopped", eStateRunning: "running", eStateExited: "exited",
+                eStateCrashed: "crashed", eStateLaunching: "launching"}.get(state, "invalid")
+
+    def GetCommandInterpreter(self):
+        return self.interpreter
+
+    def CreateTarget(self, exe, triple=None, platform=None, add_dependent=True, error=None):
+        target = SBTarget(self, os.path.abspath(exe) if exe else "")
+        self.targets.append(target)
+        self.selected = target
+        return target
+
+    def DeleteTarget(self, target):
+        if target in self.targets:
+            self.targets.remove(target)
+        return True
+
+    def GetNumTargets(self):
+        return len(self.targets)
+
+    def GetTargetAtIndex(self, i):
+        return self.targets[i]
+
+    def GetIndexOfTarget(self, target):
+        return self.targets.index(target) if target in self.targets else 0xffffffff
+
+    def GetSelectedTarget(self):
+        return self.selected or SBTarget()
+
+    def SetSelectedTarget(self, target):
+        self.selected = target
+
+    def HandleCommand(self, cmd):
+        self.interpreter.HandleCommand(cmd, SBCommandReturnObject())
+
+    def Terminate(self):
+        pass
+
+    @staticmethod
+    def Destroy(debugger):
+        pass
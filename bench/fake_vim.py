@@ -0,0 +1,375 @@
+#
+# A stand-in for Vim's embedded `vim` module.
+#
+# It simulates just enough of Vim for the plugin to run headless: buffers,
+# windows (a flat list, like :wincmd w sees them), the cursor, signs and
+# matches. Every vim.command/vim.eval call is counted so benchmarks can
+# report how chatty a refresh is.
+#
+# Install it before importing any plugin module:
+#
+#   import fake_vim
+#   sys.modules['vim'] = fake_vim.FakeVim(settings={'s:lldb_async': 1})
+#
+
+import collections
+import os
+import re
+
+
+class error(Exception):
+    """ Mirrors vim.error """
+    pass
+
+
+class Buffer(object):
+
+    def __init__(self, number, name):
+        self.number = number
+        self.name = name
+        self.lines = ['']
+        self.valid = True
+        self.vars = {}
+        self.options = {}
+
+    def __dir__(self):
+        # Vim returns an empty dir() for a wiped-out buffer; vim_panes relies on it.
+        return ['append', 'name', 'number', 'valid', 'vars'] if self.valid else []
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __getitem__(self, i):
+        return self.lines[i]
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            self.lines[i] = list(value)
+        else:
+            self.lines[i] = value
+        if len(self.lines) == 0:
+            self.lines = ['']
+
+    def __delitem__(self, i):
+        del self.lines[i]
+        if len(self.lines) == 0:
+            self.lines = ['']
+
+    def append(self, lines, nr=None):
+        if not isinstance(lines, list):
+            lines = [lines]
+        if nr is None:
+            nr = len(self.lines)
+        self.lines[nr:nr] = lines
+
+
+class BufferList(object):
+    """ Mirrors vim.buffers: iterates the buffers, indexed by buffer number """
+
+    def __init__(self, buffer_map):
+        self.buffer_map = buffer_map
+
+    def __iter__(self):
+        return iter([b for b in self.buffer_map.values() if b.valid])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __getitem__(self, number):
+        b = self.buffer_map.get(number)
+        if b is None or not b.valid:
+            raise KeyError(number)
+        return b
+
+
+class Window(object):
+
+    def __init__(self, buffer, height=20, width=80):
+        self.buffer = buffer
+        self._cursor = (1, 0)
+        self.height = height
+        self.width = width
+        self.valid = True
+        self.vars = {}
+        self.options = {}
+
+    @property
+    def cursor(self):
+        line = min(self._cursor[0], len(self.buffer))
+        return (max(line, 1), self._cursor[1])
+
+    @cursor.setter
+    def cursor(self, value):
+        (line, col) = value
+        if line < 1 or line > len(self.buffer):
+            raise error("cursor position outside buffer")
+        self._cursor = (line, col)
+
+
+class Current(object):
+
+    def __init__(self, vim):
+        self.vim = vim
+
+    @property
+    def window(self):
+        return self.vim.windows[self.vim.current_index]
+
+    @property
+    def buffer(self):
+        return self.window.buffer
+
+
+class FakeVim(object):
+    """ Object installed as sys.modules['vim'] """
+
+    error = error
+
+    def __init__(self, settings=None, height=20, cwd=None):
+        self.settings = dict(settings or {})
+        self.cwd = cwd or os.getcwd()
+        self.height = height
+
+        self.buffer_map = collections.OrderedDict()
+        self.next_buffer = 1
+        first = self.new_buffer('')
+        self.windows = [Window(first, height)]
+        self.current_index = 0
+        self.previous_index = 0
+        self.current = Current(self)
+
+        self.signs = {}          # sign id --> (name, buffer number, line)
+        self.sign_defs = {}
+        self.matches = {}        # window --> match command
+        self.variables = {}      # g: variables set with :let
+        self.timers = {}         # timer id --> callback name
+        self.next_timer = 1
+        self.messages = []
+
+        self.calls = collections.Counter()
+        self.unknown = collections.Counter()
+
+    @property
+    def buffers(self):
+        return BufferList(self.buffer_map)
+
+    # ------------------------------------------------------------------
+    # bookkeeping helpers
+
+    def reset_counts(self):
+        self.calls.clear()
+
+    def new_buffer(self, name):
+        path = os.path.join(self.cwd, name) if name and not os.path.isabs(name) else name
+        b = Buffer(self.next_buffer, path)
+        self.buffer_map[b.number] = b
+        self.next_buffer += 1
+        return b
+
+    def find_buffer(self, name):
+        path = name if os.path.isabs(name) else os.path.join(self.cwd, name)
+        for b in self.buffers:
+            if b.name == path:
+                return b
+        return None
+
+    def open_file(self, path):
+        """ :edit path in the current window """
+        b = self.find_buffer(path)
+        if b is None:
+            b = self.new_buffer(path)
+            if os.path.exists(b.name):
+                with open(b.name) as f:
+                    b.lines = f.read().split('\n') or ['']
+        self.select_buffer(b)
+        return b
+
+    def select_buffer(self, b):
+        self.current.window.buffer = b
+        self.current.window._cursor = (1, 0)
+
+    def goto(self, index):
+        if index != self.current_index:
+            self.previous_index = self.current_index
+            self.current_index = index
+
+    def split(self, buffer, below=False):
+        index = self.current_index + 1 if below else self.current_index
+        self.windows.insert(index, Window(buffer, self.height))
+        self.previous_index = self.current_index + (0 if below else 1)
+        self.current_index = index
+
+    def close(self, index):
+        if len(self.windows) == 1:
+            return
+        del self.windows[index]
+        self.current_index = min(self.current_index, len(self.windows) - 1)
+        self.previous_index = min(self.previous_index, len(self.windows) - 1)
+
+    # ------------------------------------------------------------------
+    # vim.command
+
+    def command(self, cmd):
+        self.calls['command'] += 1
+        if cmd.startswith('sign '):
+            # A batch of :sign commands joined by |
+            for c in cmd.split(' | '):
+                self.run(c)
+            return
+        self.run(cmd)
+
+    def run(self, cmd):
+        cmd = cmd.strip()
+        while cmd.startswith(':'):
+            cmd = cmd[1:]
+        if cmd.startswith('silent '):
+            cmd = cmd[len('silent '):].strip()
+
+        m = re.match(r'execute\s+"(.*)"$', cmd)
+        if m:
+            inner = m.group(1)
+            if inner.startswith('normal '):
+                return self.normal(inner[len('normal '):])
+            return self.run(inner)
+
+        words = cmd.split()
+        if len(words) == 0:
+            return
+        head = words[0]
+
+        if head in ('vsp', 'vsplit', 'sp', 'split'):
+            self.split(self.current.buffer)
+        elif head in ('q', 'quit', 'close'):
+            self.close(self.current_index)
+        elif head == 'only':
+            self.windows = [self.current.window]
+            self.current_index = self.previous_index = 0
+        elif head in ('new', 'vnew', 'below', 'above', 'belowright', 'aboveleft', 'botright', 'topleft'):
+            below = head in ('below', 'belowright', 'botright')
+            if head not in ('new', 'vnew'):
+                words = words[1:]
+            name = words[1] if len(words) > 1 else ''
+            b = self.find_buffer(name) if name else None
+            self.split(b if b is not None else self.new_buffer(name), below)
+        elif head in ('e', 'edit'):
+            self.open_file(' '.join(words[1:]))
+        elif re.match(r'^\d+b$', head):
+            self.select_buffer(self.buffer_map[int(head[:-1])])
+        elif head in ('b', 'buffer'):
+            self.select_buffer(self.buffer_map[int(words[1])])
+        elif head == 'wincmd' or (len(words) > 1 and words[1] == 'wincmd'):
+            self.wincmd(words)
+        elif head in ('%d', '%delete'):
+            self.current.buffer.lines = ['']
+            self.current.window._cursor = (1, 0)
+        elif head in ('bdelete', 'bd', 'bwipeout', 'bw'):
+            b = self.find_buffer(words[1])
+            if b is not None:
+                b.valid = False
+                for i in reversed(range(len(self.windows))):
+                    if self.windows[i].buffer is b:
+                        self.close(i)
+        elif head == 'sign':
+            self.sign(words[1:])
+        elif head == 'match':
+            self.matches[self.current.window] = cmd
+        elif head == 'let':
+            m = re.match(r"let\s+(\S+)\s*=\s*(.*)$", cmd, re.S)
+            if m:
+                self.variables[m.group(1)] = m.group(2)
+        elif head in ('echo', 'echom', 'echomsg', 'echoerr'):
+            self.messages.append(cmd)
+        elif head in ('set', 'setlocal', 'highlight', 'hi', 'echohl', 'call',
+                      'redraw', 'redrawstatus', 'syntax', 'nnoremap', 'augroup',
+                      'autocmd', 'au'):
+            pass
+        else:
+            self.unknown[head] += 1
+
+    def normal(self, keys):
+        w = self.current.window
+        m = re.match(r'^(\d+)gg$', keys)
+        if m:
+            w._cursor = (min(int(m.group(1)), len(w.buffer)), 0)
+        elif keys == 'ggdd':
+            del w.buffer[0]
+            w._cursor = (1, 0)
+        elif keys in ('\\<c-w>p', '\\<C-w>p', '\x17p'):
+            self.goto(self.previous_index)
+        else:
+            self.unknown['normal ' + keys] += 1
+
+    def wincmd(self, words):
+        if words[0] == 'wincmd':
+            (count, key) = (None, words[1])
+        else:
+            (count, key) = (int(words[0]), words[2])
+        if key == 'w':
+            if count is None:
+                self.goto((self.current_index + 1) % len(self.windows))
+            else:
+                self.goto(min(count, len(self.windows)) - 1)
+        elif key == 'p':
+            self.goto(self.previous_index)
+        else:
+            self.unknown['wincmd ' + key] += 1
+
+    def sign(self, words):
+        if words[0] == 'define':
+            self.sign_defs[words[1]] = words[2:]
+        elif words[0] == 'place':
+            args = dict(w.split('=', 1) for w in words[2:])
+            self.signs[int(words[1])] = (args.get('name'), int(args['buffer']), int(args['line']))
+        elif words[0] == 'unplace':
+            self.signs.pop(int(words[1]), None)
+
+    # ------------------------------------------------------------------
+    # vim.eval
+
+    def eval(self, expr):
+        self.calls['eval'] += 1
+        return self.evaluate(expr.strip())
+
+    def evaluate(self, expr):
+        if expr in self.settings:
+            return self.settings[expr]
+        if expr.startswith('s:') or expr.startswith('g:'):
+            return self.variables.get(expr, '0')
+
+        m = re.match(r"^(\w+)\((.*)\)$", expr, re.S)
+        if not m:
+            return '0'
+        (name, arg) = (m.group(1), m.group(2).strip().strip("'\""))
+
+        if name == 'winnr':
+            return str(self.current_index + 1)
+        elif name == 'bufwinnr':
+            for (i, w) in enumerate(self.windows):
+                if w.buffer.valid and w.buffer.name.endswith(arg):
+                    return str(i + 1)
+            return '-1'
+        elif name == 'winheight':
+            return str(self.current.window.height)
+        elif name == 'winwidth':
+            return str(self.current.window.width)
+        elif name == 'has':
+            return '1' if arg == 'timers' else '0'
+        elif name == 'get':
+            m = re.match(r"function\('(.*?)'\)", arg)
+            return m.group(1).replace('s:', '<SNR>1_') if m else '0'
+        elif name == 'timer_start':
+            m = re.search(r"function\('(.*?)'\)", arg)
+            self.timers[self.next_timer] = m.group(1) if m else arg
+            self.next_timer += 1
+            return str(self.next_timer - 1)
+        elif name == 'timer_stop':
+            self.timers.pop(int(arg), None)
+            return '0'
+        elif name == 'exists':
+            return '1' if arg in self.settings or arg in self.variables else '0'
+        elif name == 'getchar':
+            return '0'
+        return '0'
@@ -0,0 +1,61 @@
+/*
+ * Inferior used by bench/run_bench.py --lldb real.
+ *
+ *   usage: bench <threads> <depth>
+ *
+ * Starts <threads> - 1 threads parked on a condition variable, recurses
+ * <depth> frames deep on the main thread and then loops forever in
+ * bench_stop(), where the benchmark sets its breakpoint and steps.
+ *
+ * locals.h is generated by run_bench.py and declares the locals of
+ * bench_stop() (BENCH_LOCALS) and an expression using them (BENCH_USE_LOCALS).
+ */
+
+#include <pthread.h>
+#include <stdlib.h>
+
+#include "locals.h"
+
+static pthread_mutex_t lock = PTHREAD_MUTEX_INITIALIZER;
+static pthread_cond_t cond = PTHREAD_COND_INITIALIZER;
+volatile int counter;
+
+static void *park(void *arg)
+{
+    pthread_mutex_lock(&lock);
+    for (;;)
+        pthread_cond_wait(&cond, &lock);
+    return arg;
+}
+
+void bench_stop(void)
+{
+    BENCH_LOCALS
+    for (;;) {
+        counter++;
+        counter += BENCH_USE_LOCALS;
+        counter--;
+    }
+}
+
+static int recurse(int depth)
+{
+    if (depth <= 1) {
+        bench_stop();
+        return 0;
+    }
+    return recurse(depth - 1) + 1;
+}
+
+int main(int argc, char **argv)
+{
+    int threads = argc > 1 ? atoi(argv[1]) : 1;
+    int depth = argc > 2 ? atoi(argv[2]) : 1;
+    pthread_t tid;
+    int i;
+
+    for (i = 1; i < threads; i++)
+        pthread_create(&tid, NULL, park, NULL);
+
+    return recurse(depth);
+}
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+#
+# Headless benchmarks of the vim-lldb refresh path.
+#
+# The plugin (LLDBController, UI, PaneLayout, VimSign...) runs against
+# fake_vim.FakeVim, which counts every vim.command/vim.eval call, and either
+# fake_lldb (a synthetic inferior with a configurable number of threads,
+# frames, breakpoints and variables) or the real lldb module driving
+# programs/bench.c.
+#
+# Each dimension is scaled on its own while the others keep their default
+# value; for every point the benchmark launches, stops, and then times a
+# number of :Lnext steps (each step is a full UI refresh.)
+#
+#   python bench/run_bench.py
+#   python bench/run_bench.py --threads 1,100,5000 --frames 10,100000
+#   python bench/run_bench.py --lldb real --json results.json
+#
+# With --latency-ms, the fake target is remote and each packet to it takes that
+# long; the number of round trips per step is reported (see memory.StackCache).
+#
+# With --refresh-budget-ms, each step only redraws what fits in that time; the
+# steps run back to back like a held :Lnext key, and the redraws left to the
+# poll timer (and dropped by the next step) are reported.
+#
+# With --replay, the stops of a recording made with :Lrecord are redrawn
+# instead, which compares plugin versions on exactly the same session:
+#
+#   python bench/run_bench.py --replay session.rec.gz
+#
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(os.path.dirname(BENCH_DIR), "python-vim-lldb")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, PLUGIN_DIR)
+
+import fake_vim
+
+# Modules that must be re-imported to get a fresh plugin for each run: all of them,
+# so that none is left out as the plugin grows
+PLUGIN_MODULES = sorted(os.path.splitext(name)[0] for name in os.listdir(PLUGIN_DIR)
+                        if name.endswith(".py"))
+
+# s: variables that plugin/lldb.vim defines before loading the plugin
+VIM_SETTINGS = {
+    's:lldb_async': '1',
+    's:lldb_custom_path': '',
+    's:lldb_python_version': '3',
+    's:lldb_backtrace_depth': '64',
+    's:lldb_stacks_depth': '64',
+    's:lldb_profile': '0',
+    's:lldb_output_lines': '10000',
+    's:lldb_output_bytes': '1048576',
+    's:lldb_echo_limit': '4096',
+    's:lldb_output_buffer_bytes': '4194304',
+    's:lldb_color': '0',
+    's:lldb_backend': '',
+    's:lldb_remote': '-1',
+    's:lldb_remote_prefetch': '8192',
+    's:lldb_refresh_budget': '0',
+    's:lldb_event_wait_max': '5',
+    's:lldb_backend_python': 'python3',
+}
+
+DEFAULTS = {'threads': 1, 'frames': 10, 'breakpoints': 1, 'variables': 10}
+
+
+def parse_list(s):
+    return [int(x) for x in s.split(',') if x]
+
+
+def load_plugin(vim, lldb):
+    """ Installs vim and lldb and imports a fresh copy of the plugin. Returns the
+        lldb_controller module (whose ctrl global is the LLDBController.)
+    """
+    for name in PLUGIN_MODULES:
+        sys.modules.pop(name, None)
+    sys.modules['vim'] = vim
+    sys.modules['lldb'] = lldb
+    import lldb_controller
+    # Only imported by plugin.py with g:lldb_backend, which the bench does not run
+    import backend_client
+    return lldb_controller
+
+
+def import_real_lldb():
+    """ Imports the real lldb module, asking 'lldb -P' where it lives if needed """
+    try:
+        import lldb
+        return lldb
+    except ImportError:
+        pass
+    lldb_exe = os.environ.get('LLDB', 'lldb')
+    path = subprocess.check_output([lldb_exe, '-P']).decode('utf-8').strip()
+    sys.path.append(path)
+    import lldb
+    return lldb
+
+
+def wait_for_target(ctrl):
+    """ Services the plugin's poll timer until the target created by :Ltarget is ready """
+    while ctrl.targetLoader is not None:
+        time.sleep(0.001)
+        ctrl.doPoll()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(round((len(values) - 1) * p / 100.0))]
+
+
+class FakeSession(object):
+    """ Prepares a fake_lldb world of the requested shape """
+
+    def __init__(self, workdir):
+        import fake_lldb
+        self.lldb = fake_lldb
+        # Keep the symbol indexes of the fake modules out of the user's cache
+        os.environ['XDG_CACHE_HOME'] = workdir
+        self.source = os.path.join(workdir, "bench_main.c")
+        with open(self.source, "w") as f:
+            f.write("\n".join("int line%d;" % i for i in range(20000)))
+
+    def start(self, ctrl, shape):
+        self.lldb.world = self.lldb.World(source=self.source, **shape)
+        ctrl.doTarget(os.path.join(os.path.dirname(self.source), "a.out"))
+        wait_for_target(ctrl)
+        ctrl.doLaunch(True, "")
+
+    def stats(self):
+        return {'frames_unwound': self.lldb.world.unwound_frames,
+                'round_trips': self.lldb.world.round_trips}
+
+    def reset_stats(self):
+        self.lldb.world.unwound_frames = 0
+        self.lldb.world.round_trips = 0
+
+    def stop(self, ctrl):
+        pass
+
+
+class RealSession(object):
+    """ Builds programs/bench.c for the requested shape and stops it in bench_stop() """
+
+    def __init__(self, workdir):
+        self.lldb = import_real_lldb()
+        self.workdir = workdir
+        self.source = os.path.join(BENCH_DIR, "programs", "bench.c")
+        self.built = {}
+
+    def build(self, variables):
+        if variables in self.built:
+            return self.built[variables]
+        incdir = os.path.join(self.workdir, "locals%d" % variables)
+        os.makedirs(incdir)
+        with open(os.path.join(incdir, "locals.h"), "w") as f:
+            names = ["v%d" % i for i in range(variables)]
+            f.write("#define BENCH_LOCALS %s\n" % " ".join(
+                "volatile int %s = %d;" % (n, i) for (i, n) in enumerate(names)))
+            f.write("#define BENCH_USE_LOCALS (0%s)\n" % "".join(" + " + n for n in names))
+        exe = os.path.join(incdir, "bench")
+        subprocess.check_call([os.environ.get('CC', 'cc'), "-g", "-O0", "-pthread",
+                               "-I", incdir, "-o", exe, self.source])
+        self.built[variables] = exe
+        return exe
+
+    def start(self, ctrl, shape):
+        exe = self.build(shape['variables'])
+        ctrl.doTarget(exe)
+        wait_for_target(ctrl)
+        ctrl.doCommand("breakpoint", "set -n bench_stop", False)
+        for i in range(shape['breakpoints'] - 1):
+            ctrl.doCommand("breakpoint", "set -f bench.c -l %d" % (i % 60 + 1), False)
+        ctrl.doLaunch(False, "%d %d" % (shape['threads'], shape['frames']))
+
+        deadline = time.time() + 60
+        while ctrl.process.GetState() != self.lldb.eStateStopped and time.time() < deadline:
+            ctrl.processPendingEvents(1)
+        if ctrl.process.GetState() != self.lldb.eStateStopped:
+            raise RuntimeError("bench program did not stop in bench_stop()")
+
+    def stats(self):
+        return {}
+
+    def reset_stats(self):
+        pass
+
+    def stop(self, ctrl):
+        if ctrl.process is not None and ctrl.process.IsValid():
+            ctrl.process.Kill()
+        self.lldb.SBDebugger.Destroy(ctrl.dbg)
+
+
+def run_case(session, shape, steps, thread_filter=None):
+    """ Launches the inferior with the given shape and times each step. Returns a
+        result dict. thread_filter (":Lthreads" arguments) is set before the launch.
+    """
+    vim = fake_vim.FakeVim(settings=VIM_SETTINGS)
+    plugin = load_plugin(vim, session.lldb)
+    ctrl = plugin.ctrl
+
+    # A user window showing the source file, like a real editing session
+    vim.open_file(session.source)
+
+    # Keep the plugin's status messages out of the results table
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        if thread_filter:
+            ctrl.doThreads(thread_filter)
+        t0 = time.time()
+        session.start(ctrl, shape)
+        launch = time.time() - t0
+        result = time_steps(plugin, ctrl, vim, session, steps)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    session.stop(ctrl)
+
+    result['shape'] = shape
+    result['launch_ms'] = launch * 1000
+    return result
+
+
+def time_steps(plugin, ctrl, vim, session, steps):
+    """ Times the given number of :Lnext steps and returns a result dict """
+    profiler = sys.modules['profiling'].profiler
+
+    profiler.start(vim, session.lldb)
+    times = []
+    counts = {'vim.command': [], 'vim.eval': [], 'sbapi': []}
+    extra = {}
+    for i in range(steps):
+        session.reset_stats()
+        t0 = time.time()
+        with profiler.span("bench.step"):
+            ctrl.doStep(plugin.StepType.OVER)
+        times.append(time.time() - t0)
+        for (k, v) in profiler.events[-1][4].items():
+            counts[k].append(v)
+        for (k, v) in session.stats().items():
+            extra.setdefault(k, []).append(v)
+        extra.setdefault('deferred', []).append(len(ctrl.ui.pendingRefresh))
+    profiler.stop()
+
+    result = {
+        'step_p50_ms': percentile(times, 50) * 1000,
+        'step_p95_ms': percentile(times, 95) * 1000,
+        'step_max_ms': max(times) * 1000,
+    }
+    for (k, v) in counts.items():
+        result[k] = percentile(v, 50)
+    for (k, v) in extra.items():
+        result[k] = percentile(v, 50)
+    return result
+
+
+def run_replay(path, repeat):
+    """ Redraws every stop of a recording repeat times and prints latency and call counts """
+    import fake_lldb
+    vim = fake_vim.FakeVim(settings=VIM_SETTINGS)
+    plugin = load_plugin(vim, fake_lldb)
+    ctrl = plugin.ctrl
+    recorder = sys.modules['recorder']
+    profiler = sys.modules['profiling'].profiler
+
+    records = recorder.read_recording(path)
+    ctrl.ui.activate()
+    profiler.start(vim, fake_lldb)
+    times = []
+    counts = {'vim.command': [], 'vim.eval': []}
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        for i in range(repeat):
+            for (target, controller, status, goto_file) in recorder.replay_stops(records):
+                t0 = time.time()
+                with profiler.span("bench.replay"):
+                    ctrl.ui.update(target, None, controller, goto_file)
+                times.append(time.time() - t0)
+                for k in counts:
+                    counts[k].append(profiler.events[-1][4][k])
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    profiler.stop()
+
+    if len(times) == 0:
+        print("no stops in %s" % path)
+        return
+    print("%d stops x %d: p50 %.2f ms, p95 %.2f ms, max %.2f ms; "
+          "per stop: %d vim.command, %d vim.eval (p50)" % (
+              len(times) // repeat, repeat, percentile(times, 50) * 1000,
+              percentile(times, 95) * 1000, max(times) * 1000,
+              percentile(counts['vim.command'], 50), percentile(counts['vim.eval'], 50)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Headless benchmarks of the vim-lldb refresh path.")
+    parser.add_argument('--lldb', choices=['fake', 'real'], default='fake',
+                        help="drive the fake lldb module or real lldb (default: fake)")
+    parser.add_argument('--threads', type=parse_list, default=[1, 10, 100, 1000])
+    parser.add_argument('--frames', type=parse_list, default=[10, 100, 1000, 10000])
+    parser.add_argument('--breakpoints', type=parse_list, default=[1, 10, 100, 1000])
+    parser.add_argument('--variables', type=parse_list, default=[10, 100, 1000])
+    parser.add_argument('--steps', type=int, default=10, help="steps timed per point")
+    parser.add_argument('--unwind-us', type=float, default=0.0,
+                        help="fake lldb: simulated cost of unwinding one frame (usec)")
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help="fake lldb: debug a remote target with this round trip time (msec)")
+    parser.add_argument('--no-prefetch', action='store_true',
+                        help="do not prefetch stack memory and registers of remote targets")
+    parser.add_argument('--refresh-budget-ms', type=int, default=0,
+                        help="time a step may spend redrawing (msec, default: no limit)")
+    parser.add_argument('--thread-filter', metavar='ARGS',
+                        help="filter the threads pane with these :Lthreads arguments "
+                             "before each launch (e.g. 'containing function_3')")
+    parser.add_argument('--json', help="also write results to this file")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="redraw the stops of a :Lrecord recording instead")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="with --replay: number of times to replay the recording")
+    args = parser.parse_args()
+    if args.no_prefetch:
+        VIM_SETTINGS['s:lldb_remote_prefetch'] = '0'
+    VIM_SETTINGS['s:lldb_refresh_budget'] = str(args.refresh_budget_ms)
+
+    if args.replay:
+        run_replay(args.replay, args.repeat)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="vim-lldb-bench-")
+    if args.lldb == 'fake':
+        session = FakeSession(workdir)
+    else:
+        session = RealSession(workdir)
+
+    header = "%-12s %8s %10s %10s %10s %10s %8s %8s %8s" % (
+        "dimension", "value", "launch ms", "step p50", "step p95", "step max",
+        "command", "eval", "sbapi")
+    print(header)
+    print("-" * len(header))
+
+    results = []
+    for dimension in ('threads', 'frames', 'breakpoints', 'variables'):
+        for value in getattr(args, dimension):
+            shape = dict(DEFAULTS)
+            shape[dimension] = value
+            if args.lldb == 'fake' and args.unwind_us:
+                shape['unwind_cost'] = args.unwind_us / 1e6
+            if args.lldb == 'fake' and args.latency_ms:
+                shape['latency'] = args.latency_ms / 1e3
+            r = run_case(session, shape, args.steps, args.thread_filter)
+            r['dimension'] = dimension
+            results.append(r)
+            line = "%-12s %8d %10.1f %10.2f %10.2f %10.2f %8d %8d %8d" % (
+                dimension, value, r['launch_ms'], r['step_p50_ms'], r['step_p95_ms'],
+                r['step_max_ms'], r['vim.command'], r['vim.eval'], r['sbapi'])
+            if 'frames_unwound' in r:
+                line += "  (%d frames unwound)" % r['frames_unwound']
+            if args.latency_ms:
+                line += "  (%d round trips)" % r['round_trips']
+            if args.refresh_budget_ms:
+                line += "  (%d redraws deferred)" % r['deferred']
+            print(line)
+            sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({'lldb': args.lldb, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
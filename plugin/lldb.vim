@@ -29,6 +29,20 @@ set cpo&vim
 let s:lldb_custom_path = ""
 let s:lldb_async = 1 " async by default
 let s:default_panes = []
+let s:lldb_backtrace_depth = 64 " frames unwound at a time in the backtrace pane
+let s:lldb_stacks_depth = 64 " frames of each thread the stacks pane compares
+let s:lldb_profile = 0
+let s:lldb_output_lines = 10000 " output of the inferior kept in the stdout pane
+let s:lldb_output_bytes = 1048576
+let s:lldb_echo_limit = 4096 " longer command output goes to the output pane
+let s:lldb_output_buffer_bytes = 4194304
+let s:lldb_color = 0 " colour LLDB output in the panes
+let s:lldb_backend = "" " 'process' runs LLDB in a separate process
+let s:lldb_remote = -1 " prefetch for remote-* platforms (1: every process, 0: never)
+let s:lldb_remote_prefetch = 8192 " bytes of stack above SP read at each stop
+let s:lldb_refresh_budget = 30 " msec a refresh may take before the rest is deferred
+let s:lldb_event_wait_max = 5 " longest wait (sec) for a stop; 0 for fixed waits
+let s:lldb_backend_python = "python3"
 
 if (exists("g:lldb_path"))
   let s:lldb_custom_path = g:lldb_path
@@ -40,6 +54,48 @@ endif
 if (exists("g:lldb_enable_async") && g:lldb_enable_async == 0)
   let s:lldb_async = 0
 endif
+if (exists("g:lldb_backtrace_depth"))
+  let s:lldb_backtrace_depth = g:lldb_backtrace_depth
+endif
+if (exists("g:lldb_stacks_depth"))
+  let s:lldb_stacks_depth = g:lldb_stacks_depth
+endif
+if (exists("g:lldb_profile"))
+  let s:lldb_profile = g:lldb_profile
+endif
+if (exists("g:lldb_output_lines"))
+  let s:lldb_output_lines = g:lldb_output_lines
+endif
+if (exists("g:lldb_output_bytes"))
+  let s:lldb_output_bytes = g:lldb_output_bytes
+endif
+if (exists("g:lldb_echo_limit"))
+  let s:lldb_echo_limit = g:lldb_echo_limit
+endif
+if (exists("g:lldb_output_buffer_bytes"))
+  let s:lldb_output_buffer_bytes = g:lldb_output_buffer_bytes
+endif
+if (exists("g:lldb_color"))
+  let s:lldb_color = g:lldb_color
+endif
+if (exists("g:lldb_remote"))
+  let s:lldb_remote = g:lldb_remote
+endif
+if (exists("g:lldb_remote_prefetch"))
+  let s:lldb_remote_prefetch = g:lldb_remote_prefetch
+endif
+if (exists("g:lldb_refresh_budget"))
+  let s:lldb_refresh_budget = g:lldb_refresh_budget
+endif
+if (exists("g:lldb_event_wait_max"))
+  let s:lldb_event_wait_max = g:lldb_event_wait_max
+endif
+if (exists("g:lldb_backend"))
+  let s:lldb_backend = g:lldb_backend
+endif
+if (exists("g:lldb_backend_python"))
+  let s:lldb_backend_python = g:lldb_backend_python
+endif
 
 function! s:Highlight()
   if !hlexists("lldb_output")
@@ -110,6 +166,17 @@ function! s:InitLldbPlugin()
   command -nargs=* Lrun                                                  pyx ctrl.doLaunch(False, '<args>')
   command -nargs=1 Lattach                                               pyx ctrl.doAttach('<args>')
   command -nargs=0 Ldetach                                               pyx ctrl.doDetach()
+  command -complete=file -nargs=+ Lcore                                  pyx ctrl.doCore('<args>')
+
+  " Instrumentation of the refresh path
+  command -nargs=* Lprofile                                              pyx ctrl.doProfile('<args>')
+  command -nargs=* Lrecord                                               pyx ctrl.doRecord('<args>')
+  command -complete=file -nargs=1 Lreplay                                pyx ctrl.doReplay('<args>')
+
+  " Sessions: target, breakpoints and layout of a project
+  command -complete=file -nargs=+ Lsession                               pyx ctrl.doSession('<args>')
+  command -complete=file -nargs=+ Ltriage                                pyx ctrl.doTriage('<args>')
+  command -complete=file -nargs=* Lsample                                pyx ctrl.doSample('<args>')
 
   " Regexp-commands: because vim's command mode does not support '_' or '-'
   " characters in command names, we omit them when creating the :L<cmd>
@@ -126,6 +193,8 @@ function! s:InitLldbPlugin()
   command -complete=custom,s:CompleteCommand -nargs=* Lapropos           pyx ctrl.doCommand('apropos', '<args>')
   command -complete=custom,s:CompleteCommand -nargs=* Lbacktrace         pyx ctrl.doCommand('bt', '<args>')
   command -complete=custom,s:CompleteCommand -nargs=* Lbreakpoint        pyx ctrl.doBreakpoint('<args>')
+  command -nargs=+ Llogpoint                                             call s:CallWithArgs('doLogpoint', <q-args>)
+  command -nargs=1 Lbfind                                                pyx ctrl.doBreakpointFind('<args>')
   command -complete=custom,s:CompleteCommand -nargs=* Lcommand           pyx ctrl.doCommand('command', '<args>')
   command -complete=custom,s:CompleteCommand -nargs=* Ldisassemble       pyx ctrl.doCommand('disassemble', '<args>')
   command -complete=custom,s:CompleteCommand -nargs=* Lexpression        pyx ctrl.doCommand('expression', '<args>')
@@ -154,19 +223,21 @@ function! s:InitLldbPlugin()
   command -complete=custom,s:CompleteCommand -nargs=? Lup                pyx ctrl.doCommand('up', '<args>',     print_on_success=False, goto_file=True)
   command -complete=custom,s:CompleteCommand -nargs=? Ldown              pyx ctrl.doCommand('down', '<args>', print_on_success=False, goto_file=True)
   command -complete=custom,s:CompleteCommand -nargs=* Lthread            pyx ctrl.doSelect('thread', '<args>')
+  command -nargs=* Lthreads                                              call s:CallWithArgs('doThreads', <q-args>)
 
   command -complete=custom,s:CompleteCommand -nargs=* Ltarget            pyx ctrl.doTarget('<args>')
 
   " Continue
   command -complete=custom,s:CompleteCommand -nargs=* Lcontinue          pyx ctrl.doContinue()
 
-  " Thread-Stepping (no autocompletion)
-  command -nargs=0 Lstepinst                                             pyx ctrl.doStep(StepType.INSTRUCTION)
-  command -nargs=0 Lstepinstover                                         pyx ctrl.doStep(StepType.INSTRUCTION_OVER)
-  command -nargs=0 Lstepin                                               pyx ctrl.doStep(StepType.INTO)
-  command -nargs=0 Lstep                                                 pyx ctrl.doStep(StepType.INTO)
-  command -nargs=0 Lnext                                                 pyx ctrl.doStep(StepType.OVER)
-  command -nargs=0 Lfinish                                               pyx ctrl.doStep(StepType.OUT)
+  " Thread-Stepping (no autocompletion); a count steps that many times and only shows the last stop
+  command -nargs=? Lstepinst                                             pyx ctrl.doStep(StepType.INSTRUCTION, '<args>')
+  command -nargs=? Lstepinstover                                         pyx ctrl.doStep(StepType.INSTRUCTION_OVER, '<args>')
+  command -nargs=? Lstepin                                               pyx ctrl.doStep(StepType.INTO, '<args>')
+  command -nargs=? Lstep                                                 pyx ctrl.doStep(StepType.INTO, '<args>')
+  command -nargs=? Lnext                                                 pyx ctrl.doStep(StepType.OVER, '<args>')
+  command -nargs=? Lfinish                                               pyx ctrl.doStep(StepType.OUT, '<args>')
+  command -nargs=1 Luntil                                                call s:CallWithArgs('doUntil', <q-args>)
 
 
   " Bind/Unbind
@@ -188,11 +259,84 @@ function! s:ServiceLLDBEventQueue()
 endfunction
 
 
+" Calls ctrl.<method> with the arguments of a command as typed, for commands that
+" take expressions, templates or patterns: quotes and backslashes in '<args>'
+" would be read by Python's parser
+function! s:CallWithArgs(method, args)
+  execute 'pyx ctrl.' . a:method . '(vim.eval("a:args"))'
+endfunction
+
+
+" Called by the timer that services background work, such as creating a target
+" (see LLDBController.startPolling)
+function! s:PollTimer(timer)
+  pyx ctrl.doPoll()
+endfunction
+
+
+" Channel to the backend process that runs LLDB when g:lldb_backend is 'process'
+" (see backend_client.py)
+function! s:BackendStart(command)
+  let s:backend_job = job_start(a:command, {'mode': 'json',
+        \ 'callback': function('s:BackendMessage'),
+        \ 'err_mode': 'nl', 'err_cb': function('s:BackendError'),
+        \ 'exit_cb': function('s:BackendExit')})
+  return job_status(s:backend_job) == 'run'
+endfunction
+
+function! s:BackendStop()
+  call job_stop(s:backend_job)
+endfunction
+
+function! s:BackendSend(request)
+  call ch_sendexpr(s:backend_job, a:request, {'callback': function('s:BackendMessage')})
+endfunction
+
+function! s:BackendEval(request, timeout)
+  return json_encode(ch_evalexpr(s:backend_job, a:request, {'timeout': a:timeout}))
+endfunction
+
+function! s:BackendMessage(channel, message)
+  pyx ctrl.onBackendMessage(vim.eval('json_encode(a:message)'))
+endfunction
+
+function! s:BackendError(channel, message)
+  pyx ctrl.onBackendError(vim.eval('a:message'))
+endfunction
+
+function! s:BackendExit(job, status)
+  pyx ctrl.onBackendExit(int(vim.eval('a:status')))
+endfunction
+
+
+" Job that triages core files for :Ltriage (see triage.py)
+function! s:TriageStart(command)
+  let s:triage_job = job_start(a:command, {'out_mode': 'nl',
+        \ 'out_cb': function('s:TriageOutput'),
+        \ 'err_mode': 'nl', 'err_cb': function('s:TriageError'),
+        \ 'exit_cb': function('s:TriageExit')})
+  return job_status(s:triage_job) == 'run'
+endfunction
+
+function! s:TriageOutput(channel, line)
+  pyx ctrl.onTriageRecord(vim.eval('a:line'))
+endfunction
+
+function! s:TriageError(channel, line)
+  pyx ctrl.onTriageMessage(vim.eval('a:line'))
+endfunction
+
+function! s:TriageExit(job, status)
+  pyx ctrl.onTriageExit(int(vim.eval('a:status')))
+endfunction
+
+
 function! s:BindCursorToLLDB()
   augroup bindtocursor
     autocmd!
     autocmd CursorMoved * :Lrefresh
     autocmd CursorHold  * :Lrefresh
+    autocmd BufReadPost,BufWinEnter * exe 'pyx ctrl.doBufferShown(' . expand('<abuf>') . ')'
     autocmd VimLeavePre * pyx ctrl.doExit()
   augroup end
 endfunction
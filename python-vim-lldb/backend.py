@@ -0,0 +1,325 @@
+#
+# Out-of-process debugger backend (see backend_client.py and g:lldb_backend).
+#
+# Started by Vim with job_start() as
+#
+#   python backend.py <directory of the lldb module>
+#
+# it owns the SBDebugger and talks to the plugin over the job's stdin and
+# stdout in Vim's JSON channel format: Vim sends [id, request] lines and gets
+# [id, result] back; [0, notification] lines are pushed when a process stops
+# or writes output. A slow or crashing LLDB then only affects this process.
+#
+# Requests are {"method": name, ...}; results are {"success": bool, "output":
+# text, "record": stop record}. Stop records are those of recorder.py, with the
+# output of the commands the panes run, so the plugin redraws them like a replay.
+#
+
+from __future__ import print_function
+
+import json
+import os
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+if len(sys.argv) > 1:
+    sys.path.insert(0, sys.argv[1])
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import lldb
+from recorder import StopSnapshot
+from stepping import run_steps, until_condition
+
+
+# Step kinds, numbered like lldb_controller.StepType
+STEPS = {
+    1: lambda t: t.StepInstruction(False),
+    2: lambda t: t.StepInstruction(True),
+    3: lambda t: t.StepInto(),
+    4: lambda t: t.StepOver(),
+    5: lambda t: t.StepOut(),
+}
+
+
+class Backend(object):
+    """ Handles the requests of the plugin and pushes the events of its processes """
+
+    # Characters of inferior output read at a time
+    outputChunk = 64 * 1024
+
+    def __init__(self, out):
+        self.out = out
+        self.writeLock = threading.Lock()
+
+        # Held while a request or a stop is handled, so the event thread does not
+        # snapshot a process that a request is stepping
+        self.lock = threading.RLock()
+
+        lldb.SBDebugger.Initialize()
+        self.dbg = lldb.SBDebugger.Create()
+        self.dbg.SetAsync(True)
+        self.dbg.SetUseColor(False)
+        self.interpreter = self.dbg.GetCommandInterpreter()
+        self.listener = lldb.SBListener("vim-lldb backend process events")
+
+        # Commands the panes run [(command, args)]; their output goes in each record
+        self.paneCommands = [("process", "status")]
+        self.snapshot = StopSnapshot()
+
+        # Stop ID of the last record sent, so a stop is not sent twice
+        self.lastStopID = None
+        self.interrupted = threading.Event()
+        self.requests = queue.Queue()
+        self.exiting = False
+
+    # ------------------------------------------------------------------
+    # channel
+
+    def send(self, number, message):
+        line = json.dumps([number, message], separators=(',', ':'))
+        with self.writeLock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def notify(self, message):
+        self.send(0, message)
+
+    def serve(self, lines):
+        """ Handles the requests read from lines until the channel closes """
+        events = threading.Thread(target=self.pump_events, name="vim-lldb events")
+        events.daemon = True
+        events.start()
+        reader = threading.Thread(target=self.read_requests, args=(lines,),
+                                  name="vim-lldb requests")
+        reader.daemon = True
+        reader.start()
+
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            (number, request) = item
+            method = request.get("method")
+            with self.lock:
+                try:
+                    result = getattr(self, "do_" + method)(request)
+                except Exception as e:
+                    result = {"success": False, "output": "%s: %s" % (method, e)}
+                goto_file = result.pop("goto_file", request.get("goto_file", False))
+                if "record" not in result:
+                    result["record"] = self.record(goto_file)
+                result["context"] = request.get("context")
+            self.send(number, result)
+        self.exiting = True
+        self.dbg.Terminate()
+
+    def read_requests(self, lines):
+        """ Reader thread: queues requests, except interrupts, which cannot wait for
+            the request being handled
+        """
+        for line in lines:
+            if not line.strip():
+                continue
+            (number, request) = json.loads(line)
+            if request.get("method") == "interrupt":
+                self.interrupt()
+                self.send(number, {"success": True, "output": "", "record": None})
+            else:
+                self.requests.put((number, request))
+        self.requests.put(None)
+
+    # ------------------------------------------------------------------
+    # snapshots
+
+    def record(self, goto_file, status=""):
+        """ Returns the stop record of the selected target, or None without a target """
+        target = self.dbg.GetSelectedTarget()
+        if not target.IsValid():
+            return None
+        commands = {}
+        for (command, args) in self.paneCommands:
+            result = lldb.SBCommandReturnObject()
+            self.interpreter.HandleCommand("%s %s" % (command, args), result)
+            commands["%s %s" % (command, args)] = \
+                result.GetOutput() if result.Succeeded() else result.GetError()
+        process = target.GetProcess()
+        if process.IsValid():
+            self.lastStopID = (process.GetProcessID(), process.GetStopID())
+        return self.snapshot.stop_record(target, status, goto_file, commands)
+
+    def pump_events(self):
+        """ Event thread: pushes output and stops of every process as they happen """
+        event = lldb.SBEvent()
+        while not self.exiting:
+            if not self.listener.WaitForEvent(1, event):
+                continue
+            states = []
+            while True:
+                process = lldb.SBProcess.GetProcessFromEvent(event)
+                if event.GetType() & (lldb.SBProcess.eBroadcastBitSTDOUT |
+                                      lldb.SBProcess.eBroadcastBitSTDERR):
+                    self.read_output(process)
+                elif not (lldb.SBProcess.GetStateFromEvent(event) == lldb.eStateStopped and
+                          lldb.SBProcess.GetRestartedFromEvent(event)):
+                    states.append((process, lldb.SBProcess.GetStateFromEvent(event)))
+                # Send one record for a burst of events
+                if not self.listener.GetNextEvent(event):
+                    break
+            if len(states) > 0:
+                self.report_stop(*states[-1])
+
+    def read_output(self, process):
+        for get in (process.GetSTDOUT, process.GetSTDERR):
+            data = get(self.outputChunk)
+            while data:
+                self.notify({"type": "output", "text": data})
+                data = get(self.outputChunk)
+
+    def report_stop(self, process, state):
+        with self.lock:
+            selected = self.dbg.GetSelectedTarget().GetProcess()
+            if not selected.IsValid() or selected.GetProcessID() != process.GetProcessID():
+                if state not in (lldb.eStateStopped, lldb.eStateCrashed, lldb.eStateExited):
+                    return
+                target = process.GetTarget()
+                self.notify({"type": "message", "text": "process %d (target %d, %s) %s" % (
+                    process.GetProcessID(), self.dbg.GetIndexOfTarget(target),
+                    target.GetExecutable().GetFilename(), state_name(state))})
+                return
+            if state in (lldb.eStateRunning, lldb.eStateStepping):
+                self.notify({"type": "state", "state": state_name(state)})
+                return
+            if (process.GetProcessID(), process.GetStopID()) == self.lastStopID:
+                return
+            self.notify({"type": "stop", "state": state_name(state),
+                         "record": self.record(True)})
+
+    def interrupt(self):
+        """ Interrupts the steps of :Lnext <count> or :Luntil, or the running process """
+        self.interrupted.set()
+        process = self.dbg.GetSelectedTarget().GetProcess()
+        if process.IsValid() and process.GetState() == lldb.eStateRunning:
+            process.Stop()
+
+    # ------------------------------------------------------------------
+    # requests
+
+    def do_configure(self, request):
+        self.paneCommands = [("process", "status")] + [tuple(c) for c in request["commands"]]
+        self.snapshot = StopSnapshot(request.get("frame_depth", 64))
+        return {"success": True, "output": "", "record": None}
+
+    def do_snapshot(self, request):
+        # A new StopSnapshot writes all breakpoints, which a new UI needs
+        self.snapshot.lastBreakpoints = None
+        return {"success": True, "output": ""}
+
+    def do_target(self, request):
+        err = lldb.SBError()
+        target = self.dbg.CreateTarget(request["exe"], None, None,
+                                       request.get("load_dependent_modules", True), err)
+        if not target:
+            return {"success": False, "output": "Error creating target %s. %s" % (
+                request["exe"], str(err))}
+        self.dbg.SetSelectedTarget(target)
+        return {"success": True, "output": "created target %s" % request["exe"]}
+
+    def do_launch(self, request):
+        target = self.dbg.GetSelectedTarget()
+        if not target.IsValid():
+            return {"success": False, "output": "No target to launch"}
+        if target.GetProcess().IsValid():
+            target.GetProcess().Destroy()
+        err = lldb.SBError()
+        process = target.Launch(lldb.SBLaunchInfo(request.get("args", "").split(' ')), err)
+        if not err.Success():
+            return {"success": False, "output": "Error during launch: %s" % str(err)}
+        process.GetBroadcaster().AddListener(
+            self.listener, lldb.SBProcess.eBroadcastBitStateChanged |
+            lldb.SBProcess.eBroadcastBitSTDOUT | lldb.SBProcess.eBroadcastBitSTDERR)
+        if not request.get("stop_at_entry", True):
+            process.Continue()
+        fs = target.GetExecutable()
+        return {"success": True, "output": "Launched %s %s (pid=%d)" % (
+            os.path.join(fs.GetDirectory(), fs.GetFilename()), request.get("args", ""),
+            process.GetProcessID())}
+
+    def do_attach(self, request):
+        err = lldb.SBError()
+        target = self.dbg.CreateTarget('')
+        process = target.AttachToProcessWithName(self.listener, request["name"], False, err)
+        if not err.Success():
+            return {"success": False, "output": "Error during attach: %s" % str(err)}
+        self.dbg.SetSelectedTarget(target)
+        return {"success": True, "output": "Attached to %s (pid=%d)" % (
+            request["name"], process.GetProcessID())}
+
+    def do_continue(self, request):
+        process = self.dbg.GetSelectedTarget().GetProcess()
+        if not process.IsValid():
+            return {"success": False, "output": "No process to continue"}
+        process.Continue()
+        return {"success": True, "output": "", "record": None}
+
+    def do_command(self, request):
+        result = lldb.SBCommandReturnObject()
+        self.interpreter.HandleCommand(request["command"], result)
+        if result.Succeeded():
+            return {"success": True, "output": result.GetOutput()}
+        return {"success": False, "output": result.GetError()}
+
+    def do_complete(self, request):
+        matches = lldb.SBStringList()
+        self.interpreter.HandleCompletion(request["line"], request["cursor"], 1, -1, matches)
+        return {"success": True, "record": None,
+                "output": [m for m in (matches.GetStringAtIndex(i)
+                                       for i in range(matches.GetSize())) if m]}
+
+    def do_step(self, request):
+        """ Steps the selected thread count times; more than one step runs synchronously
+            and only the last stop is recorded.
+        """
+        process = self.dbg.GetSelectedTarget().GetProcess()
+        if not process.IsValid():
+            return {"success": False, "output": "No process to step"}
+        count = request.get("count", 1)
+        if count == 1:
+            STEPS[request["kind"]](process.GetSelectedThread())
+            return {"success": True, "output": "", "record": None}
+        return self.run_steps(process, STEPS[request["kind"]], count)
+
+    def do_until(self, request):
+        process = self.dbg.GetSelectedTarget().GetProcess()
+        if not process.IsValid():
+            return {"success": False, "output": "No process to step"}
+        args = request["args"].strip()
+        errors = []
+        result = self.run_steps(process, STEPS[4], None, until_condition(args, errors))
+        if len(errors) > 0:
+            result["success"] = False
+            result["output"] = "unable to evaluate %s: %s" % (args, errors[0])
+        return result
+
+    def run_steps(self, process, step, count, reached=None):
+        self.interrupted.clear()
+        self.dbg.SetAsync(False)
+        try:
+            (steps, why) = run_steps(process, step, count, reached, self.interrupted.is_set)
+        finally:
+            self.dbg.SetAsync(True)
+        return {"success": True, "output": "stepped %d times%s" % (
+            steps, " (%s)" % why if why else ""), "goto_file": True}
+
+
+def state_name(state):
+    """ Returns the name lldb uses for a StateType, such as "stopped" """
+    return lldb.SBDebugger.StateAsCString(state)
+
+
+if __name__ == '__main__':
+    Backend(sys.stdout).serve(iter(sys.stdin.readline, ""))
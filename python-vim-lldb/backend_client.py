@@ -0,0 +1,259 @@
+#
+# The plugin side of the out-of-process backend (see backend.py).
+#
+# With g:lldb_backend set to 'process', ctrl is a BackendController: commands
+# are sent to the backend as asynchronous requests, and the panes are redrawn
+# from the stop records it sends back or pushes, with the same replay objects
+# :Lreplay uses. Vim never waits for LLDB, except for command-line completion.
+#
+
+from __future__ import print_function
+
+import json
+import os
+import sys
+import lldb
+import vim
+from lldb_controller import LLDBController
+from recorder import ReplayTarget
+from utility import *
+from vim_ui import UI
+
+
+class BackendController(LLDBController):
+    """ Handles Vim commands by sending them to the backend process. Commands that need
+        the SB API in Vim's Python (such as :Lbfind) are not available.
+    """
+
+    # Milliseconds to wait for command-line completions
+    completionTimeout = 1000
+
+    def __init__(self):
+        """ Sets what LLDBController.__init__ sets, without an SBDebugger in Vim: the
+            inherited commands (:Lthreads, :Lprofile, :Lhide...) read these.
+        """
+        # Shown target: the ReplayTarget of the last stop record, and the output of the
+        # commands the panes ran for it
+        self.target = None
+        self.process = None
+        self.paneOutput = {}
+        self.breakpoints = []
+        self.load_dependent_modules = True
+
+        # Symbols, sessions, profiles and recordings belong to the backend
+        self.symbolLoader = None
+        self.symbolIndexes = {}
+        self.symbolIndexer = None
+        self.targetLoader = None
+        self.pendingCommands = []
+        self.sessionPath = None
+        self.sessionLocations = []
+        self.profile = None
+        self.symbolizer = None
+        self.recorder = None
+        self.logpointsImported = False
+
+        # The backend owns the debugger and its listeners
+        self.dbg = None
+        self.commandInterpreter = None
+        self.processListener = None
+        self.progressListener = None
+
+        self.ui = UI()
+        self.pollTimer = None
+        self.pollCallback = vim.eval("get(function('s:PollTimer'), 'name')")
+        self.echoLimit = int(vim.eval('s:lldb_echo_limit'))
+
+        # :Lprofile reports the stop latencies; the backend does not time stops
+        self.eventWaitMax = float(vim.eval('s:lldb_event_wait_max'))
+        self.stopLatencies = {}
+        self.remote = int(vim.eval('s:lldb_remote'))
+
+        self.sendFunction = vim.eval("get(function('s:BackendSend'), 'name')")
+        self.evalFunction = vim.eval("get(function('s:BackendEval'), 'name')")
+        command = [vim.eval('s:lldb_backend_python'),
+                   os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend.py"),
+                   os.path.dirname(os.path.dirname(os.path.abspath(lldb.__file__)))]
+        if int(vim.eval("s:BackendStart(%s)" % vim_string_list(command))) == 0:
+            sys.stderr.write("vim-lldb: unable to start the backend: %s" % " ".join(command))
+            return
+
+        self.request("configure", frame_depth=self.ui.backtracePane.depth, commands=[
+            [p.command, p.args] for p in self.ui.paneCol.panes.values() if getattr(p, 'command', None)])
+
+    # ------------------------------------------------------------------
+    # channel
+
+    def request(self, method, **kwargs):
+        """ Sends a request; its result is handled by onBackendMessage """
+        kwargs["method"] = method
+        vim.eval("%s(json_decode('%s'))" % (
+            self.sendFunction, json.dumps(kwargs).replace("'", "''")))
+
+    def onBackendMessage(self, text):
+        """ Handles a result or a notification of the backend """
+        message = json.loads(text)
+        kind = message.get("type")
+        if kind == "output":
+            self.ui.appendOutput(message["text"])
+            self.ui.update_output(self.target, self)
+        elif kind == "state":
+            self.setStatus(message["state"])
+        elif kind == "message":
+            print("vim-lldb: %s" % message["text"])
+        elif kind == "stop":
+            self.setStatus("")
+            self.show(message["record"], message["state"])
+        else:
+            self.showResult(message)
+
+    def onBackendError(self, text):
+        """ Something the backend wrote to stderr, such as a traceback """
+        sys.stderr.write("vim-lldb backend: %s" % text)
+
+    def onBackendExit(self, status):
+        self.setStatus("")
+        print("vim-lldb: the backend exited (status %d)" % status)
+
+    def showResult(self, result):
+        context = result.get("context") or {}
+        if context.get("activate") and result["success"]:
+            self.ui.activate()
+        if result.get("record") is not None:
+            self.show(result["record"], None)
+
+        output = result.get("output") or ""
+        if not result["success"]:
+            sys.stderr.write(output)
+        elif len(output) > 0 and context.get("print", True):
+            if len(output) > self.echoLimit > 0:
+                self.ui.showCommandOutput(context.get("title", ""), strip_ansi(output))
+            else:
+                vim.command('echohl lldb_output')
+                vim.command("let g:lldb_msg='%s'" % strip_ansi(output).replace("'", "''"))
+                vim.command('echo lldb_msg')
+                vim.command('echohl None')
+
+    def show(self, record, status):
+        """ Redraws the panes and signs for a stop record """
+        self.breakpoints = record.get("breakpoints", self.breakpoints)
+        self.target = ReplayTarget(record, self.breakpoints)
+        self.process = self.target.GetProcess() or None
+        self.paneOutput = record["commands"]
+        self.ui.update(self.target, status, self, record["goto_file"])
+
+    def getCommandOutput(self, command, command_args=""):
+        """ Returns the output the backend recorded for a pane's command """
+        return (True, self.paneOutput.get("%s %s" % (command, command_args), ""))
+
+    # ------------------------------------------------------------------
+    # commands
+
+    def completeCommand(self, a, l, p):
+        result = vim.eval("%s(json_decode('%s'), %d)" % (
+            self.evalFunction, json.dumps({"method": "complete", "line": l[1:],
+                                           "cursor": int(p) - 1}).replace("'", "''"),
+            self.completionTimeout))
+        try:
+            return json.loads(result)["output"]
+        except (ValueError, KeyError, TypeError):
+            return []
+
+    def doCommand(self, command, command_args, print_on_success=True, goto_file=False):
+        self.request("command", command="%s %s" % (command, command_args), goto_file=goto_file,
+                     context={"print": print_on_success,
+                              "title": ("(lldb) %s %s" % (command, command_args)).strip()})
+
+    def doTarget(self, args):
+        a = args.split(' ')
+        if len(a) > 1 and a[0] == "create":
+            exe = a[1]
+        elif len(a) == 1 and len(args) > 0 and a[0] not in (
+                "delete", "list", "modules", "select", "stop-hook", "symbols", "variable"):
+            exe = a[0]
+        else:
+            self.doCommand("target", args)
+            return
+        self.request("target", exe=exe, context={"activate": True})
+
+    def doCore(self, args):
+        a = args.split()
+        if len(a) == 0 or len(a) > 2:
+            sys.stderr.write("usage: Lcore <core> [executable]")
+            return
+        self.request("command", command="target create --core %s %s" % (
+            os.path.expanduser(a[0]), os.path.expanduser(a[1]) if len(a) > 1 else ""),
+            goto_file=True, context={"activate": True})
+
+    def doLaunch(self, stop_at_entry, args):
+        self.request("launch", stop_at_entry=stop_at_entry, args=args)
+
+    def doAttach(self, process_name):
+        self.request("attach", name=process_name, context={"activate": True})
+
+    def doDetach(self):
+        self.doCommand("process", "detach")
+
+    def doProcess(self, args):
+        a = args.split(' ')
+        if a[0] == "launch":
+            self.doLaunch('-s' not in args, "")
+        elif a[0] == "interrupt":
+            # Also stops :Lnext <count> and :Luntil
+            self.request("interrupt")
+        else:
+            self.doCommand("process", args)
+
+    def doContinue(self):
+        self.request("continue")
+
+    def doStep(self, stepType, count=""):
+        try:
+            count = int(count) if len(count.strip()) > 0 else 1
+        except ValueError:
+            sys.stderr.write("invalid step count: %s" % count)
+            return
+        self.request("step", kind=stepType, count=count)
+
+    def doUntil(self, args):
+        if len(args.strip()) == 0:
+            sys.stderr.write("usage: Luntil <line> | <file>:<line> | <expression>")
+            return
+        self.request("until", args=args)
+
+    def doRefresh(self):
+        """ Nothing to poll: the backend pushes events """
+        self.ui.cursor_moved(self.target, self)
+
+    def doSelectLine(self):
+        """ The backend selects the frame or thread, and sends the stop record back """
+        selection = self.ui.line_selection(self.target)
+        if selection is not None:
+            self.doSelect(selection[0], "select %d" % selection[1])
+
+    def doBufferShown(self, number):
+        self.ui.buffer_shown(vim.buffers[number])
+
+    def doPoll(self):
+        """ Finishes the last update, if it ran out of time """
+        if not self.ui.refresh(self) and self.pollTimer is not None:
+            vim.eval("timer_stop(%s)" % self.pollTimer)
+            self.pollTimer = None
+
+    def doBreakpointFind(self, query):
+        sys.stderr.write("vim-lldb: :Lbfind is not available with g:lldb_backend")
+
+    def doLogpoint(self, template):
+        sys.stderr.write("vim-lldb: :Llogpoint is not available with g:lldb_backend")
+
+    def doRecord(self, args):
+        sys.stderr.write("vim-lldb: :Lrecord is not available with g:lldb_backend")
+
+    def doSample(self, args):
+        sys.stderr.write("vim-lldb: :Lsample is not available with g:lldb_backend")
+
+    def doSession(self, args):
+        sys.stderr.write("vim-lldb: :Lsession is not available with g:lldb_backend")
+
+    def doExit(self):
+        vim.eval("%s()" % vim.eval("get(function('s:BackendStop'), 'name')"))
@@ -0,0 +1,95 @@
+#
+# Timeouts of the waits for a stop, learned from how long stops take.
+#
+# After a step, launch or continue, Vim blocks until the process stops so that
+# the panes show the stop at once. A wait that ends too early leaves the stop to
+# the poll timer; one that is too long freezes Vim when the process does not
+# stop soon. StopLatency keeps the latest times each kind of command took to
+# stop on a target, and waits a margin over their 95th percentile.
+#
+
+import collections
+import time
+from profiling import percentile
+
+
+class LatencyStats(object):
+    """ The latest stop times of one kind of command, and how the waits for it went """
+
+    def __init__(self, samples):
+        self.samples = collections.deque(maxlen=samples)
+        self.waits = 0
+        # Waits that ended before the process stopped
+        self.overruns = 0
+        self.waited = 0.0
+
+
+class StopLatency(object):
+    """ Stop times of the commands run on one target, by kind ("step over",
+        "continue"...). Until a kind has minSamples stops, its waits use the default
+        the caller gives; after that, margin times the p95 of its latest stops,
+        between minWait and cap seconds.
+    """
+
+    samples = 64
+    minSamples = 5
+    margin = 1.5
+    minWait = 0.05
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.stats = {}
+        # (kind, start time) of the command whose stop has not arrived yet
+        self.pending = None
+
+    def get(self, kind):
+        if kind not in self.stats:
+            self.stats[kind] = LatencyStats(self.samples)
+        return self.stats[kind]
+
+    def timeout(self, kind, default):
+        """ Returns the seconds to wait for the stop of kind """
+        samples = self.get(kind).samples
+        if self.cap <= 0:
+            return default
+        if len(samples) < self.minSamples:
+            return min(default, self.cap)
+        p95 = percentile(sorted(samples), 95)
+        return min(max(p95 * self.margin, self.minWait), self.cap)
+
+    def start(self, kind):
+        """ Starts timing a command of kind """
+        self.pending = (kind, time.time())
+
+    def stopped(self):
+        """ The process stopped: records how long the pending command took """
+        if self.pending is None:
+            return
+        (kind, start) = self.pending
+        self.get(kind).samples.append(time.time() - start)
+        self.pending = None
+
+    def waited(self, kind, seconds):
+        """ Records a wait of seconds for the stop of kind; it overran if the stop has
+            not arrived
+        """
+        stats = self.get(kind)
+        stats.waits += 1
+        stats.waited += seconds
+        if self.pending is not None:
+            stats.overruns += 1
+
+    def report(self):
+        """ Returns lines with the stop times and waits of each kind """
+        lines = []
+        for (kind, stats) in sorted(self.stats.items()):
+            samples = sorted(stats.samples)
+            if len(samples) >= self.minSamples and self.cap > 0:
+                wait = "%8.1f ms" % (self.timeout(kind, 0) * 1000)
+            else:
+                wait = "%11s" % "default"
+            lines.append("%-22s %4d stops  p50 %8.1f ms  p95 %8.1f ms  wait %s  "
+                         "%4d waits %4d overruns" % (
+                             kind, len(samples), percentile(samples, 50) * 1000,
+                             percentile(samples, 95) * 1000, wait, stats.waits, stats.overruns))
+        return lines
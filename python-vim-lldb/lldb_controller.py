@@ -5,13 +5,32 @@
 
 from __future__ import print_function
 
+import functools
+import glob
+import json
 import os
 import re
+import shlex
 import sys
+import tempfile
+import time
 import lldb
 import vim
+import stacks
+from latency import StopLatency
+from logpoints import logpoints
+from memory import StackCache, is_remote
 from utility import *
-from vim_ui import UI
+from profiling import percentile, profiler, profiled
+from recorder import Recorder, read_recording, replay_stops
+from sampler import Profile, Symbolizer
+from session import (breakpoints_path, load_session, location_module, save_session,
+                     session_path, settings_path)
+from stepping import run_steps, until_condition
+from triage import format_record
+from symbols import (SymbolIndexer, SymbolPreloader, TargetLoader, load_module_symbols,
+                     module_key, search_symbols, symbol_cache_dir)
+from vim_ui import UI, location_source
 
 
 # =================================================
@@ -59,6 +78,30 @@ class StepType:
     OUT = 5
 
 
+# Names of the step types in the stop latency report
+STEP_KINDS = {
+    StepType.INSTRUCTION: "step instruction",
+    StepType.INSTRUCTION_OVER: "step instruction over",
+    StepType.INTO: "step into",
+    StepType.OVER: "step over",
+    StepType.OUT: "step out",
+}
+
+
+def queued_while_loading(f):
+    """ Decorator for commands that need the target: while a target is being created
+        in the background, calls are queued and run in order once it is ready.
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        if self.targetLoader is not None:
+            self.pendingCommands.append((f.__name__, args, kwargs))
+            print("vim-lldb: waiting for target %s to load" % self.targetLoader.exe)
+            return
+        return f(self, *args, **kwargs)
+    return wrapper
+
+
 class LLDBController(object):
     """ Handles Vim and LLDB events such as commands and lldb events. """
 
@@ -69,16 +112,66 @@ class LLDBController(object):
     # Vim UI is "blocked". Lower numbers will make Vim more responsive, but LLDB will be delayed and higher
     # numbers will mean that LLDB events are processed faster, but the Vim UI may appear less responsive at
     # times.
+    # These are the waits until enough stops of the target have been timed; after that, the waits for
+    # steps, launches and continues follow how long they take to stop (see latency.StopLatency), up to
+    # g:lldb_event_wait_max seconds. A key press ends a wait.
     eventDelayStep = 2
     eventDelayLaunch = 1
     eventDelayContinue = 1
 
+    # Seconds between checks for a process event while waiting less than a second for one
+    eventPollSlice = 0.002
+
+    # Period (msec) of the timer that services background work, such as creating a target
+    pollInterval = 100
+
+    # Seconds between checks for a key press that interrupts :Lnext <count> and :Luntil
+    interruptCheck = 0.1
+
+    # Characters of inferior output read at a time
+    outputChunk = 64 * 1024
+
+    # Stack memory and registers prefetched at each stop of a remote process
+    stackCache = None
+
     def __init__(self):
         """ Creates the LLDB SBDebugger object and initializes the UI class. """
+        # Selected target and its process; the panes show these. The debugger may hold
+        # other targets (see :Ltarget list and :Ltarget select).
         self.target = None
         self.process = None
         self.load_dependent_modules = True
 
+        # Loads module symbols in the background after :Lcore
+        self.symbolLoader = None
+
+        # Symbol indexes searched by :Lbfind { module key --> SymbolIndex }, built by
+        # symbolIndexer in the background
+        self.symbolIndexes = {}
+        self.symbolIndexer = None
+
+        # Creates the target in the background after :Ltarget, and the commands
+        # that were issued in the meantime [(method name, args, kwargs)]
+        self.targetLoader = None
+        self.pendingCommands = []
+
+        # File of the session restored or saved by :Lsession, which is saved again on
+        # exit, and the breakpoint locations [(file, line, resolved, module UUID)] it had
+        self.sessionPath = None
+        self.sessionLocations = []
+
+        # The last :Lsample profile, and the names of the addresses of the process
+        # it sampled
+        self.profile = None
+        self.symbolizer = None
+
+        # Timer calling doPoll while there is background work. Timer callbacks must be
+        # named globally, so resolve the script-local one while lldb.vim is sourced.
+        self.pollTimer = None
+        self.pollCallback = None
+        if int(vim.eval("has('timers')")) != 0:
+            self.pollCallback = vim.eval("get(function('s:PollTimer'), 'name')")
+
         self.dbg = lldb.SBDebugger.Create()
         # during step/continue do not return from function until process stops
         # async is enabled by default, but overridden in vimrc g:lldb_enable_async
@@ -88,10 +181,51 @@ class LLDBController(object):
         else:
             self.dbg.SetAsync(True)
 
+        # Without colours, command output needs no escape sequences stripped (see
+        # utility.strip_ansi); with g:lldb_color the panes show them as highlights
+        self.dbg.SetUseColor(int(vim.eval('s:lldb_color')) != 0)
+
         self.commandInterpreter = self.dbg.GetCommandInterpreter()
 
+        # One listener receives the events of every process, whichever target it
+        # belongs to; processPendingEvents dispatches them by process.
+        self.processListener = lldb.SBListener("vim-lldb process events")
+
+        # Progress reports (parsing symbols, indexing...) are shown in g:lldb_status
+        self.progressListener = None
+        if hasattr(lldb.SBDebugger, 'eBroadcastBitProgress'):
+            self.progressListener = lldb.SBListener("vim-lldb progress")
+            self.dbg.GetBroadcaster().AddListener(
+                self.progressListener, lldb.SBDebugger.eBroadcastBitProgress)
+
         self.ui = UI()
 
+        # Longer command output goes to the output pane instead of the command line
+        self.echoLimit = int(vim.eval('s:lldb_echo_limit'))
+
+        # Logpoint messages waiting for the log pane are bounded like its lines. The
+        # callback is looked up in LLDB's script interpreter, which imports the
+        # logpoints module (once) from the same sys.path as Vim's Python.
+        logpoints.set_limit(int(vim.eval('s:lldb_output_lines')))
+        self.logpointsImported = False
+
+        # Opt-in recording of stops (see :Lrecord)
+        self.recorder = None
+
+        # How long steps, launches and continues take to stop { executable --> StopLatency }
+        self.eventWaitMax = float(vim.eval('s:lldb_event_wait_max'))
+        self.stopLatencies = {}
+
+        # g:lldb_remote is 1 to prefetch for every process, 0 never, and -1 (default) for
+        # processes on a remote-* platform
+        self.remote = int(vim.eval('s:lldb_remote'))
+        prefetch = int(vim.eval('s:lldb_remote_prefetch'))
+        if prefetch > 0 and self.remote != 0:
+            self.stackCache = StackCache(prefetch)
+
+        if int(vim.eval('s:lldb_profile')) != 0:
+            profiler.start(vim, lldb)
+
     def completeCommand(self, a, l, p):
         """ Returns a list of viable completions for command a with length l and cursor at p  """
 
@@ -120,18 +254,34 @@ class LLDBController(object):
         else:
             return []
 
-    def doStep(self, stepType):
-        """ Perform a step command and block the UI for eventDelayStep seconds in order to process
-            events on lldb's event queue.
-            FIXME: if the step does not complete in eventDelayStep seconds, we relinquish control to
-                   the main thread to avoid the appearance of a "hang". If this happens, the UI will
-                   update whenever; usually when the user moves the cursor. This is somewhat annoying.
+    @queued_while_loading
+    def doStep(self, stepType, count=""):
+        """ Perform a step command and block the UI until the step stops, for as long as steps of
+            this type usually take on this target (see waitForStop), in order to process events on
+            lldb's event queue. With a count, step that many times (see runSteps).
+            If the step does not complete in time, we relinquish control to the main thread to avoid
+            the appearance of a "hang", and the poll timer shows the stop once it arrives.
         """
         if not self.process:
             sys.stderr.write("No process to step")
             return
+        try:
+            count = int(count) if len(count.strip()) > 0 else 1
+        except ValueError:
+            sys.stderr.write("invalid step count: %s" % count)
+            return
+
+        if count > 1:
+            self.runSteps(stepType, count)
+            return
+
+        self.stopLatency().start(STEP_KINDS[stepType])
+        self.stepThread(self.process.GetSelectedThread(), stepType)
+        self.startPolling()
+        self.waitForStop(STEP_KINDS[stepType], self.eventDelayStep, True)
 
-        t = self.process.GetSelectedThread()
+    def stepThread(self, t, stepType):
+        """ Starts a step of thread t """
         if stepType == StepType.INSTRUCTION:
             t.StepInstruction(False)
         if stepType == StepType.INSTRUCTION_OVER:
@@ -143,13 +293,75 @@ class LLDBController(object):
         elif stepType == StepType.OUT:
             t.StepOut()
 
-        self.processPendingEvents(self.eventDelayStep, True)
+    @queued_while_loading
+    def doUntil(self, args):
+        """ Handle :Luntil <line>|<file>:<line>|<expression>: step over lines until the
+            selected thread reaches the line, or the expression is true in its frame.
+        """
+        if not self.process:
+            sys.stderr.write("No process to step")
+            return
+        if len(args.strip()) == 0:
+            sys.stderr.write("usage: Luntil <line> | <file>:<line> | <expression>")
+            return
+
+        errors = []
+        self.runSteps(StepType.OVER, None, until_condition(args.strip(), errors))
+        if len(errors) > 0:
+            sys.stderr.write("unable to evaluate %s: %s" % (args, errors[0]))
+
+    def runSteps(self, stepType, count, reached=None):
+        """ Steps the selected thread count times, or until reached(thread) is True; a
+            breakpoint, signal or exception also ends the run (see stepping.run_steps).
+            The steps run in synchronous mode without touching Vim, except to check
+            every interruptCheck seconds whether a key was pressed, which interrupts
+            them. Only the last stop is shown.
+        """
+        asynchronous = self.dbg.GetAsync()
+        self.dbg.SetAsync(False)
+        next_check = [time.time() + self.interruptCheck]
+
+        def interrupted():
+            if time.time() < next_check[0]:
+                return False
+            next_check[0] = time.time() + self.interruptCheck
+            if vim.eval("getchar(1)") == '0':
+                return False
+            vim.eval("getchar(0)")
+            return True
+
+        try:
+            (steps, why) = run_steps(self.process, lambda t: self.stepThread(t, stepType),
+                                     count, reached, interrupted)
+        finally:
+            self.dbg.SetAsync(asynchronous)
+
+        # In synchronous mode the stops may not have reached the listener
+        if not self.processPendingEvents(0, True):
+            self.ui.update(self.target, "", self, True)
+        print("vim-lldb: stepped %d times%s" % (steps, " (%s)" % why if why else ""))
 
     def doSelect(self, command, args):
         """ Like doCommand, but suppress output when "select" is the first argument."""
         a = args.split(' ')
         return self.doCommand(command, args, "select" != a[0], True)
 
+    def doSelectLine(self):
+        """ <CR> in the backtrace or threads pane: selects the frame or thread on the
+            cursor line through the SB API, and redraws only what depends on it
+        """
+        selection = self.ui.line_selection(self.target)
+        if selection is None or self.process is None or not self.process.IsValid():
+            return
+        (kind, id) = selection
+        if kind == 'frame':
+            selected = self.process.GetSelectedThread().SetSelectedFrame(id).IsValid()
+        else:
+            selected = self.process.SetSelectedThreadByIndexID(id)
+        if selected:
+            self.ui.update_selection(self.target, self, kind)
+
+    @queued_while_loading
     def doProcess(self, args):
         """ Handle 'process' command. If 'launch' is requested, use doLaunch() instead
             of the command interpreter to start the inferior process.
@@ -161,23 +373,26 @@ class LLDBController(object):
         else:
             self.doLaunch('-s' not in args, "")
 
+    @queued_while_loading
     def doAttach(self, process_name):
         """ Handle process attach.  """
         error = lldb.SBError()
 
-        self.processListener = lldb.SBListener("process_event_listener")
-        self.target = self.dbg.CreateTarget('')
-        self.process = self.target.AttachToProcessWithName(
+        target = self.dbg.CreateTarget('')
+        process = target.AttachToProcessWithName(
             self.processListener, process_name, False, error)
         if not error.Success():
             sys.stderr.write("Error during attach: " + str(error))
             return
 
+        self.selectTarget(target)
+        self.startPolling()
         self.ui.activate()
         self.pid = self.process.GetProcessID()
 
         print("Attached to %s (pid=%d)" % (process_name, self.pid))
 
+    @queued_while_loading
     def doDetach(self):
         if self.process is not None and self.process.IsValid():
             pid = self.process.GetProcessID()
@@ -185,6 +400,7 @@ class LLDBController(object):
             self.process.Detach()
             self.processPendingEvents(self.eventDelayLaunch)
 
+    @queued_while_loading
     def doLaunch(self, stop_at_entry, args):
         """ Handle process launch.  """
         error = lldb.SBError()
@@ -196,7 +412,12 @@ class LLDBController(object):
             state = state_type_to_str(self.process.GetState())
             self.process.Destroy()
 
+        if len(self.liveProcesses()) == 0:
+            self.ui.outputPane.ring.clear()
         launchInfo = lldb.SBLaunchInfo(args.split(' '))
+        # Get the stop at the entry point too, which comes before Launch returns
+        launchInfo.SetListener(self.processListener)
+        self.stopLatency().start("launch")
         self.process = self.target.Launch(launchInfo, error)
         if not error.Success():
             sys.stderr.write("Error during launch: " + str(error))
@@ -204,17 +425,19 @@ class LLDBController(object):
 
         # launch succeeded, store pid and add some event listeners
         self.pid = self.process.GetProcessID()
-        self.processListener = lldb.SBListener("process_event_listener")
         self.process.GetBroadcaster().AddListener(
-            self.processListener, lldb.SBProcess.eBroadcastBitStateChanged)
+            self.processListener, lldb.SBProcess.eBroadcastBitStateChanged |
+            lldb.SBProcess.eBroadcastBitSTDOUT | lldb.SBProcess.eBroadcastBitSTDERR)
+        self.startPolling()
 
         print("Launched %s %s (pid=%d)" % (exe, args, self.pid))
 
         if not stop_at_entry:
             self.doContinue()
         else:
-            self.processPendingEvents(self.eventDelayLaunch)
+            self.waitForStop("launch", self.eventDelayLaunch)
 
+    @queued_while_loading
     def doTarget(self, args):
         """ Pass target command to interpreter, except if argument is not one of the valid options, or
             is create, in which case try to create a target with the argument as the executable. For example:
@@ -240,18 +463,325 @@ class LLDBController(object):
         elif len(a) == 1 and a[0] not in target_args:
             exe = a[0]
 
-        err = lldb.SBError()
-        self.target = self.dbg.CreateTarget(
-            exe, None, None, self.load_dependent_modules, err)
-        if not self.target:
+        self.loadTarget(exe)
+
+    def loadTarget(self, exe, breakpoints=None):
+        """ Creates a target for exe, and the breakpoints saved in the file breakpoints
+            (if given), in the background
+        """
+        loader = TargetLoader(self.dbg, exe, self.load_dependent_modules, breakpoints)
+        if self.pollCallback is None:
+            loader.run()
+            self.finishLoader(loader)
+            return
+
+        # Parsing a large executable and its dependents can take a while: do it on a
+        # worker thread, and queue the commands that need the target until it is done.
+        self.targetLoader = loader
+        self.targetLoader.start()
+        self.setStatus("loading %s" % exe)
+        print("vim-lldb: loading target %s" % exe)
+        self.startPolling()
+
+    def finishLoader(self, loader):
+        """ Shows the target loader created, and reports the breakpoints it restored """
+        self.finishTarget(loader.exe, loader.target, loader.error)
+        if loader.breakpointsFile is None or not loader.target:
+            return
+        if loader.breakpointsError.Fail():
+            sys.stderr.write("unable to restore breakpoints: %s" %
+                             loader.breakpointsError.GetCString())
+            return
+        # The update in finishTarget already moved the signs of the saved locations
+        locations = self.breakpointLocations(self.target)
+        moved = set(l[:3] for l in self.sessionLocations) - set(l[:3] for l in locations)
+        rebuilt = set(l[3] for l in self.sessionLocations) - set(l[3] for l in locations) - set([""])
+        message = "vim-lldb: restored %d breakpoints" % loader.breakpoints.GetSize()
+        if len(moved) > 0:
+            message += ", %d locations moved" % len(moved)
+        if len(rebuilt) > 0:
+            message += " (%d modules changed since the session was saved)" % len(rebuilt)
+        print(message)
+
+    def finishTarget(self, exe, target, err):
+        """ Makes target, created for exe, the current one and shows it """
+        if not target:
             sys.stderr.write(
                 "Error creating target %s. %s" %
                 (str(exe), str(err)))
             return
 
+        self.selectTarget(target)
+        self.indexSymbols(True)
         self.ui.activate()
         self.ui.update(self.target, "created target %s" % str(exe), self)
 
+    def pollTargetLoader(self):
+        """ Once the target being created in the background is ready, show it and
+            run the commands that were queued in the meantime.
+        """
+        loader = self.targetLoader
+        if loader is None or not loader.done:
+            return
+        self.targetLoader = None
+        self.setStatus("")
+        self.finishLoader(loader)
+
+        pending = self.pendingCommands
+        self.pendingCommands = []
+        while len(pending) > 0:
+            (name, args, kwargs) = pending.pop(0)
+            getattr(self, name)(*args, **kwargs)
+            if self.targetLoader is not None:
+                # A queued :Ltarget started another load; the rest waits for it
+                self.pendingCommands = pending + self.pendingCommands
+                return
+
+    def pollProgress(self):
+        """ Shows the latest progress report of the debugger in g:lldb_status """
+        if self.progressListener is None:
+            return
+        event = lldb.SBEvent()
+        message = None
+        while self.progressListener.GetNextEvent(event):
+            (title, progress_id, completed, total, is_debugger_specific) = \
+                lldb.SBDebugger.GetProgressFromEvent(event)
+            if completed == total:
+                message = ""
+            elif total == 0 or total >= 2**64 - 1:
+                # Progress of unknown length
+                message = title
+            else:
+                message = "%s (%d/%d)" % (title, completed, total)
+        if message is not None:
+            self.setStatus(message)
+
+    def setStatus(self, message):
+        """ Sets g:lldb_status, which a 'statusline' can show, and redraws status lines """
+        vim.command("let g:lldb_status = '%s'" % message.replace("'", "''"))
+        vim.command("redrawstatus")
+
+    def startPolling(self):
+        """ Calls doPoll every pollInterval msec until there is no background work left """
+        if self.pollTimer is None and self.pollCallback is not None:
+            self.pollTimer = vim.eval("timer_start(%d, function('%s'), {'repeat': -1})" % (
+                self.pollInterval, self.pollCallback))
+
+    def pollBackground(self):
+        """ Services background work: reports progress and finishes target creation and
+            symbol loading once they are done.
+        """
+        self.pollProgress()
+        self.pollTargetLoader()
+        self.pollSymbolLoader()
+
+    def selectTarget(self, target):
+        """ Makes target (and its process, if any) the one the panes show """
+        self.target = target
+        process = target.GetProcess()
+        self.process = process if process.IsValid() else None
+        self.dbg.SetSelectedTarget(target)
+
+    def syncSelectedTarget(self):
+        """ Follows the debugger's selected target and its process, which commands such
+            as 'target select' or 'process attach' change. processPendingEvents calls
+            this first, so the selected process is never taken for another one. Returns
+            True if either changed.
+        """
+        if self.targetLoader is not None:
+            # The target being created is selected, but shown once it is ready
+            return False
+        target = self.dbg.GetSelectedTarget()
+        if not target.IsValid():
+            return False
+        if self.target is not None and target == self.target:
+            process = target.GetProcess()
+            pid = process.GetProcessID() if process.IsValid() else None
+            if pid == (self.process.GetProcessID() if self.process is not None else None):
+                return False
+        self.selectTarget(target)
+        return True
+
+    def liveProcesses(self):
+        """ Returns the processes of all targets that have not exited """
+        ret = []
+        for i in range(self.dbg.GetNumTargets()):
+            process = self.dbg.GetTargetAtIndex(i).GetProcess()
+            if process.IsValid() and process.GetState() not in (
+                    lldb.eStateInvalid, lldb.eStateExited, lldb.eStateDetached):
+                ret.append(process)
+        return ret
+
+    def isRunning(self):
+        """ Returns True if any process is running """
+        return any(p.GetState() in (lldb.eStateLaunching, lldb.eStateRunning,
+                                    lldb.eStateStepping) for p in self.liveProcesses())
+
+    def doPoll(self):
+        """ Called by the poll timer: services background work and, while the process
+            runs, its events (such as output). Stops the timer once there is nothing to do.
+        """
+        self.pollBackground()
+        running = self.isRunning()
+        if not (running and self.processPendingEvents()):
+            # Finish the last update, if it ran out of time
+            self.ui.refresh(self)
+        if self.pollTimer is not None and not running and len(self.ui.pendingRefresh) == 0 and \
+                self.targetLoader is None and self.symbolLoader is None:
+            vim.eval("timer_stop(%s)" % self.pollTimer)
+            self.pollTimer = None
+
+    @queued_while_loading
+    def doCore(self, args):
+        """ Handle :Lcore <core> [executable]. The core is opened without dependent modules
+            and with on-demand symbols. Only the modules in the crashing thread's frames are
+            loaded before the UI is drawn; the others are loaded in the background.
+        """
+        a = args.split()
+        if len(a) == 0 or len(a) > 2:
+            sys.stderr.write("usage: Lcore <core> [executable]")
+            return
+        core = os.path.expanduser(a[0])
+        exe = os.path.expanduser(a[1]) if len(a) > 1 else ""
+
+        if self.symbolLoader is not None:
+            self.symbolLoader.cancel()
+            self.symbolLoader = None
+
+        # Symbol files are only parsed when needed (LLDB 16+). The setting applies when
+        # modules are created, so it can be restored once the core is loaded.
+        (success, output) = self.getCommandOutput("settings", "show symbols.load-on-demand")
+        previous = re.search(r'=\s*(\w+)', output) if success else None
+        self.getCommandOutput("settings", "set symbols.load-on-demand true")
+
+        err = lldb.SBError()
+        target = self.dbg.CreateTarget(exe, None, None, False, err)
+        process = None
+        if target:
+            process = target.LoadCore(core, err)
+
+        if previous is not None:
+            self.getCommandOutput("settings", "set symbols.load-on-demand %s" % previous.group(1))
+
+        if not target or not process or not process.IsValid():
+            sys.stderr.write("Error loading core %s. %s" % (core, str(err)))
+            return
+
+        self.selectTarget(target)
+
+        thread = stacks.crashing_thread(process)
+        process.SetSelectedThread(thread)
+
+        shown = stacks.frame_modules(thread, self.ui.backtracePane.depth)
+        for module in shown:
+            load_module_symbols(module)
+        self.symbolLoader = SymbolPreloader(target, [module_key(m) for m in shown])
+        self.symbolLoader.start()
+        self.startPolling()
+        self.indexSymbols(True)
+
+        self.ui.activate()
+        self.ui.update(self.target, "loaded core %s (loading symbols of %d modules in the background)" % (
+            core, self.symbolLoader.total - len(shown)), self, True)
+
+    def pollSymbolLoader(self):
+        """ Redraw once the background symbol loading started by :Lcore is done """
+        loader = self.symbolLoader
+        if loader is None or not loader.done:
+            return
+        self.symbolLoader = None
+        if not loader.cancelled:
+            self.ui.update(self.target, "loaded symbols of %d modules" % loader.total, self)
+
+    @queued_while_loading
+    def indexSymbols(self, reset=False):
+        """ Starts indexing the symbols of the target's modules that are not indexed yet
+            (such as shared libraries loaded since the last time) in the background.
+            With reset, the indexes of the previous target are dropped first.
+        """
+        if reset:
+            if self.symbolIndexer is not None:
+                self.symbolIndexer.cancel()
+                self.symbolIndexer = None
+            self.symbolIndexes = {}
+        if self.symbolIndexer is not None and not self.symbolIndexer.done:
+            return
+        indexer = SymbolIndexer(self.target, self.symbolIndexes, symbol_cache_dir())
+        if indexer.total > 0:
+            self.symbolIndexer = indexer
+            indexer.start()
+
+    @queued_while_loading
+    def doBreakpointFind(self, query):
+        """ Handle :Lbfind <query>: list the code symbols whose name contains query, or its
+            characters in order, and set a breakpoint at the address of the one picked.
+        """
+        if not self.target or not self.target.IsValid():
+            sys.stderr.write("No target to search")
+            return
+        self.indexSymbols()
+
+        (matches, complete) = search_symbols(list(self.symbolIndexes.values()), query)
+        notes = ""
+        if self.symbolIndexer is not None and not self.symbolIndexer.done:
+            notes += " (indexed %d of %d modules)" % (self.symbolIndexer.indexed,
+                                                      self.symbolIndexer.total)
+        if not complete:
+            notes += " (fuzzy search stopped early)"
+        if len(matches) == 0:
+            print("vim-lldb: no symbols match %s%s" % (query, notes))
+            return
+
+        items = ["Set breakpoint at%s:" % notes]
+        for (n, (index, i)) in enumerate(matches):
+            items.append("%d. %s [%s]" % (
+                n + 1, index.names[i], index.module.GetFileSpec().GetFilename()))
+        choice = int(vim.eval("inputlist([%s])" % ", ".join(
+            "'%s'" % item.replace("'", "''") for item in items)))
+        if choice < 1 or choice > len(matches):
+            return
+
+        (index, i) = matches[choice - 1]
+        bp = self.target.BreakpointCreateBySBAddress(
+            index.module.ResolveFileAddress(index.addresses[i]))
+        self.ui.update(self.target, "", self)
+        print("Breakpoint %d: %s" % (bp.GetID(), index.names[i]))
+
+    @queued_while_loading
+    def doLogpoint(self, template):
+        """ Handle :Llogpoint <message>: set a breakpoint at the line under the cursor that,
+            when hit, adds message to the log pane, with each {expression} replaced by its
+            value, and lets the process continue.
+        """
+        if not self.target or not self.target.IsValid():
+            sys.stderr.write("No target to set a logpoint in")
+            return
+        if len(template.strip()) == 0:
+            sys.stderr.write("usage: Llogpoint <message with {expressions}>")
+            return
+
+        if not self.logpointsImported:
+            (success, output) = self.getCommandOutput("script", "import logpoints")
+            if not success:
+                sys.stderr.write("unable to import logpoints into lldb: %s" % output)
+                return
+            self.logpointsImported = True
+
+        name = vim.current.buffer.name
+        line = vim.current.window.cursor[0]
+        bp = self.target.BreakpointCreateByLocation(name, line)
+        if not bp.IsValid():
+            sys.stderr.write("unable to set a logpoint at %s:%d" % (name, line))
+            return
+        logpoints.add(self.target, bp, template)
+        bp.SetScriptCallbackFunction("logpoints.logpoint_hit")
+
+        self.ui.showWindow('log')
+        self.ui.update(self.target, "", self)
+        print("Logpoint %d: %s:%d (%d locations)" % (
+            bp.GetID(), os.path.basename(name), line, bp.GetNumLocations()))
+
+    @queued_while_loading
     def doContinue(self):
         """ Handle 'contiue' command.
             FIXME: switch to doCommand("continue", ...) to handle -i ignore-count param.
@@ -260,8 +790,10 @@ class LLDBController(object):
             sys.stderr.write("No process to continue")
             return
 
+        self.stopLatency().start("continue")
         self.process.Continue()
-        self.processPendingEvents(self.eventDelayContinue)
+        self.startPolling()
+        self.waitForStop("continue", self.eventDelayContinue)
 
     def doBreakpoint(self, args):
         """ Handle breakpoint command with command interpreter, except if the user calls
@@ -295,8 +827,16 @@ class LLDBController(object):
 
     def doRefresh(self):
         """ process pending events and update UI on request """
+        self.ui.cursor_moved(self.target, self)
+        self.pollBackground()
         status = self.processPendingEvents()
 
+    def doBufferShown(self, number):
+        """ A buffer was read or shown in a window: place its signs from the
+            locations of the last update
+        """
+        self.ui.buffer_shown(vim.buffers[number])
+
     def doShow(self, name):
         """ handle :Lshow <name> """
         if not name:
@@ -311,10 +851,362 @@ class LLDBController(object):
         if self.ui.hideWindow(name):
             self.ui.update(self.target, "", self)
 
+    def doThreads(self, args):
+        """ handle :Lthreads [name|reason|function|containing] <pattern>, which filters
+            the threads pane. With no arguments, the filter is removed. 'containing'
+            also fills the quickfix list with the matching frames.
+        """
+        a = args.split(' ', 1)
+        if len(args) == 0:
+            ok = self.ui.setThreadFilter()
+        elif len(a) == 2:
+            ok = self.ui.setThreadFilter(a[0], a[1])
+        else:
+            sys.stderr.write("usage: Lthreads [name|reason|function|containing] <pattern>")
+            return
+
+        if not ok:
+            return
+        if a[0] == 'containing' and self.process is not None and \
+                self.process.IsValid() and self.process.GetState() == lldb.eStateStopped:
+            count = self.ui.show_stack_matches(self.process, self.ui.threadPane.filter[1])
+            self.ui.update(self.target, "%d threads contain %s" % (count, a[1]), self)
+        else:
+            self.ui.update(self.target, "", self)
+
+    def doProfile(self, args):
+        """ handle :Lprofile [start|stop|clear|dump [file]]. With no arguments, print
+            p50/p95/max of each recorded stage, and how long the target's steps, launches
+            and continues took to stop.
+        """
+        a = args.split()
+        if len(a) == 0:
+            for line in profiler.report() + self.stopLatency().report():
+                print(line)
+        elif a[0] == 'start':
+            profiler.start(vim, lldb)
+            print("vim-lldb: profiling started")
+        elif a[0] == 'stop':
+            profiler.stop()
+            print("vim-lldb: profiling stopped")
+        elif a[0] == 'clear':
+            profiler.clear()
+        elif a[0] == 'dump':
+            if len(a) > 1:
+                path = os.path.expanduser(a[1])
+            else:
+                path = os.path.join(tempfile.gettempdir(),
+                                    "vim-lldb-trace-%d.json" % os.getpid())
+            profiler.dump(path)
+            print("vim-lldb: wrote trace to %s" % path)
+        else:
+            sys.stderr.write("usage: Lprofile [start|stop|clear|dump [file]]")
+
+    def doRecord(self, args):
+        """ handle :Lrecord start [file] and :Lrecord stop """
+        a = args.split()
+        if len(a) > 0 and a[0] == 'start':
+            if self.recorder is not None:
+                self.recorder.close()
+            if len(a) > 1:
+                path = os.path.expanduser(a[1])
+            else:
+                path = os.path.join(tempfile.gettempdir(),
+                                    "vim-lldb-%d.rec.gz" % os.getpid())
+            self.recorder = Recorder(path, self.ui.backtracePane.depth)
+            print("vim-lldb: recording to %s" % path)
+        elif len(a) > 0 and a[0] == 'stop' and self.recorder is not None:
+            self.recorder.close()
+            print("vim-lldb: recorded %d stops to %s" % (self.recorder.numStops, self.recorder.path))
+            self.recorder = None
+        else:
+            sys.stderr.write("usage: Lrecord start [file] | Lrecord stop")
+
+    def doReplay(self, path):
+        """ handle :Lreplay <file>: redraw each recorded stop, without a live process, and
+            report how long the UI took to update.
+        """
+        try:
+            records = read_recording(os.path.expanduser(path))
+        except (IOError, OSError, ValueError) as e:
+            sys.stderr.write("unable to read recording %s: %s" % (path, str(e)))
+            return
+
+        self.ui.activate()
+        times = []
+        for (target, controller, status, goto_file) in replay_stops(records):
+            start = time.time()
+            self.ui.update(target, None, controller, goto_file, 0)
+            times.append(time.time() - start)
+            vim.command("redraw")
+
+        if len(times) == 0:
+            print("vim-lldb: no stops in %s" % path)
+            return
+        times.sort()
+        print("vim-lldb: replayed %d stops in %.1f ms (p50 %.2f ms, p95 %.2f ms, max %.2f ms)" % (
+            len(times), sum(times) * 1000, percentile(times, 50) * 1000,
+            percentile(times, 95) * 1000, times[-1] * 1000))
+
     def doExit(self):
+        if self.sessionPath is not None:
+            self.saveSession(self.sessionPath)
+        if self.symbolIndexer is not None:
+            self.symbolIndexer.cancel()
+        if self.recorder is not None:
+            self.recorder.close()
         self.dbg.Terminate()
         self.dbg = None
 
+    def doSession(self, args):
+        """ handle :Lsession [save|load] [file]. The default file is the session of the
+            project in Vim's current directory.
+        """
+        a = args.split(None, 1)
+        if len(a) == 0 or a[0] not in ("save", "load"):
+            sys.stderr.write("usage: Lsession save|load [file]")
+            return
+        if len(a) > 1:
+            path = os.path.abspath(os.path.expanduser(a[1]))
+        else:
+            path = session_path(vim.eval("getcwd()"))
+        if a[0] == "save":
+            if self.saveSession(path):
+                print("vim-lldb: saved session %s" % path)
+        else:
+            self.loadSession(path)
+
+    def breakpointLocations(self, target):
+        """ Returns [(file, line, resolved, module UUID)] of the breakpoints of target """
+        ret = []
+        for i in range(target.GetNumBreakpoints()):
+            bp = target.GetBreakpointAtIndex(i)
+            for j in range(bp.GetNumLocations()):
+                loc = bp.GetLocationAtIndex(j)
+                source = location_source(loc)
+                if source is not None:
+                    ret.append(source + (loc.IsResolved(), location_module(loc)))
+        return ret
+
+    def saveSession(self, path):
+        """ Saves the target, its breakpoints (but not logpoints, whose callbacks LLDB does
+            not save), the shown panes, the thread filter and LLDB's settings to path.
+            Returns True on success.
+        """
+        session = {"project": vim.eval("getcwd()"), "panes": self.ui.shown_panes()}
+        target = self.target if self.target is not None and self.target.IsValid() else None
+        breakpoints = None
+        if target is not None:
+            fs = target.GetExecutable()
+            session["target"] = os.path.join(fs.GetDirectory(), fs.GetFilename())
+            breakpoints = lldb.SBBreakpointList(target)
+            for i in range(target.GetNumBreakpoints()):
+                bp = target.GetBreakpointAtIndex(i)
+                if logpoints.find(target, bp.GetID()) is None:
+                    breakpoints.Append(bp)
+            session["breakpoints"] = [list(l) for l in self.breakpointLocations(target)]
+        if self.ui.threadPane.filter is not None:
+            (field, pattern) = self.ui.threadPane.filter
+            session["thread_filter"] = [field, pattern.pattern]
+
+        error = save_session(path, session, target, breakpoints)
+        if error is not None:
+            sys.stderr.write("unable to save session %s: %s" % (path, error))
+            return False
+        # Older LLDBs cannot write their settings; the rest of the session still works
+        self.getCommandResult("settings", "write -f %s" % settings_path(path))
+        self.sessionPath = path
+        return True
+
+    @queued_while_loading
+    def loadSession(self, path):
+        """ Restores the session saved in path. The breakpoint signs are placed from the
+            saved locations while the target loads and its breakpoints resolve.
+        """
+        session = load_session(path)
+        if session is None:
+            sys.stderr.write("no session in %s" % path)
+            return
+        self.sessionPath = path
+
+        if os.path.exists(settings_path(path)):
+            self.getCommandResult("settings", "read -f %s" % settings_path(path))
+        if "thread_filter" in session:
+            self.ui.setThreadFilter(*session["thread_filter"])
+        if len(session.get("panes", [])) > 0:
+            # The session's layout is the one :Lshow and new targets bring up
+            self.ui.defaultPanes = [p for p in session["panes"] if self.ui.paneCol.havePane(p)]
+        self.ui.activate()
+
+        self.sessionLocations = [tuple(l) for l in session.get("breakpoints", [])]
+        self.ui.show_cached_breakpoints([l[:3] for l in self.sessionLocations])
+        if "target" in session:
+            bps = breakpoints_path(path)
+            self.loadTarget(session["target"], bps if os.path.exists(bps) else None)
+
+    def doTriage(self, args):
+        """ handle :Ltriage <glob> [--exe <executable>] [--locals <var>,...] [-j <jobs>]:
+            triage the matching core files in parallel, in a job (see triage.py), and
+            show a line per core in the triage pane as each one is done.
+        """
+        try:
+            a = shlex.split(args)
+        except ValueError as e:
+            sys.stderr.write("Ltriage: %s" % str(e))
+            return
+        if len(a) == 0:
+            sys.stderr.write("usage: Ltriage <glob> [--exe <executable>] [--locals <var>,...]")
+            return
+        cores = sorted(glob.glob(os.path.expanduser(a[0])))
+        if len(cores) == 0:
+            sys.stderr.write("no core files match %s" % a[0])
+            return
+
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "triage.py")
+        lldb_dir = os.path.dirname(os.path.dirname(os.path.abspath(lldb.__file__)))
+        command = [vim.eval('s:lldb_backend_python'), script, "--lldb", lldb_dir] + \
+            a[1:] + ["--"] + cores
+        self.ui.triagePane.ring.clear()
+        self.ui.showWindow('triage')
+        self.ui.appendTriage("triaging %d cores matching %s" % (len(cores), a[0]))
+        if int(vim.eval("s:TriageStart(%s)" % vim_string_list(command))) == 0:
+            sys.stderr.write("vim-lldb: unable to start %s" % script)
+
+    def onTriageRecord(self, line):
+        """ Shows the triage record of a core (a JSON line of triage.py) """
+        try:
+            self.ui.appendTriage(format_record(json.loads(line)))
+        except (ValueError, KeyError):
+            self.ui.appendTriage(line)
+
+    def onTriageMessage(self, line):
+        """ Shows what triage.py wrote to stderr, such as its summary """
+        self.ui.appendTriage(line)
+
+    def onTriageExit(self, status):
+        if status != 0:
+            self.ui.appendTriage("triage exited with status %d" % status)
+
+    def doSample(self, args):
+        """ handle :Lsample [seconds] [hz], which samples the stacks of the running
+            process and shows where its threads spend their time in the profile
+            pane, and :Lsample write <file>, which writes the last profile in the
+            collapsed stack format of flamegraph.pl.
+        """
+        a = args.split()
+        if len(a) > 0 and a[0] == 'write':
+            self.writeProfile(os.path.expanduser(" ".join(a[1:])))
+            return
+        try:
+            seconds = float(a[0]) if len(a) > 0 else 5.0
+            hz = float(a[1]) if len(a) > 1 else 99.0
+        except ValueError:
+            hz = 0
+        if len(a) > 2 or hz <= 0:
+            sys.stderr.write("usage: Lsample [seconds] [hz] | Lsample write <file>")
+            return
+
+        process = self.process
+        if process is None or not process.IsValid() or \
+                process.GetState() != lldb.eStateRunning:
+            sys.stderr.write("vim-lldb: :Lsample needs a running process")
+            return
+
+        profile = Profile()
+        why = self.sampleProcess(process, profile, seconds, 1.0 / hz)
+        if self.symbolizer is None or self.symbolizer.processID != process.GetProcessID():
+            self.symbolizer = Symbolizer(process)
+        self.profile = profile
+        self.ui.showProfile(profile.report(self.symbolizer))
+        if process.GetState() != lldb.eStateRunning:
+            self.ui.update(self.target, "", self, True)
+        print("vim-lldb: %d samples in %.1f s%s" % (
+            profile.samples, profile.seconds, " (%s)" % why if why else ""))
+
+    @profiled("sample")
+    def sampleProcess(self, process, profile, seconds, period):
+        """ Stops process every period seconds for seconds, adds the stacks of its
+            threads to profile and lets it run again at once. The stops and restarts
+            are taken off the listener here, so the panes are not redrawn for them.
+            Returns why sampling ended early, or None.
+        """
+        event = lldb.SBEvent()
+        start = time.time()
+        next_sample = start
+        why = None
+        while time.time() - start < seconds:
+            self.dropStateEvents(event)
+            if process.GetState() != lldb.eStateRunning:
+                why = "the process stopped"
+                break
+            if vim.eval("getchar(1)") != '0':
+                why = "interrupted"
+                break
+
+            pause = time.time()
+            if process.Stop().Fail() or not self.waitForState(process, lldb.eStateStopped):
+                why = "unable to stop the process"
+                break
+            profile.sample(process)
+            process.Continue()
+            profile.pauses.append(time.time() - pause)
+
+            # A pause longer than the period puts the next sample behind schedule:
+            # take it at once rather than trying to catch up
+            next_sample = max(next_sample + period, time.time())
+            time.sleep(max(next_sample - time.time(), 0))
+
+        if why is None:
+            self.waitForState(process, lldb.eStateRunning)
+            self.dropStateEvents(event)
+        profile.seconds = time.time() - start
+        return why
+
+    def waitForState(self, process, state, seconds=1):
+        """ Waits at most seconds for process to be in state. Returns True if it is. """
+        deadline = time.time() + seconds
+        while process.GetState() != state:
+            if time.time() >= deadline:
+                return False
+            time.sleep(self.eventPollSlice)
+        return True
+
+    def dropStateEvents(self, event):
+        """ Takes the queued events off the listener and drops the state changes of
+            the selected process. Output is kept, and the stops of other processes
+            are reported the way processPendingEvents does.
+        """
+        selected_pid = self.process.GetProcessID()
+        while self.processListener.GetNextEvent(event):
+            process = lldb.SBProcess.GetProcessFromEvent(event)
+            if self.isOutputEvent(event):
+                self.readOutput(process)
+            elif process.GetProcessID() != selected_pid and \
+                    not lldb.SBProcess.GetRestartedFromEvent(event):
+                self.reportOtherStop(process, lldb.SBProcess.GetStateFromEvent(event))
+
+    def reportOtherStop(self, process, state):
+        """ Reports that a process other than the selected one stopped or exited """
+        if state in (lldb.eStateStopped, lldb.eStateCrashed, lldb.eStateExited):
+            target = process.GetTarget()
+            print("vim-lldb: process %d (target %d, %s) %s" % (
+                process.GetProcessID(), self.dbg.GetIndexOfTarget(target),
+                target.GetExecutable().GetFilename(), state_type_to_str(state)))
+
+    def writeProfile(self, path):
+        """ Writes the last profile to path in the collapsed stack format """
+        if self.profile is None or not path:
+            sys.stderr.write("vim-lldb: nothing to write; run :Lsample first")
+            return
+        lines = self.profile.collapsed(self.symbolizer)
+        try:
+            with open(path, "w") as f:
+                f.write("".join(line + "\n" for line in lines))
+        except (IOError, OSError) as e:
+            sys.stderr.write("vim-lldb: unable to write %s: %s" % (path, str(e)))
+            return
+        print("vim-lldb: wrote %d stacks to %s" % (len(lines), path))
+
     def getCommandResult(self, command, command_args):
         """ Run cmd in the command interpreter and returns (success, output) """
         result = lldb.SBCommandReturnObject()
@@ -327,6 +1219,8 @@ class LLDBController(object):
     # check if ci.CommandExists(command) before exec
     # may need this check in the future if auto-generating commands
     # currently they are expicitly whitelisted in lldb.vim so we are ok
+    @queued_while_loading
+    @profiled("doCommand")
     def doCommand(
             self,
             command,
@@ -336,11 +1230,21 @@ class LLDBController(object):
         """ Run cmd in interpreter and print result (success or failure) on the vim status line. """
         (success, output) = self.getCommandResult(command, command_args)
         if success:
-            self.ui.update(self.target, "", self, goto_file)
-            if len(output) > 0 and print_on_success:
-                output = escape_ansi(output.encode("utf-8", "replace"))
+            self.syncSelectedTarget()
+            self.prefetchStack()
+            # A recorded stop needs the output of every pane's command
+            self.ui.update(self.target, "", self, goto_file,
+                           0 if self.recorder is not None else None)
+            if self.recorder is not None:
+                self.recorder.record_event("command")
+                self.recorder.record_stop(self.target, "", goto_file)
+            if len(output) > 0 and print_on_success and len(output) > self.echoLimit > 0:
+                # Too long for a Vim string and the hit-enter prompt
+                self.ui.showCommandOutput(("(lldb) %s %s" % (command, command_args)).strip(),
+                                          strip_ansi(output))
+            elif len(output) > 0 and print_on_success:
                 # vim uses "''" to escape single quotes
-                output = str(output.decode("utf-8")).replace("'", "''") 
+                output = strip_ansi(output).replace("'", "''")
                 vim.command('echohl lldb_output')
                 vim.command("let g:lldb_msg='%s'" % output)
                 vim.command('echo lldb_msg')
@@ -353,57 +1257,190 @@ class LLDBController(object):
         result = lldb.SBCommandReturnObject()
         cmd = "%s %s" % (command, command_args)
         self.commandInterpreter.HandleCommand(cmd, result)
-        return (result.Succeeded(), result.GetOutput()
-                if result.Succeeded() else result.GetError())
+        output = result.GetOutput() if result.Succeeded() else result.GetError()
+        if self.recorder is not None:
+            self.recorder.record_command(cmd, output)
+        return (result.Succeeded(), output)
 
+    @profiled("processPendingEvents")
     def processPendingEvents(self, wait_seconds=0, goto_file=True):
         """ Handle any events that are queued from the inferior.
             Blocks for at most wait_seconds, or if wait_seconds == 0,
-            process only events that are already queued.
+            process only events that are already queued. Returns True if the
+            panes were updated.
         """
 
         status = None
         num_events_handled = 0
-
+        stopped = False
+        output_read = False
+        other_stops = []
+        changed = self.syncSelectedTarget()
+
+        selected_pid = None
+        old_state = None
+        new_state = None
         if self.process is not None:
-            event = lldb.SBEvent()
+            selected_pid = self.process.GetProcessID()
             old_state = self.process.GetState()
-            new_state = None
-            done = False
-            if old_state == lldb.eStateInvalid or old_state == lldb.eStateExited:
-                # Early-exit if we are in 'boring' states
-                pass
-            else:
-                while not done and self.processListener is not None:
-                    if not self.processListener.PeekAtNextEvent(event):
-                        if wait_seconds > 0:
-                            # No events on the queue, but we are allowed to wait for wait_seconds
-                            # for any events to show up.
-                            self.processListener.WaitForEvent(
-                                wait_seconds, event)
-                            new_state = lldb.SBProcess.GetStateFromEvent(event)
-
-                            num_events_handled += 1
-
-                        done = not self.processListener.PeekAtNextEvent(event)
-                    else:
-                        # An event is on the queue, process it here.
-                        self.processListener.GetNextEvent(event)
-                        new_state = lldb.SBProcess.GetStateFromEvent(event)
-
-                        # continue if stopped after attaching
-                        if old_state == lldb.eStateAttaching and new_state == lldb.eStateStopped:
-                            self.process.Continue()
-
-                        # If needed, perform any event-specific behaviour here
-                        num_events_handled += 1
 
-        if num_events_handled == 0:
-            pass
+        event = lldb.SBEvent()
+        deadline = time.time() + wait_seconds
+        done = not self.processListener.PeekAtNextEvent(event) and (
+            wait_seconds == 0 or old_state in (None, lldb.eStateInvalid, lldb.eStateExited))
+        while not done:
+            waited = False
+            if not self.processListener.PeekAtNextEvent(event):
+                remaining = deadline - time.time()
+                if wait_seconds > 0 and remaining > 0 and not stopped:
+                    # No events on the queue, but we are allowed to wait for wait_seconds
+                    # for the process to stop.
+                    waited = True
+                    if not self.waitForEvent(event, remaining):
+                        # Timed out
+                        num_events_handled += 1
+                        break
+                else:
+                    break
+            else:
+                # An event is on the queue, process it here.
+                self.processListener.GetNextEvent(event)
+
+            process = lldb.SBProcess.GetProcessFromEvent(event)
+            if self.isOutputEvent(event):
+                # Output does not end the wait for a state change
+                output_read = self.readOutput(process) or output_read
+                continue
+            state = lldb.SBProcess.GetStateFromEvent(event)
+            if state == lldb.eStateStopped and lldb.SBProcess.GetRestartedFromEvent(event):
+                # A stop that was continued right away, such as a logpoint hit
+                continue
+            if process.GetProcessID() != selected_pid:
+                # Another target's process: report it, but keep showing the selected one
+                other_stops.append((process, state))
+                continue
+
+            new_state = state
+            self.recordEvent(new_state)
+            if new_state in (lldb.eStateStopped, lldb.eStateCrashed, lldb.eStateExited):
+                self.stopLatency().stopped()
+                stopped = True
+
+            # continue if stopped after attaching
+            if old_state == lldb.eStateAttaching and new_state == lldb.eStateStopped:
+                self.process.Continue()
+
+            # If needed, perform any event-specific behaviour here
+            num_events_handled += 1
+            if waited:
+                done = not self.processListener.PeekAtNextEvent(event)
+
+        for (process, state) in other_stops:
+            self.reportOtherStop(process, state)
+
+        output_read = self.readLogpoints() or output_read
+        if num_events_handled == 0 and not changed:
+            if output_read:
+                self.ui.update_output(self.target, self)
         else:
             if old_state == new_state:
                 status = ""
-            self.ui.update(self.target, status, self, goto_file)
+            self.prefetchStack()
+            self.ui.update(self.target, status, self, goto_file,
+                           0 if self.recorder is not None else None)
+            if self.recorder is not None:
+                self.recorder.record_stop(self.target, status, goto_file)
+        return num_events_handled > 0 or changed
+
+    def prefetchStack(self):
+        """ At a stop of a remote process, reads the registers and stack memory the
+            panes show in bulk (see memory.StackCache)
+        """
+        if self.stackCache is None or self.process is None or not self.process.IsValid() or \
+                self.process.GetState() != lldb.eStateStopped:
+            return
+        if self.remote < 0 and not is_remote(self.target):
+            return
+        with profiler.span("prefetch"):
+            self.stackCache.prefetch(self.process)
+
+    def stopLatency(self):
+        """ Returns the StopLatency of the selected target """
+        exe = ""
+        if self.target is not None and self.target.IsValid():
+            fs = self.target.GetExecutable()
+            exe = os.path.join(fs.GetDirectory() or "", fs.GetFilename() or "")
+        if exe not in self.stopLatencies:
+            self.stopLatencies[exe] = StopLatency(self.eventWaitMax)
+        return self.stopLatencies[exe]
+
+    def waitForStop(self, kind, default, goto_file=False):
+        """ Processes events until the process stops after a command of kind, for at most
+            as long as such commands usually take to stop on this target (default seconds
+            until that is known). A later stop is shown by the poll timer.
+        """
+        latency = self.stopLatency()
+        start = time.time()
+        self.processPendingEvents(latency.timeout(kind, default), goto_file)
+        latency.waited(kind, time.time() - start)
+
+    def waitForEvent(self, event, seconds):
+        """ Waits at most seconds for a process event and moves it to event. Returns False
+            if none arrived in time, or a key was typed meanwhile.
+        """
+        deadline = time.time() + seconds
+        next_check = time.time() + self.interruptCheck
+        while True:
+            remaining = deadline - time.time()
+            if remaining >= 1:
+                # Whole seconds are waited in LLDB, which wakes up as soon as an event comes
+                if self.processListener.WaitForEvent(1, event):
+                    return True
+            elif self.processListener.GetNextEvent(event):
+                return True
+            elif remaining <= 0:
+                return False
+            else:
+                time.sleep(min(self.eventPollSlice, remaining))
+            if time.time() >= next_check:
+                next_check = time.time() + self.interruptCheck
+                if vim.eval("getchar(1)") != '0':
+                    return False
+
+    def isOutputEvent(self, event):
+        """ Returns True if event says the inferior wrote to stdout or stderr """
+        return event.IsValid() and (event.GetType() & (
+            lldb.SBProcess.eBroadcastBitSTDOUT | lldb.SBProcess.eBroadcastBitSTDERR)) != 0
+
+    def readOutput(self, process):
+        """ Moves what process wrote to stdout and stderr to the stdout pane. Returns
+            True if there was any.
+        """
+        read = False
+        for get in (process.GetSTDOUT, process.GetSTDERR):
+            data = get(self.outputChunk)
+            while data:
+                self.ui.appendOutput(data)
+                read = True
+                data = get(self.outputChunk)
+        return read
+
+    def readLogpoints(self):
+        """ Moves the messages of logpoint hits since the last call to the log pane.
+            Returns True if there were any.
+        """
+        (messages, dropped) = logpoints.take()
+        if dropped > 0:
+            messages.insert(0, "-- %d logpoint messages dropped --" % dropped)
+        if len(messages) == 0:
+            return False
+        self.ui.appendLog(messages)
+        return True
+
+    def recordEvent(self, state):
+        """ Adds a process event to the recording, if one is in progress """
+        if self.recorder is not None:
+            self.recorder.record_event("process", state, self.process.GetStopID())
 
 
 def returnCompleteCommand(a, l, p):
@@ -425,4 +1462,9 @@ def returnCompleteWindow(a, l, p):
 
 global ctrl
 
-ctrl = LLDBController()
+if vim.eval('s:lldb_backend') == 'process':
+    # LLDB runs in a separate process (see backend.py)
+    from backend_client import BackendController
+    ctrl = BackendController()
+else:
+    ctrl = LLDBController()
@@ -0,0 +1,109 @@
+#
+# Logpoints: breakpoints that log a message and let the process continue.
+#
+# LLDB calls logpoint_hit on the thread that handles the stop, not on Vim's
+# main thread, so nothing in here touches Vim: the message is formatted and
+# queued, and the controller moves the queued messages to the log pane in
+# batches while it services events.
+#
+
+import collections
+import re
+import lldb
+
+# {expression} in a message template
+PLACEHOLDER = re.compile(r'\{([^{}]+)\}')
+
+
+def evaluate(frame, expression):
+    """ Returns the value of expression in frame as a string. Variable paths (such as
+        p->next.count) are looked up directly, which is much cheaper than running
+        the expression evaluator.
+    """
+    value = frame.GetValueForVariablePath(expression)
+    if not value.IsValid():
+        value = frame.EvaluateExpression(expression)
+    error = value.GetError()
+    if error.Fail():
+        return "<%s>" % error.GetCString()
+    text = value.GetSummary() or value.GetValue()
+    return "..." if text is None else text
+
+
+class Logpoint(object):
+    """ A breakpoint of target that logs template, with each {expression} replaced by
+        its value, instead of stopping.
+    """
+
+    def __init__(self, target, breakpoint, template):
+        self.target = target
+        self.breakpoint = breakpoint
+        self.template = template
+
+    def format(self, frame):
+        message = PLACEHOLDER.sub(lambda m: evaluate(frame, m.group(1)), self.template)
+        return "%d: %s" % (self.breakpoint.GetID(), message)
+
+
+class Logpoints(object):
+    """ The logpoints of all targets, and the messages of hits that are not shown yet.
+        At most limit messages are kept; when they come faster than they are shown,
+        the oldest are dropped and counted.
+    """
+
+    def __init__(self, limit=10000):
+        # breakpoint ID --> [Logpoint], one per target that has a logpoint with that ID
+        self.logpoints = {}
+        self.pending = collections.deque(maxlen=limit if limit > 0 else None)
+        self.dropped = 0
+        self.hits = 0
+
+    def set_limit(self, limit):
+        self.pending = collections.deque(self.pending, maxlen=limit if limit > 0 else None)
+
+    def add(self, target, breakpoint, template):
+        """ Makes breakpoint of target a logpoint """
+        self.remove(target, breakpoint.GetID())
+        self.logpoints.setdefault(breakpoint.GetID(), []).append(
+            Logpoint(target, breakpoint, template))
+
+    def remove(self, target, bp_id):
+        self.logpoints[bp_id] = [lp for lp in self.logpoints.get(bp_id, []) if lp.target != target]
+
+    def find(self, target, bp_id):
+        for lp in self.logpoints.get(bp_id, []):
+            if lp.target == target:
+                return lp
+        return None
+
+    def hit(self, frame, bp_loc):
+        """ Queues the message of the logpoint at bp_loc """
+        target = frame.GetThread().GetProcess().GetTarget()
+        lp = self.find(target, bp_loc.GetBreakpoint().GetID())
+        if lp is None:
+            return
+        self.hits += 1
+        if self.pending.maxlen is not None and len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(lp.format(frame))
+
+    def take(self):
+        """ Returns (messages, dropped): the queued messages, and how many were dropped
+            since the last call.
+        """
+        messages = []
+        while len(self.pending) > 0:
+            messages.append(self.pending.popleft())
+        (dropped, self.dropped) = (self.dropped, 0)
+        return (messages, dropped)
+
+
+logpoints = Logpoints()
+
+
+def logpoint_hit(frame, bp_loc, internal_dict):
+    """ Breakpoint callback (see SBBreakpoint.SetScriptCallbackFunction). Returning
+        False lets the process continue without a stop being reported.
+    """
+    logpoints.hit(frame, bp_loc)
+    return False
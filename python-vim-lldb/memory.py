@@ -0,0 +1,111 @@
+#
+# Per-stop prefetch of stack memory and registers for remote targets.
+#
+# Through a remote lldb-server each register or memory read the panes trigger
+# can be a round trip to the other box. At a stop, StackCache reads the
+# selected thread's register context and a window of stack memory around its
+# SP in bulk; the locals and registers panes read it before asking LLDB.
+#
+
+import lldb
+
+# Type classes whose value can be formatted from the bytes of the variable alone
+SCALAR_TYPE_CLASSES = (lldb.eTypeClassBuiltin | lldb.eTypeClassPointer |
+                       lldb.eTypeClassEnumeration)
+
+
+def is_remote(target):
+    """ Returns True if target runs on another machine (a remote-* platform) """
+    platform = target.GetPlatform()
+    return platform.IsValid() and (platform.GetName() or "").startswith("remote-")
+
+
+class StackCache(object):
+    """ Memory and registers of the selected thread at one stop. The stack window
+        starts below bytes under SP (the red zone) and ends above bytes over it,
+        clamped to the memory region of the stack.
+    """
+
+    def __init__(self, above=8192, below=256):
+        self.above = above
+        self.below = below
+        self.clear()
+
+    def clear(self):
+        # (process ID, stop ID, thread index ID) the cache was filled for
+        self.key = None
+        self.base = 0
+        self.data = b""
+        self.byteOrder = lldb.eByteOrderLittle
+        self.addressSize = 8
+        # [(register set name, [(register name, value)])]
+        self.registers = None
+
+    def stop_key(self, process):
+        return (process.GetProcessID(), process.GetStopID(),
+                process.GetSelectedThread().GetIndexID())
+
+    def is_current(self, process):
+        """ Returns True if the cache holds the current stop of process """
+        return self.key is not None and process is not None and process.IsValid() and \
+            self.key == self.stop_key(process)
+
+    def prefetch(self, process):
+        """ Reads the registers and stack window of the selected thread, unless the
+            cache already holds this stop
+        """
+        if self.is_current(process):
+            return
+        self.clear()
+        frame = process.GetSelectedThread().GetFrameAtIndex(0)
+        if not frame.IsValid():
+            return
+
+        # Reading the register sets in one pass lets LLDB fetch the whole register
+        # context at once instead of a register at a time
+        self.registers = [(regs.GetName(), [(r.GetName(), r.GetValue()) for r in regs])
+                          for regs in frame.GetRegisters()]
+
+        sp = frame.GetSP()
+        start = max(sp - self.below, 0)
+        end = sp + self.above
+        region = lldb.SBMemoryRegionInfo()
+        if process.GetMemoryRegionInfo(sp, region).Success() and region.IsReadable():
+            start = max(start, region.GetRegionBase())
+            end = min(end, region.GetRegionEnd())
+
+        err = lldb.SBError()
+        data = process.ReadMemory(start, end - start, err) if end > start else None
+        if err.Success() and data:
+            self.base = start
+            self.data = data
+        self.byteOrder = process.GetByteOrder()
+        self.addressSize = process.GetAddressByteSize()
+        self.key = self.stop_key(process)
+
+    def read(self, address, size):
+        """ Returns size bytes at address, or None if they are not all cached """
+        offset = address - self.base
+        if offset < 0 or offset + size > len(self.data):
+            return None
+        return self.data[offset:offset + size]
+
+    def value(self, var):
+        """ Returns an SBValue like var, formatted from the cached stack, or None if
+            var is not a scalar held in the cached window
+        """
+        address = var.GetLoadAddress()
+        if address == lldb.LLDB_INVALID_ADDRESS:
+            return None
+        var_type = var.GetType()
+        if (var_type.GetTypeClass() & SCALAR_TYPE_CLASSES) == 0:
+            return None
+        content = self.read(address, var_type.GetByteSize())
+        if content is None:
+            return None
+        data = lldb.SBData()
+        err = lldb.SBError()
+        data.SetData(err, content, self.byteOrder, self.addressSize)
+        if err.Fail():
+            return None
+        return var.CreateValueFromData(var.GetName(), data, var_type)
@@ -0,0 +1,68 @@
+#
+# Bounded storage for what the inferior writes to stdout and stderr (see
+# OutputPane in vim_panes.py)
+#
+# Lines are numbered from the first line ever appended, so that a reader
+# that remembers which lines it has seen can tell what is new and what has
+# been dropped since.
+#
+
+import collections
+import itertools
+
+
+class OutputRing(object):
+    """ Keeps the last max_lines lines, and at most max_bytes characters, of output.
+        A limit of 0 disables it. Text after the last newline is kept in partial
+        until the rest of the line arrives.
+    """
+
+    def __init__(self, max_lines=10000, max_bytes=1 << 20):
+        self.maxLines = max_lines
+        self.maxBytes = max_bytes
+        self.lines = collections.deque()
+        self.partial = ""
+
+        # Number of the first line in self.lines, and the number of characters kept
+        self.first = 0
+        self.size = 0
+
+    @property
+    def end(self):
+        """ Number of the line after the last complete line """
+        return self.first + len(self.lines)
+
+    def append(self, text):
+        """ Adds text, which may contain any number of lines """
+        text = self.partial + text.replace("\r\n", "\n")
+        lines = text.split("\n")
+        self.partial = lines.pop()
+        if self.maxBytes > 0 and len(self.partial) > self.maxBytes:
+            self.partial = self.partial[-self.maxBytes:]
+
+        # Only the tail of a burst larger than the ring can survive
+        if self.maxLines > 0 and len(lines) > self.maxLines:
+            self.first += len(lines) - self.maxLines
+            lines = lines[-self.maxLines:]
+        for line in lines:
+            self.lines.append(line)
+            self.size += len(line) + 1
+        self.trim()
+
+    def trim(self):
+        while len(self.lines) > 0 and (
+                (self.maxLines > 0 and len(self.lines) > self.maxLines) or
+                (self.maxBytes > 0 and self.size > self.maxBytes)):
+            self.size -= len(self.lines.popleft()) + 1
+            self.first += 1
+
+    def clear(self):
+        """ Drops all output; line numbers keep counting from where they were """
+        self.first = self.end
+        self.lines.clear()
+        self.partial = ""
+        self.size = 0
+
+    def lines_from(self, number):
+        """ Returns the complete lines numbered number and up """
+        return list(itertools.islice(self.lines, max(number - self.first, 0), None))
@@ -0,0 +1,215 @@
+#
+# Instrumentation of the refresh path (see :Lprofile)
+#
+# Stages are timed with:
+#   with profiler.span("name"):
+#       ...
+# or by decorating a function with @profiled("name"). Spans that are not
+# nested inside another span mark one "refresh"; the number of vim.command,
+# vim.eval and SB API calls made during it is recorded with it. Only Vim's
+# thread is profiled: the SB API calls of the background loaders (see
+# symbols.py) and calls made between refreshes are not counted.
+#
+# Nothing is recorded (and vim/lldb are not patched) until the profiler is
+# started, so the cost of an idle span is one attribute check.
+#
+
+from __future__ import print_function
+
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+
+class _NoSpan(object):
+    """ Span returned while the profiler is stopped """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Span(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.depth = self.profiler.depth
+        self.profiler.depth += 1
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.time() - self.start
+        self.profiler.depth -= 1
+        self.profiler.record(self.name, self.start, duration, self.depth)
+        return False
+
+
+def percentile(values, p):
+    """ Returns the p-th percentile (0-100) of a sorted list """
+    if len(values) == 0:
+        return 0
+    i = int(round((len(values) - 1) * p / 100.0))
+    return values[i]
+
+
+class Profiler(object):
+    """ Records wall time of named stages, and call counts per refresh, into a ring buffer. """
+
+    COUNTERS = ['vim.command', 'vim.eval', 'sbapi']
+
+    def __init__(self, capacity=20000):
+        self.enabled = False
+        self.depth = 0
+
+        # The thread that started the profiler, Vim's
+        self.thread = None
+
+        # Ring buffer of (name, start, duration, depth, counts)
+        self.events = collections.deque(maxlen=capacity)
+
+        # Calls counted since the current refresh started
+        self.counts = dict.fromkeys(Profiler.COUNTERS, 0)
+
+        # Original functions replaced while profiling { (owner, attribute) --> function }
+        self.patched = {}
+
+        self.noSpan = _NoSpan()
+
+    def span(self, name):
+        """ Returns a context manager that times the enclosed block as stage name """
+        if not self.enabled or threading.current_thread() is not self.thread:
+            return self.noSpan
+        return _Span(self, name)
+
+    def record(self, name, start, duration, depth):
+        counts = None
+        if depth == 0:
+            counts = self.counts
+            self.counts = dict.fromkeys(Profiler.COUNTERS, 0)
+        self.events.append((name, start, duration, depth, counts))
+
+    def count(self, counter):
+        if self.depth > 0 and threading.current_thread() is self.thread:
+            self.counts[counter] += 1
+
+    def start(self, vim_module, lldb_module):
+        """ Start recording, counting calls into vim_module and lldb_module """
+        if self.enabled:
+            return
+        self.patch(vim_module, 'command', 'vim.command')
+        self.patch(vim_module, 'eval', 'vim.eval')
+        for name in dir(lldb_module):
+            cls = getattr(lldb_module, name)
+            if not name.startswith('SB') or not isinstance(cls, type):
+                continue
+            for (attr, f) in list(cls.__dict__.items()):
+                if attr[0].isupper() and callable(f) and not isinstance(f, type):
+                    self.patch(cls, attr, 'sbapi')
+        self.depth = 0
+        self.thread = threading.current_thread()
+        self.enabled = True
+
+    def stop(self):
+        """ Stop recording and restore patched functions """
+        for ((owner, attr), f) in self.patched.items():
+            setattr(owner, attr, f)
+        self.patched = {}
+        self.enabled = False
+
+    def clear(self):
+        self.events.clear()
+        self.counts = dict.fromkeys(Profiler.COUNTERS, 0)
+
+    def patch(self, owner, attr, counter):
+        """ Replace owner.attr with a function that counts calls in counter """
+        f = owner.__dict__[attr] if isinstance(owner, type) else getattr(owner, attr)
+        if isinstance(f, (staticmethod, classmethod)):
+            # Static methods such as SBProcess.GetStateFromEvent
+            wrapped = f.__func__
+
+            def counting(*args, **kwargs):
+                self.count(counter)
+                return wrapped(*args, **kwargs)
+            replacement = type(f)(counting)
+        else:
+            def replacement(*args, **kwargs):
+                self.count(counter)
+                return f(*args, **kwargs)
+
+        self.patched[(owner, attr)] = f
+        setattr(owner, attr, replacement)
+
+    def stages(self):
+        """ Returns { name --> sorted list of durations (sec) } """
+        ret = {}
+        for (name, start, duration, depth, counts) in self.events:
+            ret.setdefault(name, []).append(duration)
+        for durations in ret.values():
+            durations.sort()
+        return ret
+
+    def report(self):
+        """ Returns a list of lines with p50/p95/max per stage and call counts per refresh """
+        stages = self.stages()
+        if len(stages) == 0:
+            return ["vim-lldb profile: no data (start with :Lprofile start)"]
+
+        lines = ["%-40s %7s %9s %9s %9s" % ("stage", "count", "p50 ms", "p95 ms", "max ms")]
+        for name in sorted(stages):
+            d = stages[name]
+            lines.append("%-40s %7d %9.2f %9.2f %9.2f" % (
+                name, len(d), percentile(d, 50) * 1000, percentile(d, 95) * 1000, d[-1] * 1000))
+
+        refreshes = [e[4] for e in self.events if e[4] is not None]
+        if len(refreshes) > 0:
+            lines.append("")
+            lines.append("%-40s %7s %9s %9s %9s" % ("calls per refresh", "", "p50", "p95", "max"))
+            for counter in Profiler.COUNTERS:
+                c = sorted([r[counter] for r in refreshes])
+                lines.append("%-40s %7s %9d %9d %9d" % (
+                    counter, "", percentile(c, 50), percentile(c, 95), c[-1]))
+        return lines
+
+    def dump(self, path):
+        """ Writes the recorded spans to path in Chrome's trace event format """
+        pid = os.getpid()
+        trace = []
+        for (name, start, duration, depth, counts) in self.events:
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": int(start * 1e6),
+                "dur": int(duration * 1e6),
+                "pid": pid,
+                "tid": 1,
+            }
+            if counts is not None:
+                event["args"] = counts
+            trace.append(event)
+
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+def profiled(name):
+    """ Decorator that times each call of a function as stage name """
+    def decorate(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with profiler.span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+global profiler
+profiler = Profiler()
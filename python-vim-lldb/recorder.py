@@ -0,0 +1,495 @@
+#
+# Recording of debugger stops, and replay of recordings without a live process.
+#
+# A recording is a gzipped JSON Lines file. Each line is one of:
+#   {"type": "header", ...}              format version and start time
+#   {"type": "event", ...}               an event handled by the controller
+#   {"type": "stop", ...}                a snapshot of what the UI reads at a stop:
+#                                        threads, frames, variables, registers,
+#                                        breakpoints and the output of the commands
+#                                        the panes ran
+#
+# Replay objects implement the part of the SB API the panes and signs use, so
+# UI.update can redraw a recorded stop exactly as it was drawn live. The
+# out-of-process backend (backend.py) sends the same stop records to Vim.
+#
+
+import gzip
+import json
+import time
+
+import lldb
+
+FORMAT_VERSION = 1
+
+
+def describe(obj, *args):
+    """ Returns obj.GetDescription() as a string, or None """
+    stream = lldb.SBStream()
+    if not obj.GetDescription(stream, *args):
+        return None
+    return stream.GetData()
+
+
+def write_line(f, record):
+    f.write((json.dumps(record, separators=(',', ':')) + "\n").encode("utf-8"))
+
+
+class StopSnapshot(object):
+    """ Captures what the UI reads at a stop as a JSON-serializable record """
+
+    def __init__(self, frame_depth=64):
+        self.frameDepth = frame_depth
+        self.lastBreakpoints = None
+
+    def stop_record(self, target, status, goto_file, commands):
+        """ Returns the "stop" record of target, with the output of commands { cmd --> output } """
+        record = {"type": "stop", "status": status, "goto_file": goto_file,
+                  "commands": commands}
+
+        if target is not None and target.IsValid():
+            fs = target.GetExecutable()
+            record["executable"] = [fs.GetDirectory(), fs.GetFilename()]
+            process = target.GetProcess()
+            if process is not None and process.IsValid():
+                record["process"] = self.process_snapshot(process)
+
+            # Breakpoints rarely change between stops; only write them when they do
+            breakpoints = [self.breakpoint_snapshot(target.GetBreakpointAtIndex(i))
+                           for i in range(target.GetNumBreakpoints())]
+            if breakpoints != self.lastBreakpoints:
+                record["breakpoints"] = breakpoints
+                self.lastBreakpoints = breakpoints
+        return record
+
+    def process_snapshot(self, process):
+        selected = process.GetSelectedThread()
+        return {
+            "pid": process.GetProcessID(),
+            "state": process.GetState(),
+            "stop_id": process.GetStopID(),
+            "selected": selected.GetIndexID() if selected.IsValid() else None,
+            "threads": [self.thread_snapshot(t, t.GetIndexID() == selected.GetIndexID())
+                        for t in process],
+        }
+
+    def thread_snapshot(self, thread, is_selected):
+        """ Captures every frame the UI may read: the unwound part of the backtrace for the
+            selected thread, and frames down to the first one with source information
+            (for the PC sign) for the others.
+        """
+        selected_frame = thread.GetSelectedFrame().GetFrameID()
+        frames = []
+        i = 0
+        while True:
+            frame = thread.GetFrameAtIndex(i)
+            if not frame.IsValid():
+                break
+            full = is_selected and i == selected_frame
+            frames.append(self.frame_snapshot(frame, full))
+            i += 1
+            if is_selected:
+                if i >= max(self.frameDepth, selected_frame + 1):
+                    break
+            elif (i > selected_frame and frame.GetLineEntry().IsValid()) or \
+                    i >= self.frameDepth:
+                break
+
+        return {
+            "id": thread.GetIndexID(),
+            "tid": thread.GetThreadID(),
+            "name": thread.GetName(),
+            "reason": thread.GetStopDescription(256),
+            "selected_frame": selected_frame,
+            "frames": frames,
+            "more": thread.GetFrameAtIndex(i).IsValid(),
+        }
+
+    def frame_snapshot(self, frame, full):
+        le = frame.GetLineEntry()
+        record = {
+            "id": frame.GetFrameID(),
+            "pc": frame.GetPC(),
+            "module": frame.GetModule().GetFileSpec().GetFilename(),
+            "function": frame.GetFunctionName(),
+        }
+        if le.IsValid():
+            fs = le.GetFileSpec()
+            record["line"] = [fs.GetDirectory(), fs.GetFilename(), le.GetLine(), le.GetColumn()]
+        else:
+            symbol = frame.GetSymbol()
+            if symbol.IsValid():
+                target = frame.GetThread().GetProcess().GetTarget()
+                record["symbol"] = symbol.GetStartAddress().GetLoadAddress(target)
+
+        if full:
+            # Only the selected frame is shown in the locals and registers panes
+            record["description"] = describe(frame)
+            record["block"] = describe(frame.GetBlock())
+            record["variables"] = [[v.GetName(), v.GetTypeName(), v.GetValue()]
+                                   for v in frame.GetVariables(True, True, True, True)]
+            record["registers"] = [[s.GetName(), [[r.GetName(), r.GetValue()] for r in s]]
+                                   for s in frame.GetRegisters()]
+        return record
+
+    def breakpoint_snapshot(self, bp):
+        locations = []
+        for i in range(bp.GetNumLocations()):
+            loc = bp.GetLocationAtIndex(i)
+            locations.append([loc.IsResolved(), describe(loc, lldb.eDescriptionLevelFull)])
+        return {"id": bp.GetID(), "valid": bp.IsValid(), "locations": locations}
+
+
+class Recorder(StopSnapshot):
+    """ Writes the events the controller handles, and a snapshot of each stop, to path """
+
+    def __init__(self, path, frame_depth=64):
+        StopSnapshot.__init__(self, frame_depth)
+        self.path = path
+        self.file = gzip.open(path, 'wb')
+        self.start = time.time()
+        self.commands = {}
+        self.numStops = 0
+        write_line(self.file, {"type": "header", "version": FORMAT_VERSION,
+                               "time": self.start})
+
+    def close(self):
+        self.file.close()
+
+    def record_event(self, kind, state=None, stop_id=None):
+        record = {"type": "event", "t": time.time() - self.start, "kind": kind}
+        if state is not None:
+            record["state"] = state
+        if stop_id is not None:
+            record["stop_id"] = stop_id
+        write_line(self.file, record)
+
+    def record_command(self, cmd, output):
+        """ Remembers the output of a command run while the UI updates """
+        self.commands[cmd] = output
+
+    def record_stop(self, target, status, goto_file):
+        """ Writes a snapshot of target, with the commands recorded since the last stop """
+        record = self.stop_record(target, status, goto_file, self.commands)
+        record["t"] = time.time() - self.start
+        self.commands = {}
+        write_line(self.file, record)
+        self.numStops += 1
+
+
+def read_recording(path):
+    """ Returns the list of records in the recording at path """
+    with gzip.open(path, 'rb') as f:
+        records = [json.loads(line.decode("utf-8")) for line in f if line.strip()]
+    if len(records) == 0 or records[0].get("type") != "header":
+        raise ValueError("%s is not a vim-lldb recording" % path)
+    if records[0]["version"] > FORMAT_VERSION:
+        raise ValueError("%s was recorded by a newer vim-lldb" % path)
+    return records
+
+
+def replay_stops(records):
+    """ Yields (target, controller, status, goto_file) for each recorded stop """
+    breakpoints = []
+    for r in records:
+        if r["type"] != "stop":
+            continue
+        breakpoints = r.get("breakpoints", breakpoints)
+        target = ReplayTarget(r, breakpoints)
+        yield (target, ReplayController(r["commands"]), r["status"], r["goto_file"])
+
+
+# ----------------------------------------------------------------------
+# Replay objects: just enough of the SB API for the panes and signs
+
+class ReplayController(object):
+    """ Stands in for LLDBController: commands return their recorded output """
+
+    def __init__(self, commands):
+        self.commands = commands
+
+    def getCommandOutput(self, command, command_args=""):
+        return (True, self.commands.get("%s %s" % (command, command_args), ""))
+
+
+class ReplayObject(object):
+
+    def __init__(self, valid=True):
+        self.valid = valid
+
+    def IsValid(self):
+        return self.valid
+
+    def __bool__(self):
+        return self.valid
+    __nonzero__ = __bool__
+
+
+class ReplayFileSpec(ReplayObject):
+
+    def __init__(self, directory=None, filename=None):
+        ReplayObject.__init__(self, filename is not None)
+        self.directory = directory
+        self.filename = filename
+
+    def GetDirectory(self):
+        return self.directory
+
+    def GetFilename(self):
+        return self.filename
+
+
+class ReplayLineEntry(ReplayObject):
+
+    def __init__(self, line=None):
+        ReplayObject.__init__(self, line is not None)
+        (directory, filename, self.line, self.column) = line or (None, None, 0, 0)
+        self.spec = ReplayFileSpec(directory, filename)
+
+    def GetFileSpec(self):
+        return self.spec
+
+    def GetLine(self):
+        return self.line
+
+    def GetColumn(self):
+        return self.column
+
+
+class ReplayModule(ReplayObject):
+
+    def __init__(self, filename):
+        ReplayObject.__init__(self, filename is not None)
+        self.spec = ReplayFileSpec(None, filename)
+
+    def GetFileSpec(self):
+        return self.spec
+
+
+class ReplayAddress(ReplayObject):
+
+    def __init__(self, addr):
+        ReplayObject.__init__(self, addr is not None)
+        self.addr = addr
+
+    def GetLoadAddress(self, target):
+        return self.addr if self.addr is not None else lldb.LLDB_INVALID_ADDRESS
+
+
+class ReplaySymbol(ReplayObject):
+
+    def __init__(self, start):
+        ReplayObject.__init__(self, start is not None)
+        self.start = start
+
+    def GetStartAddress(self):
+        return ReplayAddress(self.start)
+
+
+class ReplayDescribed(ReplayObject):
+    """ An object whose GetDescription() returns a recorded string """
+
+    def __init__(self, description):
+        ReplayObject.__init__(self, description is not None)
+        self.description = description
+
+    def GetDescription(self, stream, *args):
+        if self.description is None:
+            return False
+        stream.Print(self.description)
+        return True
+
+
+class ReplayValue(ReplayObject):
+
+    def __init__(self, name, type_name=None, value=None, children=()):
+        ReplayObject.__init__(self)
+        self.name = name
+        self.type_name = type_name
+        self.value = value
+        self.children = list(children)
+
+    def GetName(self):
+        return self.name
+
+    def GetTypeName(self):
+        return self.type_name
+
+    def GetValue(self):
+        return self.value
+
+    def GetNumChildren(self):
+        return len(self.children)
+
+    def GetChildAtIndex(self, i):
+        return self.children[i]
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def __len__(self):
+        return len(self.children)
+
+
+class ReplayFrame(ReplayDescribed):
+
+    def __init__(self, thread, record=None):
+        ReplayDescribed.__init__(self, record.get("description") if record else None)
+        self.valid = record is not None
+        self.thread = thread
+        self.record = record or {"id": 0, "pc": lldb.LLDB_INVALID_ADDRESS}
+
+    def GetFrameID(self):
+        return self.record["id"]
+
+    def GetPC(self):
+        return self.record["pc"]
+
+    def GetThread(self):
+        return self.thread
+
+    def GetModule(self):
+        return ReplayModule(self.record.get("module"))
+
+    def GetFunctionName(self):
+        return self.record.get("function")
+
+    GetDisplayFunctionName = GetFunctionName
+
+    def GetLineEntry(self):
+        return ReplayLineEntry(self.record.get("line"))
+
+    def GetSymbol(self):
+        return ReplaySymbol(self.record.get("symbol"))
+
+    def GetBlock(self):
+        return ReplayDescribed(self.record.get("block"))
+
+    def GetVariables(self, *args):
+        return [ReplayValue(*v) for v in self.record.get("variables", [])]
+
+    def GetRegisters(self):
+        return [ReplayValue(name, children=[ReplayValue(n, None, v) for (n, v) in regs])
+                for (name, regs) in self.record.get("registers", [])]
+
+
+class ReplayThread(ReplayObject):
+
+    def __init__(self, process, record=None):
+        ReplayObject.__init__(self, record is not None)
+        self.process = process
+        self.record = record or {"id": 0, "tid": 0, "frames": [], "selected_frame": 0}
+        self.frames = [ReplayFrame(self, f) for f in self.record["frames"]]
+
+    def GetIndexID(self):
+        return self.record["id"]
+
+    def GetThreadID(self):
+        return self.record["tid"]
+
+    def GetName(self):
+        return self.record.get("name")
+
+    def GetStopDescription(self, size):
+        return self.record.get("reason")
+
+    def GetProcess(self):
+        return self.process
+
+    def GetNumFrames(self):
+        return len(self.frames)
+
+    def GetFrameAtIndex(self, i):
+        if 0 <= i < len(self.frames):
+            return self.frames[i]
+        return ReplayFrame(self)
+
+    def GetSelectedFrame(self):
+        return self.GetFrameAtIndex(self.record["selected_frame"])
+
+
+class ReplayProcess(ReplayObject):
+
+    def __init__(self, target, record=None):
+        ReplayObject.__init__(self, record is not None)
+        self.target = target
+        self.record = record or {"pid": 0, "state": lldb.eStateInvalid, "stop_id": 0,
+                                 "selected": None, "threads": []}
+        self.threads = [ReplayThread(self, t) for t in self.record["threads"]]
+
+    def GetTarget(self):
+        return self.target
+
+    def GetProcessID(self):
+        return self.record["pid"]
+
+    def GetState(self):
+        return self.record["state"]
+
+    def GetStopID(self, *args):
+        return self.record["stop_id"]
+
+    def GetNumThreads(self):
+        return len(self.threads)
+
+    def GetThreadAtIndex(self, i):
+        if 0 <= i < len(self.threads):
+            return self.threads[i]
+        return ReplayThread(self)
+
+    def GetSelectedThread(self):
+        for t in self.threads:
+            if t.GetIndexID() == self.record["selected"]:
+                return t
+        return ReplayThread(self)
+
+    def __iter__(self):
+        return iter(self.threads)
+
+
+class ReplayBreakpointLocation(ReplayDescribed):
+
+    def __init__(self, resolved, description):
+        ReplayDescribed.__init__(self, description)
+        self.resolved = resolved
+
+    def IsResolved(self):
+        return self.resolved
+
+
+class ReplayBreakpoint(ReplayObject):
+
+    def __init__(self, record):
+        ReplayObject.__init__(self, record["valid"])
+        self.record = record
+        self.locations = [ReplayBreakpointLocation(*l) for l in record["locations"]]
+
+    def GetID(self):
+        return self.record["id"]
+
+    def GetNumLocations(self):
+        return len(self.locations)
+
+    def GetLocationAtIndex(self, i):
+        return self.locations[i]
+
+
+class ReplayTarget(ReplayObject):
+
+    def __init__(self, record, breakpoints):
+        ReplayObject.__init__(self, "executable" in record)
+        self.executable = ReplayFileSpec(*record.get("executable", [None, None]))
+        self.process = ReplayProcess(self, record.get("process"))
+        self.breakpoints = [ReplayBreakpoint(b) for b in breakpoints]
+
+    def GetExecutable(self):
+        return self.executable
+
+    def GetProcess(self):
+        return self.process
+
+    def GetNumBreakpoints(self):
+        return len(self.breakpoints)
+
+    def GetBreakpointAtIndex(self, i):
+        return self.breakpoints[i]
@@ -0,0 +1,136 @@
+#
+# Sampling profiles of a running process (see :Lsample).
+#
+# The controller interrupts the process hz times a second and lets it run
+# again right away; during the pause Profile.sample only reads the PCs of the
+# frames of every thread. Symbols are looked up when the profile is shown,
+# once per address (see Symbolizer), and the samples are folded by function
+# into the call tree of the profile pane, or into the collapsed stacks that
+# flamegraph.pl reads.
+#
+# Nothing in here touches Vim.
+#
+
+import collections
+from profiling import percentile
+
+
+class Symbolizer(object):
+    """ Names ("module`function") of the code addresses of a process, looked up once
+        per address
+    """
+
+    def __init__(self, process):
+        self.processID = process.GetProcessID()
+        self.target = process.GetTarget()
+        self.names = {}
+
+    def name(self, pc, caller=False):
+        """ Returns the name of the function at pc. The PC of a caller's frame is a
+            return address, which can be past the end of the function: the call
+            before it is looked up.
+        """
+        if caller:
+            pc -= 1
+        name = self.names.get(pc)
+        if name is None:
+            address = self.target.ResolveLoadAddress(pc)
+            symbol = address.GetSymbol()
+            name = symbol.GetName() if symbol.IsValid() and symbol.GetName() else "0x%x" % pc
+            module = address.GetModule()
+            if module.IsValid() and module.GetFileSpec().GetFilename():
+                name = "%s`%s" % (module.GetFileSpec().GetFilename(), name)
+            self.names[pc] = name
+        return name
+
+
+class Profile(object):
+    """ Stacks sampled from the threads of a process: the number of samples of each
+        sequence of PCs, outermost frame first, up to depth frames
+    """
+
+    # Functions listed by their own samples at the top of the report
+    topFunctions = 20
+
+    def __init__(self, depth=128):
+        self.depth = depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.threads = 0
+        # Seconds each pause took, and the time the samples were taken over
+        self.pauses = []
+        self.seconds = 0.0
+
+    def sample(self, process):
+        """ Adds the stacks of the threads of process, which is stopped """
+        threads = 0
+        for thread in process:
+            pcs = []
+            for i in range(self.depth):
+                frame = thread.GetFrameAtIndex(i)
+                if not frame.IsValid():
+                    break
+                pcs.append(frame.GetPC())
+            pcs.reverse()
+            self.stacks[tuple(pcs)] += 1
+            threads += 1
+        self.samples += 1
+        self.threads = max(self.threads, threads)
+
+    def folded(self, symbolizer):
+        """ Returns a Counter of the stacks by function name, outermost first """
+        folded = collections.Counter()
+        for (pcs, count) in self.stacks.items():
+            last = len(pcs) - 1
+            folded[tuple(symbolizer.name(pc, i < last) for (i, pc) in enumerate(pcs))] += count
+        return folded
+
+    def collapsed(self, symbolizer):
+        """ Returns the lines of the collapsed stack format of flamegraph.pl:
+            "outer;...;inner count"
+        """
+        return ["%s %d" % (";".join(names), count)
+                for (names, count) in sorted(self.folded(symbolizer).items()) if names]
+
+    def report(self, symbolizer, min_share=0.005):
+        """ Returns the lines of the profile pane: a summary, the functions that were
+            on top of the stacks most often, then the call tree from the outermost
+            frames, indented by depth. Calls with less than min_share of the samples
+            are left out.
+        """
+        folded = self.folded(symbolizer)
+        total = sum(folded.values())
+        pauses = sorted(self.pauses)
+        lines = ["%d samples of %d threads in %.1f s, pauses p50 %.2f ms, max %.2f ms" % (
+            self.samples, self.threads, self.seconds, percentile(pauses, 50) * 1000,
+            pauses[-1] * 1000 if pauses else 0)]
+        if total == 0:
+            return lines
+
+        def share(count):
+            return "%d (%.1f%%)" % (count, 100.0 * count / total)
+
+        own = collections.Counter()
+        tree = [0, {}]
+        for (names, count) in folded.items():
+            if names:
+                own[names[-1]] += count
+            node = tree
+            for name in names:
+                node = node[1].setdefault(name, [0, {}])
+                node[0] += count
+
+        lines.append("Top of stack:")
+        for (name, count) in own.most_common(self.topFunctions):
+            lines.append("  %s  %s" % (name, share(count)))
+
+        lines.append("Calls:")
+
+        def walk(node, depth):
+            for (name, child) in sorted(node[1].items(), key=lambda c: -c[1][0]):
+                if child[0] < total * min_share:
+                    break
+                lines.append("%s%s  %s" % ("  " * depth, name, share(child[0])))
+                walk(child, depth + 1)
+        walk(tree, 1)
+        return lines
@@ -0,0 +1,87 @@
+#
+# Sessions: what debugging a project looked like, to start the next time from
+# there (see :Lsession).
+#
+# A session keeps the target, the panes that were shown, the thread filter and
+# LLDB's settings, and the breakpoints: LLDB writes their definitions next to
+# the session file (SBTarget.BreakpointsWriteToFile), and the session keeps the
+# file:line each location last resolved to, with the UUID of its module. On
+# restore the breakpoint signs are placed from those locations at once, while
+# the target is created and the breakpoints resolved on a worker thread (see
+# symbols.TargetLoader); the next update corrects the signs that moved.
+#
+# Nothing in here touches Vim.
+#
+
+import hashlib
+import json
+import os
+
+import lldb
+
+SESSION_VERSION = 1
+
+
+def session_dir():
+    """ Returns the directory where sessions are saved """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'vim-lldb', 'sessions')
+
+
+def session_path(project):
+    """ Returns the session file of the project in directory project """
+    digest = hashlib.sha1(os.path.realpath(project).encode('utf-8')).hexdigest()
+    return os.path.join(session_dir(), "%s.json" % digest[:16])
+
+
+def breakpoints_path(path):
+    """ Returns the file LLDB writes the breakpoints of session file path to """
+    return os.path.splitext(path)[0] + ".breakpoints.json"
+
+
+def settings_path(path):
+    """ Returns the file LLDB writes its settings of session file path to """
+    return os.path.splitext(path)[0] + ".settings"
+
+
+def location_module(location):
+    """ Returns the UUID of the module a breakpoint location is in, or "" """
+    module = location.GetAddress().GetModule()
+    if module is None or not module.IsValid():
+        return ""
+    return module.GetUUIDString() or ""
+
+
+def save_session(path, session, target=None, breakpoints=None):
+    """ Writes session (a dict) to path, and breakpoints (an SBBreakpointList) of
+        target next to it. Returns an error message, or None.
+    """
+    directory = os.path.dirname(path)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if target is not None and target.IsValid() and breakpoints is not None:
+            err = target.BreakpointsWriteToFile(
+                lldb.SBFileSpec(breakpoints_path(path)), breakpoints, False)
+            if err.Fail():
+                return "unable to save breakpoints: %s" % err.GetCString()
+        session = dict(session, version=SESSION_VERSION)
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(session, f, indent=1)
+        os.rename(tmp, path)
+    except (IOError, OSError) as e:
+        return str(e)
+    return None
+
+
+def load_session(path):
+    """ Returns the session saved in path, or None """
+    try:
+        with open(path) as f:
+            session = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if session.get('version') != SESSION_VERSION:
+        return None
+    return session
@@ -0,0 +1,244 @@
+#
+# Helpers that walk threads and frames through the SB API.
+#
+# Nothing in here touches Vim, so the functions can be shared by panes and
+# by code that runs without an editor.
+#
+
+import re
+import lldb
+
+
+def stop_key(process):
+    """ Returns (process ID, stop ID), which identifies a stop among all the processes
+        of a session: stop IDs are counted per process.
+    """
+    return (process.GetProcessID(), process.GetStopID())
+
+
+def frame_record(frame):
+    """ Returns a tuple (frame_id, pc, module, function, offset, file, line) describing
+        an SBFrame. offset is None when the frame has source line information.
+    """
+    module = frame.GetModule().GetFileSpec().GetFilename()
+    function = frame.GetFunctionName()
+    pc = frame.GetPC()
+
+    le = frame.GetLineEntry()
+    if le.IsValid():
+        fs = le.GetFileSpec()
+        return (frame.GetFrameID(), pc, module, function, None,
+                fs.GetFilename(), le.GetLine())
+
+    offset = None
+    symbol = frame.GetSymbol()
+    if symbol.IsValid():
+        target = frame.GetThread().GetProcess().GetTarget()
+        start = symbol.GetStartAddress().GetLoadAddress(target)
+        if start != lldb.LLDB_INVALID_ADDRESS and pc >= start:
+            offset = pc - start
+    return (frame.GetFrameID(), pc, module, function, offset, None, 0)
+
+
+def format_location(record):
+    """ Formats the "pc module`function at file:line" part of a frame record """
+    (frame_id, pc, module, function, offset, file, line) = record
+    s = "0x%016x" % pc
+    if module:
+        s += " %s`" % module
+    else:
+        s += " "
+    s += function if function else "???"
+    if file is not None:
+        s += " at %s:%d" % (file, line)
+    elif offset is not None:
+        s += " + %d" % offset
+    return s
+
+
+def format_frame(record, selected=False):
+    """ Formats a frame record the way 'bt' does """
+    marker = '*' if selected else ' '
+    return "%s frame #%d: %s" % (marker, record[0], format_location(record))
+
+
+def thread_frames(thread, start, count):
+    """ Returns a tuple (records, has_more) with the records of frames [start, start + count)
+        of thread. Frames are unwound on demand, so only start + count + 1 frames are
+        unwound no matter how deep the stack is.
+    """
+    records = []
+    for i in range(start, start + count):
+        frame = thread.GetFrameAtIndex(i)
+        if not frame.IsValid():
+            return (records, False)
+        records.append(frame_record(frame))
+    return (records, thread.GetFrameAtIndex(start + count).IsValid())
+
+
+def format_thread(thread, selected=False, record=None):
+    """ Formats a one-line summary of thread the way 'thread list' does. If record is
+        given, the location of that frame (usually frame #0) is included.
+    """
+    marker = '*' if selected else ' '
+    s = "%s thread #%d: tid = 0x%x" % (marker, thread.GetIndexID(), thread.GetThreadID())
+    if record is not None:
+        s += ", " + format_location(record)
+    name = thread.GetName()
+    if name:
+        s += ", name = '%s'" % name
+    reason = thread.GetStopDescription(256)
+    if reason:
+        s += ", stop reason = %s" % reason
+    return s
+
+
+def thread_position(process, index_id, hint=None):
+    """ Returns the position (for SBProcess.GetThreadAtIndex) of the thread with the given
+        index ID, or None. Index IDs are usually, but not always, sequential, so hint and
+        index_id - 1 are tried before scanning every thread.
+    """
+    num_threads = process.GetNumThreads()
+    for pos in (hint, index_id - 1):
+        if pos is not None and 0 <= pos < num_threads and \
+                process.GetThreadAtIndex(pos).GetIndexID() == index_id:
+            return pos
+
+    for pos in range(num_threads):
+        if process.GetThreadAtIndex(pos).GetIndexID() == index_id:
+            return pos
+    return None
+
+
+# Stop reasons of the thread that brought a process (or core) down
+CRASH_STOP_REASONS = (lldb.eStopReasonSignal, lldb.eStopReasonException)
+
+
+def crashing_thread(process):
+    """ Returns the first thread that stopped with a signal or an exception, or the
+        selected thread if there is none.
+    """
+    for thread in process:
+        if thread.GetStopReason() in CRASH_STOP_REASONS:
+            return thread
+    return process.GetSelectedThread()
+
+
+def unique_stacks(process, depth):
+    """ Groups the threads of process whose first depth frames have the same PCs.
+        Returns [(thread, [index IDs])] with the first thread of each group, largest
+        group first.
+    """
+    groups = {}
+    for thread in process:
+        pcs = []
+        for i in range(depth):
+            frame = thread.GetFrameAtIndex(i)
+            if not frame.IsValid():
+                break
+            pcs.append(frame.GetPC())
+        key = tuple(pcs)
+        if key in groups:
+            groups[key][1].append(thread.GetIndexID())
+        else:
+            groups[key] = (thread, [thread.GetIndexID()])
+    # sorted() is stable: groups of the same size stay in thread order
+    return sorted(groups.values(), key=lambda g: -len(g[1]))
+
+
+def frame_modules(thread, depth):
+    """ Returns the SBModules of the first depth frames of thread, without duplicates """
+    modules = []
+    seen = set()
+    for i in range(depth):
+        frame = thread.GetFrameAtIndex(i)
+        if not frame.IsValid():
+            break
+        module = frame.GetModule()
+        if not module.IsValid():
+            continue
+        key = (module.GetFileSpec().GetFilename(), module.GetUUIDString())
+        if key not in seen:
+            seen.add(key)
+            modules.append(module)
+    return modules
+
+
+class StackPattern(object):
+    """ A search of the stacks: regular expressions of function names separated by
+        " under ", innermost first. "lock under Cache::get" finds the threads with a
+        frame in a function matching "lock" called (maybe indirectly) from one
+        matching "Cache::get".
+    """
+
+    SEPARATOR = " under "
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.parts = [re.compile(p.strip()) for p in pattern.split(StackPattern.SEPARATOR)]
+
+
+class StackIndex(object):
+    """ The functions on the stacks of all the threads of a process at one stop: for
+        each function name, the threads it is on and at which depths. It is built
+        the first time it is searched at a stop, by unwinding every thread once;
+        the searches that follow only match the names.
+    """
+
+    # Frames of each thread that are indexed (runaway recursion is cut there)
+    maxFrames = 1024
+
+    def __init__(self):
+        # (process ID, stop ID) the index was built for
+        self.key = None
+        # { function --> { thread index ID --> [depth, ...] } }
+        self.functions = {}
+        # { thread index ID --> position (for SBProcess.GetThreadAtIndex) }
+        self.positions = {}
+
+    def update(self, process):
+        """ Builds the index, unless it holds the current stop of process """
+        key = stop_key(process)
+        if key == self.key:
+            return
+        self.functions = {}
+        self.positions = {}
+        for pos in range(process.GetNumThreads()):
+            thread = process.GetThreadAtIndex(pos)
+            tid = thread.GetIndexID()
+            self.positions[tid] = pos
+            for depth in range(self.maxFrames):
+                frame = thread.GetFrameAtIndex(depth)
+                if not frame.IsValid():
+                    break
+                name = frame.GetFunctionName()
+                if name:
+                    self.functions.setdefault(name, {}).setdefault(tid, []).append(depth)
+        self.key = key
+
+    def find(self, process, query):
+        """ Returns { thread index ID --> [depth, ...] } of the threads that match
+            query (a StackPattern): the depths of the innermost frames that match
+            each of its parts, each one deeper than the one before.
+        """
+        self.update(process)
+        found = []
+        for regex in query.parts:
+            depths = {}
+            for (name, threads) in self.functions.items():
+                if regex.search(name):
+                    for (tid, d) in threads.items():
+                        depths.setdefault(tid, []).extend(d)
+            found.append(depths)
+
+        ret = {}
+        for tid in found[0]:
+            chain = []
+            for depths in found:
+                deeper = [d for d in depths.get(tid, ()) if not chain or d > chain[-1]]
+                if len(deeper) == 0:
+                    break
+                chain.append(min(deeper))
+            else:
+                ret[tid] = chain
+        return ret
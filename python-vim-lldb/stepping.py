@@ -0,0 +1,76 @@
+#
+# Runs of steps (:Lnext 20, :Luntil), shared by the controller and the backend.
+#
+# The debugger is synchronous while they run, so each step returns once the
+# thread stopped. A run ends early when the process stops running, or when it
+# stops for anything but the end of the step: a breakpoint, a watchpoint, a
+# signal or an exception is where the user wants to look.
+#
+# Nothing in here touches Vim.
+#
+
+import os
+import re
+import lldb
+
+# Stop reasons of the selected thread when only its step completed
+STEP_STOP_REASONS = (lldb.eStopReasonPlanComplete, lldb.eStopReasonNone)
+
+
+def step_stop_reason(process):
+    """ Returns why process stopped after a step, if not only because the step
+        completed: its state if it is not stopped, or the stop description of the
+        selected thread. Returns None if the step completed.
+    """
+    state = process.GetState()
+    if state != lldb.eStateStopped:
+        return lldb.SBDebugger.StateAsCString(state)
+    thread = process.GetSelectedThread()
+    if thread.GetStopReason() not in STEP_STOP_REASONS:
+        return thread.GetStopDescription(256) or "stopped"
+    return None
+
+
+def run_steps(process, step, count, reached=None, interrupted=None):
+    """ Calls step(thread) on the selected thread of process count times (or until
+        it stops for another reason, if count is None), or until reached(thread)
+        or interrupted() is True. Returns (steps, why the run ended early or None).
+    """
+    steps = 0
+    try:
+        while count is None or steps < count:
+            step(process.GetSelectedThread())
+            steps += 1
+            why = step_stop_reason(process)
+            if why is not None:
+                return (steps, why)
+            if reached is not None and reached(process.GetSelectedThread()):
+                return (steps, "reached")
+            if interrupted is not None and interrupted():
+                return (steps, "interrupted")
+    except KeyboardInterrupt:
+        return (steps, "interrupted")
+    return (steps, None)
+
+
+def until_condition(args, errors):
+    """ Returns reached(thread) for :Luntil args: <line>, <file>:<line> or an
+        expression evaluated in the thread's frame #0. Errors of the expression are
+        appended to errors, and end the run.
+    """
+    m = re.match(r'^(?:(\S+):)?(\d+)$', args)
+    if m:
+        (fname, line) = (m.group(1), int(m.group(2)))
+
+        def reached(thread):
+            le = thread.GetFrameAtIndex(0).GetLineEntry()
+            return le.IsValid() and le.GetLine() == line and (
+                fname is None or le.GetFileSpec().GetFilename() == os.path.basename(fname))
+    else:
+        def reached(thread):
+            value = thread.GetFrameAtIndex(0).EvaluateExpression(args)
+            if value.GetError().Fail():
+                errors.append(value.GetError().GetCString())
+                return True
+            return value.GetValueAsUnsigned(0) != 0
+    return reached
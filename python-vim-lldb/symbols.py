@@ -0,0 +1,334 @@
+#
+# Work on a target's modules and their symbols that can run off Vim's main thread.
+#
+# Nothing in here touches Vim: objects are polled from the main thread (see
+# LLDBController.doPoll) to find out whether they are done.
+#
+
+import bisect
+import gzip
+import heapq
+import json
+import os
+import re
+import threading
+import time
+
+import lldb
+
+try:
+    from itertools import accumulate
+except ImportError:
+    # Python 2
+    def accumulate(values):
+        total = 0
+        for value in values:
+            total += value
+            yield total
+
+
+def module_key(module):
+    """ Returns a key identifying module: its UUID, or its path if it has none """
+    uuid = module.GetUUIDString()
+    if uuid:
+        return uuid
+    fs = module.GetFileSpec()
+    return "%s/%s" % (fs.GetDirectory(), fs.GetFilename())
+
+
+def load_module_symbols(module):
+    """ Forces the symbol table and debug info of module to be parsed """
+    module.GetNumSymbols()
+    module.GetNumCompileUnits()
+
+
+class SymbolPreloader(object):
+    """ Loads the symbols of every module of a target on a worker thread, skipping
+        the modules that were already loaded for display.
+    """
+
+    def __init__(self, target, skip=()):
+        self.target = target
+        self.skip = set(skip)
+        self.total = target.GetNumModules()
+        self.loaded = 0
+        self.done = False
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.run, name="vim-lldb symbol preloader")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            for i in range(self.total):
+                if self.cancelled:
+                    break
+                module = self.target.GetModuleAtIndex(i)
+                if module_key(module) not in self.skip:
+                    load_module_symbols(module)
+                self.loaded += 1
+        finally:
+            self.done = True
+
+
+class TargetLoader(object):
+    """ Creates a target on a worker thread. Creating a target parses the executable
+        (and, if requested, its dependent modules), which can take a long time for
+        large binaries. So can resolving breakpoints: the ones in the file breakpoints
+        (see SBTarget.BreakpointsWriteToFile), if given, are created there too.
+    """
+
+    def __init__(self, debugger, exe, load_dependent_modules=True, breakpoints=None):
+        self.debugger = debugger
+        self.exe = exe
+        self.loadDependentModules = load_dependent_modules
+        self.breakpointsFile = breakpoints
+        self.breakpoints = None
+        self.target = None
+        self.error = lldb.SBError()
+        self.breakpointsError = None
+        self.done = False
+        self.thread = threading.Thread(target=self.run, name="vim-lldb target loader")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        try:
+            self.target = self.debugger.CreateTarget(
+                self.exe, None, None, self.loadDependentModules, self.error)
+            if self.target and self.breakpointsFile is not None:
+                self.breakpoints = lldb.SBBreakpointList(self.target)
+                self.breakpointsError = self.target.BreakpointsCreateFromFile(
+                    lldb.SBFileSpec(self.breakpointsFile), self.breakpoints)
+        finally:
+            self.done = True
+
+
+# ----------------------------------------------------------------------
+# Symbol search (see :Lbfind)
+
+INDEX_VERSION = 1
+
+# Matching keys collected per module before ranking
+MAX_CANDIDATES = 2000
+
+# Characters of the blob scanned between two looks at the clock
+SCAN_CHUNK = 1 << 20
+
+
+def symbol_cache_dir():
+    """ Returns the directory where symbol indexes are cached between sessions """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'vim-lldb', 'symbols')
+
+
+def search_key(name):
+    """ Returns the part of a symbol name that searches look at: the name in lower case,
+        without the parameter list of a demangled function.
+    """
+    i = name.find('(')
+    if i > 0:
+        name = name[:i]
+    return name.lower()
+
+
+def fuzzy_pattern(query):
+    """ Compiles a pattern matching the lines of a "\n"-separated blob that contain the
+        characters of query in order. Each step only skips characters other than the one
+        it looks for, so the regexp never backtracks.
+    """
+    p = "\n"
+    for c in query:
+        c = re.escape(c)
+        p += "[^%s\n]*%s" % (c, c)
+    return re.compile(p)
+
+
+def read_module_symbols(module):
+    """ Returns ([name], [file address]) of the code symbols of module """
+    names = []
+    addresses = []
+    seen = set()
+    for i in range(module.GetNumSymbols()):
+        symbol = module.GetSymbolAtIndex(i)
+        if symbol.GetType() != lldb.eSymbolTypeCode:
+            continue
+        name = symbol.GetName()
+        address = symbol.GetStartAddress().GetFileAddress()
+        if not name or address == lldb.LLDB_INVALID_ADDRESS or (name, address) in seen:
+            continue
+        seen.add((name, address))
+        names.append(name)
+        addresses.append(address)
+    return (names, addresses)
+
+
+def load_cached_symbols(path):
+    """ Returns ([name], [file address]) from an index cache file, or None """
+    # gzip text modes are Python 3 only: decode the bytes
+    try:
+        with gzip.open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+    except (IOError, OSError, ValueError):
+        return None
+    if data.get('version') != INDEX_VERSION:
+        return None
+    return (data['names'], data['addresses'])
+
+
+def save_cached_symbols(path, names, addresses):
+    """ Writes an index cache file; failures only cost a rebuild next time """
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with gzip.open(tmp, 'wb') as f:
+            f.write(json.dumps({'version': INDEX_VERSION, 'names': names,
+                                'addresses': addresses}).encode('utf-8'))
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
+
+class SymbolIndex(object):
+    """ Searchable code symbols of one module. The distinct search keys are joined into
+        a single string so that substring and fuzzy matches are found by str.find and re,
+        which scan it in C; starts maps an offset back to a key, and symbols maps a key
+        to its symbols (overloads and template instances share a key).
+    """
+
+    def __init__(self, module, names, addresses):
+        self.module = module
+        self.names = names
+        self.addresses = addresses
+
+        groups = {}
+        for (i, name) in enumerate(names):
+            key = search_key(name)
+            if key in groups:
+                groups[key].append(i)
+            else:
+                groups[key] = [i]
+        self.symbols = list(groups.values())
+        self.blob = "\n" + "\n".join(groups)
+        # starts[k] is the offset of key k; starts[-1] is past the end
+        self.starts = list(accumulate([1] + [len(k) + 1 for k in groups]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def key_at(self, offset):
+        return bisect.bisect_right(self.starts, offset) - 1
+
+    def search(self, query, deadline):
+        """ Returns ({key: score}, complete). Substring matches score better than fuzzy
+            ones, and shorter keys better than longer ones. The search stops early at
+            MAX_CANDIDATES matching keys, or once time.time() passes deadline.
+        """
+        found = {}
+        starts = self.starts
+        pos = self.blob.find(query)
+        while pos >= 0:
+            k = self.key_at(pos)
+            found[k] = (0, starts[k + 1] - starts[k])
+            if len(found) >= MAX_CANDIDATES:
+                return (found, True)
+            pos = self.blob.find(query, starts[k + 1])
+        if len(query) < 2:
+            return (found, True)
+
+        pattern = fuzzy_pattern(query)
+        pos = 0
+        end = len(self.blob)
+        while pos < end:
+            if time.time() > deadline:
+                return (found, False)
+            chunk_end = self.blob.find("\n", pos + SCAN_CHUNK)
+            if chunk_end < 0:
+                chunk_end = end
+            for m in pattern.finditer(self.blob, pos, chunk_end):
+                k = self.key_at(m.start() + 1)
+                if k not in found:
+                    found[k] = (1, m.end() - m.start(), starts[k + 1] - starts[k])
+                    if len(found) >= MAX_CANDIDATES:
+                        return (found, True)
+            pos = chunk_end
+        return (found, True)
+
+
+def search_symbols(indexes, query, limit=30, budget=0.05):
+    """ Searches indexes for query and returns ([(SymbolIndex, symbol)], complete) with
+        at most limit best matches. Fuzzy matching gives up after budget seconds, in
+        which case complete is False.
+    """
+    query = query.lower()
+    deadline = time.time() + budget
+    matches = []
+    complete = True
+    for index in indexes:
+        (found, done) = index.search(query, deadline)
+        complete = complete and done
+        matches.extend((score, index, k) for (k, score) in found.items())
+
+    ret = []
+    for (score, index, k) in heapq.nsmallest(limit, matches, key=lambda m: m[0]):
+        ret.extend((index, i) for i in index.symbols[k])
+    return (ret[:limit], complete)
+
+
+class SymbolIndexer(object):
+    """ Builds a SymbolIndex for each module of a target that is not in indexes yet, on
+        a worker thread. Indexes of modules with a UUID are cached in cache_dir.
+    """
+
+    def __init__(self, target, indexes, cache_dir=None):
+        self.indexes = indexes
+        self.cacheDir = cache_dir
+        self.modules = []
+        for i in range(target.GetNumModules()):
+            module = target.GetModuleAtIndex(i)
+            if module.IsValid() and module_key(module) not in indexes:
+                self.modules.append(module)
+        self.total = len(self.modules)
+        self.indexed = 0
+        self.done = False
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.run, name="vim-lldb symbol indexer")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            for module in self.modules:
+                if self.cancelled:
+                    break
+                self.indexes[module_key(module)] = self.index_module(module)
+                self.indexed += 1
+        finally:
+            self.done = True
+
+    def index_module(self, module):
+        uuid = module.GetUUIDString()
+        path = None
+        if uuid and self.cacheDir is not None:
+            path = os.path.join(self.cacheDir, "%s.json.gz" % uuid)
+            cached = load_cached_symbols(path)
+            if cached is not None:
+                return SymbolIndex(module, *cached)
+
+        (names, addresses) = read_module_symbols(module)
+        if path is not None:
+            save_cached_symbols(path, names, addresses)
+        return SymbolIndex(module, names, addresses)
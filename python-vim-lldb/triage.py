@@ -0,0 +1,202 @@
+#
+# Batch triage of core files (see :Ltriage).
+#
+#   python triage.py [-j N] [--exe FILE] [--locals a,b] [-o FILE] [--lldb DIR] CORE...
+#
+# Each core is opened by a worker process with its own SBDebugger; the crashing
+# thread's backtrace, stop reason and signal, general purpose registers and the
+# requested locals are written as one JSON line per core, in the order the cores
+# finish. Cores whose crashing stacks have the same signature (the module and
+# function of their first frames) are reported as duplicates of the first one.
+#
+# The workers only use the plugin's Vim-free helpers (stacks.py), so this runs
+# without an editor; :Ltriage runs it as a job and streams the lines into the
+# triage pane.
+#
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Frames of the crashing thread that are reported, and that make up its signature
+REPORT_FRAMES = 32
+SIGNATURE_FRAMES = 5
+
+debugger = None
+
+
+def start_worker(lldb_dir):
+    """ Pool initializer: each worker has its own debugger """
+    global debugger
+    if lldb_dir and lldb_dir not in sys.path:
+        sys.path.insert(0, lldb_dir)
+    import lldb
+    lldb.SBDebugger.Initialize()
+    debugger = lldb.SBDebugger.Create()
+    debugger.SetAsync(False)
+    # Only the symbols of the modules in the backtrace are parsed (LLDB 16+)
+    debugger.HandleCommand("settings set symbols.load-on-demand true")
+
+
+def stack_signature(frames):
+    """ Returns the signature of a stack: a hash of the module`function of its first
+        SIGNATURE_FRAMES frames, which does not depend on load addresses or lines
+    """
+    key = "\n".join("%s`%s" % (f["module"] or "?", f["function"] or "?")
+                    for f in frames[:SIGNATURE_FRAMES])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+def register_values(frame):
+    """ Returns { name: value } of the general purpose registers of frame """
+    for regs in frame.GetRegisters():
+        if "general" in (regs.GetName() or "").lower():
+            return dict((r.GetName(), r.GetValue()) for r in regs)
+    return {}
+
+
+def find_locals(thread, names, depth):
+    """ Returns { name: value } of the variables names, each from the first of the
+        first depth frames of thread that has it
+    """
+    values = {}
+    for i in range(depth):
+        frame = thread.GetFrameAtIndex(i)
+        if not frame.IsValid():
+            break
+        for name in names:
+            if name in values:
+                continue
+            value = frame.GetValueForVariablePath(name)
+            if value.IsValid() and value.GetError().Success():
+                text = value.GetSummary() or value.GetValue()
+                values[name] = {"frame": i, "value": "..." if text is None else text}
+    return values
+
+
+def triage_core(job):
+    """ Worker: returns the triage record of one core """
+    (core, exe, names) = job
+    import lldb
+    import stacks
+    start = time.time()
+    record = {"core": core}
+    err = lldb.SBError()
+    target = debugger.CreateTarget(exe or "", None, None, False, err)
+    try:
+        process = target.LoadCore(core, err) if target else None
+        if not target or process is None or not process.IsValid():
+            record["error"] = "unable to load core: %s" % str(err)
+            return record
+
+        thread = stacks.crashing_thread(process)
+        (frames, more) = stacks.thread_frames(thread, 0, REPORT_FRAMES)
+        record["thread"] = thread.GetIndexID()
+        record["reason"] = thread.GetStopDescription(256)
+        if thread.GetStopReason() == lldb.eStopReasonSignal:
+            signo = thread.GetStopReasonDataAtIndex(0)
+            record["signal"] = process.GetUnixSignals().GetSignalAsCString(signo) or signo
+        record["frames"] = [
+            {"pc": pc, "module": module, "function": function, "offset": offset,
+             "file": file, "line": line}
+            for (frame_id, pc, module, function, offset, file, line) in frames]
+        record["truncated"] = more
+        record["signature"] = stack_signature(record["frames"])
+        record["registers"] = register_values(thread.GetFrameAtIndex(0))
+        if len(names) > 0:
+            record["locals"] = find_locals(thread, names, REPORT_FRAMES)
+    except Exception as e:
+        record["error"] = "%s: %s" % (type(e).__name__, e)
+    finally:
+        debugger.DeleteTarget(target)
+        record["seconds"] = round(time.time() - start, 3)
+    return record
+
+
+def triage(cores, exe="", names=(), jobs=None, lldb_dir=None):
+    """ Triages cores in a pool of jobs workers and yields their records as they finish.
+        A record whose signature was seen before gets "duplicate_of", the first core
+        with it.
+    """
+    seen = {}
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(jobs or os.cpu_count(), start_worker, (lldb_dir,))
+    try:
+        for record in pool.imap_unordered(
+                triage_core, [(core, exe, list(names)) for core in cores]):
+            signature = record.get("signature")
+            if signature is not None:
+                if signature in seen:
+                    record["duplicate_of"] = seen[signature]
+                else:
+                    seen[signature] = record["core"]
+            yield record
+    finally:
+        pool.terminate()
+
+
+def format_record(record):
+    """ Returns the summary line of a triage record """
+    name = os.path.basename(record["core"])
+    if "error" in record:
+        return "%s: %s" % (name, record["error"])
+    frames = record["frames"]
+    where = "??"
+    if len(frames) > 0:
+        f = frames[0]
+        where = "%s`%s" % (f["module"] or "?", f["function"] or "???")
+        if f["file"] is not None:
+            where += " at %s:%d" % (f["file"], f["line"])
+    s = "%s: %s in %s [%s]" % (name, record.get("signal") or record["reason"] or "stopped",
+                               where, record["signature"])
+    if "duplicate_of" in record:
+        s += " = %s" % os.path.basename(record["duplicate_of"])
+    for (var, v) in sorted(record.get("locals", {}).items()):
+        s += " %s=%s" % (var, v["value"])
+    return s
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Triage core files in parallel.")
+    parser.add_argument('cores', nargs='+')
+    parser.add_argument('--exe', default="", help="executable of the cores")
+    parser.add_argument('--locals', default="",
+                        help="comma-separated variables to report from the crashing stack")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('-o', '--output', help="write JSON Lines here instead of stdout")
+    parser.add_argument('--summary', action='store_true',
+                        help="print a summary line per core instead of JSON")
+    parser.add_argument('--lldb', help="directory of the lldb Python module")
+    args = parser.parse_args()
+
+    if args.lldb:
+        sys.path.insert(0, args.lldb)
+    out = open(args.output, "w") if args.output else sys.stdout
+    names = [n for n in args.locals.split(",") if n]
+    start = time.time()
+    count = 0
+    signatures = set()
+    for record in triage(args.cores, args.exe, names, args.jobs, args.lldb):
+        count += 1
+        signatures.add(record.get("signature"))
+        if args.summary:
+            out.write(format_record(record) + "\n")
+        else:
+            out.write(json.dumps(record) + "\n")
+        out.flush()
+    sys.stderr.write("%d cores, %d distinct crashes in %.1f s\n" % (
+        count, len(signatures - set([None])), time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
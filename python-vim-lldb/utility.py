@@ -1,9 +1,85 @@
 from re import compile, VERBOSE
 
 # 7/8-bit C1 ANSI sequences
-ansi_escape = compile(
-    br'(?:\x1B[@-Z\\-_]|[\x80-\x9A\x9C-\x9F]|(?:\x1B\[|\x9B)[0-?]*[ -/]*[@-~])'
+ansi_escape_text = compile(
+    r'(?:\x1B[@-Z\\-_]|[\x80-\x9A\x9C-\x9F]|(?:\x1B\[|\x9B)[0-?]*[ -/]*[@-~])'
 )
 
-def escape_ansi(line):
-    return ansi_escape.sub(b'', bytes(line))
+# SGR (colour) sequences
+ansi_sgr = compile(r'(?:\x1B\[|\x9B)([0-9;]*)m')
+
+def is_plain(text):
+    """ Returns True if text is ASCII without ESC, so has no escape sequence. Encoding
+        is the fast check that works before Python 3.7 (str.isascii).
+    """
+    if '\x1b' in text:
+        return False
+    try:
+        text.encode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+def strip_ansi(text):
+    """ Returns text (a str) without ANSI escape sequences. Plain ASCII text, which is
+        what LLDB prints with use-color off, is returned as is without a regex pass.
+    """
+    if is_plain(text):
+        return text
+    return ansi_escape_text.sub('', text)
+
+def ansi_highlights(text):
+    """ Removes ANSI escape sequences from text and returns (lines, highlights), where
+        highlights is { group: [[line, byte column, byte length], ...] } for the text
+        that SGR sequences coloured. Foreground colours map to the groups lldb_ansi_30
+        to lldb_ansi_37 and lldb_ansi_90 to lldb_ansi_97, bold to lldb_ansi_1; other
+        attributes are dropped.
+    """
+    if is_plain(text):
+        return (text.split('\n'), {})
+
+    lines = []
+    highlights = {}
+    group = None
+    for (n, line) in enumerate(text.split('\n')):
+        pieces = []
+        col = 0
+        pos = 0
+        for m in ansi_escape_text.finditer(line):
+            piece = line[pos:m.start()]
+            pos = m.end()
+            if piece:
+                length = len(piece.encode('utf-8'))
+                if group is not None:
+                    highlights.setdefault(group, []).append([n + 1, col + 1, length])
+                pieces.append(piece)
+                col += length
+            sgr = ansi_sgr.match(m.group(0))
+            if sgr is None:
+                continue
+            for code in (sgr.group(1) or '0').split(';'):
+                code = int(code or '0')
+                if code in (0, 39):
+                    group = None
+                elif 30 <= code <= 37 or 90 <= code <= 97:
+                    group = 'lldb_ansi_%d' % code
+                elif code == 1 and group is None:
+                    group = 'lldb_ansi_1'
+        piece = line[pos:]
+        if piece:
+            if group is not None:
+                highlights.setdefault(group, []).append(
+                    [n + 1, col + 1, len(piece.encode('utf-8'))])
+            pieces.append(piece)
+        lines.append(''.join(pieces))
+    return (lines, highlights)
+
+
+def vim_string(s):
+    """ Returns a Vim string expression of s """
+    return "'%s'" % s.replace("'", "''")
+
+
+def vim_string_list(items):
+    """ Returns a Vim list expression of the strings in items """
+    return "[%s]" % ", ".join(vim_string(i) for i in items)
@@ -28,18 +28,36 @@
 # - get_selected_line()
 # to highlight a selected line and place the cursor there.
 #
+# Panes whose content only grows (like OutputPane) can override update()
+# and edit self.buffer in place instead of rewriting it.
+#
+# Panes that load their content lazily can implement:
+# - on_cursor_moved(target, controller, line)
+# which is called when the user moves the cursor inside the pane.
+#
+#
+# Panes whose lines can be selected (a frame, a thread) implement:
+# - line_selection(target, line)
+# which returns what line shows, ('frame', frame ID) or ('thread', thread index
+# ID), for <CR> to select it (see map_select). After a selection only the
+# panes with its kind in their dependsOn are redrawn.
+#
 #
 # FIXME: implement WatchlistPane to displayed watched expressions
-# FIXME: define interface for interactive panes, like catching enter
-#        presses to change selected frame/thread...
 #
 
 import lldb
 import vim
 
 from utility import *
+from output import OutputRing
+from profiling import profiler
 
+import os
+import re
+import stacks
 import sys
+import tempfile
 
 # ==============================================================
 # Get the description of an lldb object or None if not available
@@ -186,8 +204,8 @@ class PaneLayout(object):
         if not bufferName:
             bufferName = vim.current.buffer.name
 
-        for p in self.panes:
-            if bufferName is not None and bufferName.endswith(p):
+        for p in self.panes.values():
+            if bufferName is not None and bufferName == p.bufferName:
                 return True
         return False
 
@@ -217,6 +235,22 @@ class PaneLayout(object):
             if name in panes or len(panes) == 0:
                 self.panes[name].destroy()
 
+    def current_pane(self):
+        """ Returns the pane under the cursor, or None """
+        name = vim.current.buffer.name
+        if not name:
+            return None
+        for p in self.panes.values():
+            if name == p.bufferName and p.isPrepared():
+                return p
+        return None
+
+    def cursor_moved(self, target, controller):
+        """ Forwards a cursor movement to the pane under the cursor, if any """
+        p = self.current_pane()
+        if p is not None:
+            p.on_cursor_moved(target, controller, vim.current.window.cursor[0])
+
     def registerForUpdates(self, p):
         self.panes[p.name] = p
 
@@ -244,15 +278,35 @@ class VimPane(object):
     # list of defined highlights, so we avoid re-defining them
     highlightTypes = []
 
+    # What the content depends on of 'frame' and 'thread', the selected frame and
+    # thread: the pane is redrawn when the user selects another one
+    dependsOn = ()
+
+    # Vim colours of the groups that ANSI colour sequences are turned into
+    ANSI_COLOURS = ['Black', 'DarkRed', 'DarkGreen', 'DarkYellow', 'DarkBlue',
+                    'DarkMagenta', 'DarkCyan', 'LightGray']
+    ANSI_BRIGHT_COLOURS = ['DarkGray', 'Red', 'Green', 'Yellow', 'Blue',
+                           'Magenta', 'Cyan', 'White']
+
     def __init__(self, owner, name, open_below=False, height=3):
         self.owner = owner
         self.name = name
         self.buffer = None
+        # Full name of the buffer, once created: panes are told apart from the user's
+        # files by it, not by self.name, which may end the name of any file
+        self.bufferName = None
         self.maxHeight = 20
         self.openBelow = open_below
         self.height = height
         self.owner.registerForUpdates(self)
 
+        # With g:lldb_color, LLDB colours its output and panes show the colours
+        # (see define_ansi_highlights); otherwise escape sequences are stripped.
+        self.colors = int(vim.eval('s:lldb_color')) != 0
+        self.ansiHighlights = {}
+        if self.colors:
+            self.define_ansi_highlights()
+
     def isPrepared(self):
         """ check window is OK """
         if self.buffer is None or len(
@@ -293,6 +347,7 @@ class VimPane(object):
 
         # Save some parameters and reference to buffer
         self.buffer = vim.current.buffer
+        self.bufferName = self.buffer.name
         self.width = int(vim.eval("winwidth(0)"))
         self.height = int(vim.eval("winheight(0)"))
 
@@ -311,11 +366,16 @@ class VimPane(object):
         # Select pane
         goto_window(bufwinnr(self.name))
 
-        # Clean and update content, and apply any highlights.
-        self.clean()
-
-        if self.write(self.get_content(target, controller)):
-            self.apply_highlights()
+        # Update content, and apply any highlights. write() replaces the whole buffer,
+        # so it is not cleared first.
+        stage = "pane.%s." % self.name
+        with profiler.span(stage + "get_content"):
+            content = self.get_content(target, controller)
+        with profiler.span(stage + "write"):
+            written = self.write(content)
+        if written:
+            with profiler.span(stage + "apply_highlights"):
+                self.apply_highlights()
 
             cursor = self.get_selected_line()
             if cursor is None:
@@ -335,6 +395,22 @@ class VimPane(object):
 
         goto_previous_window()
 
+    def on_cursor_moved(self, target, controller, line):
+        """ Called when the user moves the cursor to line inside the pane.
+            Subclasses implement this to load content on demand.
+        """
+        pass
+
+    def map_select(self):
+        """ Makes <CR> in the pane select what is on the cursor line (see line_selection) """
+        vim.command("nnoremap <buffer> <silent> <CR> :pyx ctrl.doSelectLine()<CR>")
+
+    def line_selection(self, target, line):
+        """ Returns what <CR> on line selects: ('frame', frame ID), ('thread', thread
+            index ID) or None. Subclasses implement this.
+        """
+        return None
+
     def get_selected_line(self):
         """ Returns the line number to move the cursor to, or None to leave
             it where the user last left it.
@@ -344,6 +420,13 @@ class VimPane(object):
 
     def apply_highlights(self):
         """ Highlights each set of lines in  each highlight group """
+        if self.colors:
+            vim.command("call clearmatches()")
+            for (group, positions) in self.ansiHighlights.items():
+                # matchaddpos() takes at most 8 positions at a time
+                for i in range(0, len(positions), 8):
+                    vim.eval("matchaddpos('%s', %s)" % (group, positions[i:i + 8]))
+
         highlights = self.get_highlights()
         for highlightType in highlights:
             lines = highlights[highlightType]
@@ -367,16 +450,30 @@ class VimPane(object):
             (name, colour, colour))
         VimPane.highlightTypes.append(name)
 
+    def define_ansi_highlights(self):
+        """ Defines the groups that ansi_highlights() assigns coloured text to """
+        if 'lldb_ansi_1' in VimPane.highlightTypes:
+            return
+        vim.command("highlight default lldb_ansi_1 cterm=bold gui=bold")
+        for (base, colours) in ((30, VimPane.ANSI_COLOURS), (90, VimPane.ANSI_BRIGHT_COLOURS)):
+            for (i, colour) in enumerate(colours):
+                vim.command("highlight default lldb_ansi_%d ctermfg=%s guifg=%s" % (
+                    base + i, colour, colour))
+        VimPane.highlightTypes.append('lldb_ansi_1')
+
     def write(self, msg):
         """ replace buffer with msg"""
         self.prepare()
 
-        msg = escape_ansi(msg.encode("utf-8", "replace"))
-        msg = str(msg.decode("utf-8")).split('\n')
+        # Command output arrives decoded; in the common case (no colour) it goes to
+        # the buffer without any further copy or regex pass.
+        if self.colors:
+            (msg, self.ansiHighlights) = ansi_highlights(msg)
+        else:
+            msg = strip_ansi(msg).split('\n')
 
         try:
-            self.buffer.append(msg)
-            vim.command("execute \"normal ggdd\"")
+            self.buffer[:] = msg
         except vim.error:
             # cannot update window; happens when vim is exiting.
             return False
@@ -405,6 +502,8 @@ class VimPane(object):
 
 class FrameKeyValuePane(VimPane):
 
+    dependsOn = ('frame', 'thread')
+
     def __init__(self, owner, name, open_below):
         """ Initialize parent, define member variables, choose which highlight
             to use based on whether or not we have a gui (MacVim/Gvim).
@@ -416,6 +515,10 @@ class FrameKeyValuePane(VimPane):
         # variable_value } }
         self.frameValues = {}
 
+        # Registers and stack memory prefetched at this stop (see memory.StackCache),
+        # if the controller has them
+        self.stackCache = None
+
         if have_gui():
             self.changedHighlight = VimPane.CHANGED_VALUE_HIGHLIGHT_NAME_GUI
         else:
@@ -452,6 +555,9 @@ class FrameKeyValuePane(VimPane):
             frameOldValues = {}
 
         # Read the frame variables
+        cache = getattr(controller, 'stackCache', None)
+        self.stackCache = cache if cache is not None and cache.is_current(
+            target.GetProcess()) else None
         vals = self.get_frame_content(frame)
         for (key, value) in vals:
             lineNum += 1
@@ -490,6 +596,11 @@ class LocalsPane(FrameKeyValuePane):
 
     def format_variable(self, var):
         """ Returns a Tuple of strings "(Type) Name", "Value" for SBValue var """
+        if self.stackCache is not None:
+            # A scalar on the prefetched stack is formatted without reading memory
+            cached = self.stackCache.value(var)
+            if cached is not None:
+                var = cached
         val = var.GetValue()
         if val is None:
             # If the value is too big, SBValue.GetValue() returns None; replace
@@ -513,10 +624,8 @@ class RegistersPane(FrameKeyValuePane):
     def __init__(self, owner, name='registers'):
         FrameKeyValuePane.__init__(self, owner, name, open_below=True)
 
-    def format_register(self, reg):
-        """ Returns a tuple of strings ("name", "value") for SBRegister reg. """
-        name = reg.GetName()
-        val = reg.GetValue()
+    def format_register(self, name, val):
+        """ Returns a tuple of strings ("name", "value") for a register. """
         if val is None:
             val = "..."
         return (name, val.strip())
@@ -524,16 +633,20 @@ class RegistersPane(FrameKeyValuePane):
     def get_frame_content(self, frame):
         """ Returns a list of key-value pairs ("name", "value") of registers in frame """
 
-        # print("frame.getRegisters: %s"% frame.GetRegisters())
-        result = []
-        for register_sets in frame.GetRegisters():
-            # print("reg set: %s"% register_sets.GetName())
+        if self.stackCache is not None and self.stackCache.registers is not None and \
+                frame.GetFrameID() == 0:
+            register_sets = self.stackCache.registers
+        else:
+            register_sets = [(regs.GetName(), [(r.GetName(), r.GetValue()) for r in regs])
+                             for regs in frame.GetRegisters()]
 
+        result = []
+        for (set_name, registers) in register_sets:
             # hack the register group name into the list of registers...
-            result.append((" = = %s =" % register_sets.GetName(), ""))
+            result.append((" = = %s =" % set_name, ""))
 
-            for reg in register_sets:
-                result.append(self.format_register(reg))
+            for (name, val) in registers:
+                result.append(self.format_register(name, val))
         return result
 
 
@@ -543,6 +656,8 @@ class CommandPane(VimPane):
     def __init__(self, owner, name, open_below, process_required=True):
         VimPane.__init__(self, owner, name, open_below)
         self.process_required = process_required
+        self.command = None
+        self.args = ""
 
     def setCommand(self, command, args=""):
         self.command = command
@@ -578,14 +693,15 @@ class StoppedCommandPane(CommandPane):
 
     def get_content(self, target, controller):
         """ Returns the output of a command that relies on the process being stopped.
-            If the process is not in 'stopped' state, the process status is returned.
+            If the process is not in 'stopped' state, or the pane reads what it shows
+            through the SB API and has no command, the process status is returned.
         """
         output = ""
         if not target or not target.IsValid():
             output = VimPane.MSG_NO_TARGET
         elif not target.GetProcess() or not target.GetProcess().IsValid():
             output = VimPane.MSG_NO_PROCESS
-        elif target.GetProcess().GetState() == lldb.eStateStopped:
+        elif target.GetProcess().GetState() == lldb.eStateStopped and self.command:
             (success, output) = controller.getCommandOutput(
                 self.command, self.args)
         else:
@@ -613,6 +729,8 @@ class StoppedCommandPane(CommandPane):
 class DisassemblyPane(CommandPane):
     """ Pane that displays disassembly around PC """
 
+    dependsOn = ('frame', 'thread')
+
     def __init__(self, owner, name='disassembly'):
         CommandPane.__init__(self, owner, name, open_below=True)
 
@@ -621,47 +739,412 @@ class DisassemblyPane(CommandPane):
 
 
 class ThreadPane(StoppedCommandPane):
-    """ Pane that displays threads list """
+    """ Pane that displays the threads list. Threads are read through the SB API and
+        only the rows that fit in the window are formatted; more are loaded when the
+        cursor reaches the top or bottom of the pane. Threads can be filtered by
+        name, stop reason, function or the functions anywhere on their stack (see
+        set_filter.)
+    """
+
+    MSG_MORE_THREADS = "  ... (move the cursor here to load more threads)"
+
+    dependsOn = ('thread',)
+
+    # Fields that set_filter accepts, and how to read them from an SBThread
+    FILTERS = {
+        'name': lambda t: t.GetName(),
+        'reason': lambda t: t.GetStopDescription(256),
+        'function': lambda t: t.GetFrameAtIndex(0).GetFunctionName(),
+    }
+
+    # Filter on the whole stack, answered by stackIndex (pattern: a StackPattern)
+    STACK_FILTER = 'containing'
 
     def __init__(self, owner, name='threads'):
         StoppedCommandPane.__init__(self, owner, name, open_below=False)
-        self.setCommand("thread", "list")
-
-# FIXME: the function below assumes threads are listed in sequential order,
-#        which turns out to not be the case. Highlighting of selected thread
-#        will be disabled until this can be fixed. LLDB prints a '*' anyways
-#        beside the selected thread, so this is not too big of a problem.
-#  def get_selected_line(self):
-#    """ Place the cursor on the line with the selected entity.
-#        Subclasses should override this to customize selection.
-#        Formula: selected_line = selected_thread_id + 1
-#    """
-#    (thread, err) = get_selected_thread(self.target)
-#    if thread is None:
-#      return None
-#    else:
-#      return thread.GetIndexID() + 1
+
+        # (field, compiled regex) or None
+        self.filter = None
+
+        # Functions on the stacks of all threads, for the 'containing' filter
+        self.stackIndex = stacks.StackIndex()
+
+        # Positions (for GetThreadAtIndex) of threads that pass the filter, per stop
+        # (see stacks.stop_key)
+        self.stopKey = None
+        self.matches = None
+
+        # Rows currently in the buffer: positions [start, start + len(rows)) of the
+        # (filtered) thread list; rows[i] is the index ID of the thread on line i + 2
+        self.start = 0
+        self.rows = []
+        self.total = 0
+        self.shownStopKey = None
+        self.selectedPos = None
+        self.selectedLine = None
+
+    def set_filter(self, field=None, pattern=None):
+        """ Shows only threads whose field matches the regular expression pattern;
+            for 'containing', threads with pattern (see stacks.StackPattern) on their
+            stack. Calling with no field removes the filter.
+        """
+        if field is None:
+            self.filter = None
+        elif field == ThreadPane.STACK_FILTER:
+            self.filter = (field, stacks.StackPattern(pattern))
+        else:
+            self.filter = (field, re.compile(pattern))
+        self.matches = None
+        self.start = 0
+
+    def get_matches(self, process):
+        """ Returns positions of threads that pass the filter; cached until the next stop """
+        key = stacks.stop_key(process)
+        if self.matches is None or key != self.stopKey:
+            self.stopKey = key
+            (field, regex) = self.filter
+            if field == ThreadPane.STACK_FILTER:
+                found = self.stackIndex.find(process, regex)
+                # find() rebuilds the index, positions included, at a new stop
+                positions = self.stackIndex.positions
+                self.matches = sorted(positions[tid] for tid in found)
+                return self.matches
+            read = ThreadPane.FILTERS[field]
+            self.matches = []
+            for pos in range(process.GetNumThreads()):
+                value = read(process.GetThreadAtIndex(pos))
+                if value and regex.search(value):
+                    self.matches.append(pos)
+        return self.matches
+
+    def get_threads(self, process, start, count):
+        """ Returns the SBThreads at positions [start, start + count) of the (filtered) list """
+        if self.filter is None:
+            end = min(start + count, process.GetNumThreads())
+            return [process.GetThreadAtIndex(pos) for pos in range(start, end)]
+        return [process.GetThreadAtIndex(pos)
+                for pos in self.get_matches(process)[start:start + count]]
+
+    def get_selected_position(self, process, thread):
+        """ Returns the position of thread in the (filtered) list, or None """
+        if self.filter is None:
+            return stacks.thread_position(process, thread.GetIndexID(), self.selectedPos)
+        pos = stacks.thread_position(process, thread.GetIndexID())
+        matches = self.get_matches(process)
+        return matches.index(pos) if pos in matches else None
+
+    def format_rows(self, threads, selected_id):
+        """ Formats threads, recording their index IDs and the selected line """
+        lines = []
+        for t in threads:
+            tid = t.GetIndexID()
+            if tid == selected_id:
+                self.selectedLine = len(self.rows) + 2
+            self.rows.append(tid)
+            frame = t.GetFrameAtIndex(0)
+            record = stacks.frame_record(frame) if frame.IsValid() else None
+            lines.append(stacks.format_thread(t, tid == selected_id, record))
+        return lines
+
+    def format_header(self, process):
+        if len(self.rows) == 0:
+            header = "Process %d: no threads" % process.GetProcessID()
+        else:
+            header = "Process %d: threads %d-%d of %d" % (
+                process.GetProcessID(), self.start + 1, self.start + len(self.rows), self.total)
+        if self.filter is not None:
+            header += " (%s =~ /%s/)" % (self.filter[0], self.filter[1].pattern)
+        return header
+
+    def get_content(self, target, controller):
+        """ Returns a page of threads when the process is stopped, otherwise the
+            process status.
+        """
+        self.rows = []
+        self.selectedLine = None
+
+        if target is None or not target.IsValid() or \
+                target.GetProcess().GetState() != lldb.eStateStopped:
+            return StoppedCommandPane.get_content(self, target, controller)
+
+        process = target.GetProcess()
+        selected = process.GetSelectedThread()
+        page = max(self.window.height - 2, 1)
+        self.shownStopKey = stacks.stop_key(process)
+        self.total = len(self.get_matches(process)) if self.filter else process.GetNumThreads()
+
+        # Scroll so that the selected thread is visible
+        self.selectedPos = self.get_selected_position(process, selected)
+        pos = self.selectedPos
+        if pos is not None and not self.start <= pos < self.start + page:
+            self.start = max(pos - page // 2, 0)
+        self.start = max(min(self.start, self.total - page), 0)
+
+        lines = self.format_rows(self.get_threads(process, self.start, page),
+                                 selected.GetIndexID())
+        if self.start + len(self.rows) < self.total:
+            lines.append(ThreadPane.MSG_MORE_THREADS)
+        return "\n".join([self.format_header(process)] + lines)
+
+    def on_cursor_moved(self, target, controller, line):
+        """ Loads the previous page when the cursor is on the header, and the next
+            page when it is on the last line.
+        """
+        if len(self.rows) == 0 or target is None:
+            return
+        process = target.GetProcess()
+        if stacks.stop_key(process) != self.shownStopKey:
+            # The process moved on, or another one is selected; the next update redraws everything
+            return
+        page = max(self.window.height - 2, 1)
+        selected_id = process.GetSelectedThread().GetIndexID()
+
+        if line == len(self.buffer) and self.start + len(self.rows) < self.total:
+            lines = self.format_rows(
+                self.get_threads(process, self.start + len(self.rows), page), selected_id)
+            if self.start + len(self.rows) < self.total:
+                lines.append(ThreadPane.MSG_MORE_THREADS)
+            self.buffer[-1:] = lines
+        elif line == 1 and self.start > 0:
+            count = min(page, self.start)
+            self.start -= count
+            old_rows = self.rows
+            self.rows = []
+            self.selectedLine = None
+            lines = self.format_rows(self.get_threads(process, self.start, count), selected_id)
+            if self.selectedLine is None and selected_id in old_rows:
+                self.selectedLine = old_rows.index(selected_id) + len(self.rows) + 2
+            self.rows.extend(old_rows)
+            self.buffer[1:1] = lines
+            vim.current.window.cursor = (len(lines) + 1, 0)
+        else:
+            return
+
+        self.buffer[0] = self.format_header(process)
+        self.apply_highlights()
+
+    def on_create(self):
+        self.map_select()
+
+    def line_selection(self, target, line):
+        """ Returns ('thread', index ID) of the thread on line """
+        if stacks.stop_key(target.GetProcess()) != self.shownStopKey or \
+                not 2 <= line < len(self.rows) + 2:
+            return None
+        return ('thread', self.rows[line - 2])
+
+    def get_selected_line(self):
+        """ Returns the line number in the buffer with the selected thread. """
+        return self.selectedLine
 
 
 class BacktracePane(StoppedCommandPane):
-    """ Pane that displays backtrace """
+    """ Pane that displays the backtrace of the selected thread. Frames are read through
+        the SB API and only the first few are unwound; more are loaded when the cursor
+        reaches the bottom of the pane.
+    """
+
+    MSG_MORE_FRAMES = "  ... (move the cursor here to load more frames)"
+
+    dependsOn = ('frame', 'thread')
 
     def __init__(self, owner, name='backtrace'):
         StoppedCommandPane.__init__(self, owner, name, open_below=False)
-        self.setCommand("bt", "")
+
+        # Number of frames unwound at a time
+        self.depth = int(vim.eval('s:lldb_backtrace_depth'))
+
+        # Frame records of the current stop (see stacks.stop_key)
+        # { thread_index_id --> [records, has_more] }
+        self.stopKey = None
+        self.frameCache = {}
+
+        self.threadID = None
+        self.selectedLine = None
+
+    def get_frames(self, process, thread):
+        """ Returns the cached [records, has_more] entry for thread, unwinding the first
+            self.depth frames if the thread has not been seen since the process stopped.
+        """
+        key = stacks.stop_key(process)
+        if key != self.stopKey:
+            self.stopKey = key
+            self.frameCache = {}
+
+        tid = thread.GetIndexID()
+        if tid not in self.frameCache:
+            (records, has_more) = stacks.thread_frames(thread, 0, self.depth)
+            self.frameCache[tid] = [records, has_more]
+        return self.frameCache[tid]
+
+    def get_content(self, target, controller):
+        """ Returns the backtrace of the selected thread when the process is stopped,
+            otherwise the process status.
+        """
+        self.selectedLine = None
+        self.threadID = None
+
+        if target is None or not target.IsValid() or \
+                target.GetProcess().GetState() != lldb.eStateStopped:
+            return StoppedCommandPane.get_content(self, target, controller)
+
+        (thread, err) = get_selected_thread(target)
+        if thread is None:
+            return err
+
+        process = thread.GetProcess()
+        entry = self.get_frames(process, thread)
+        self.threadID = thread.GetIndexID()
+
+        # Make sure a frame selected below the unwound ones (frame select N) is shown
+        selected = thread.GetSelectedFrame().GetFrameID()
+        if selected >= len(entry[0]) and entry[1]:
+            (more, entry[1]) = stacks.thread_frames(
+                thread, len(entry[0]), selected + 1 - len(entry[0]))
+            entry[0].extend(more)
+
+        (records, has_more) = entry
+        lines = [stacks.format_thread(thread, True)]
+        for record in records:
+            if record[0] == selected:
+                self.selectedLine = len(lines) + 1
+            lines.append(stacks.format_frame(record, record[0] == selected))
+        if has_more:
+            lines.append(BacktracePane.MSG_MORE_FRAMES)
+        return "\n".join(lines)
+
+    def on_cursor_moved(self, target, controller, line):
+        """ Unwinds the next self.depth frames when the cursor reaches the last line """
+        if self.threadID is None or line < len(self.buffer):
+            return
+
+        (thread, err) = get_selected_thread(target)
+        if thread is None or thread.GetIndexID() != self.threadID:
+            return
+
+        entry = self.get_frames(thread.GetProcess(), thread)
+        (records, has_more) = entry
+        if not has_more:
+            return
+
+        (more, has_more) = stacks.thread_frames(thread, len(records), self.depth)
+        records.extend(more)
+        entry[1] = has_more
+
+        # Replace the "more frames" line in place so the cursor stays where it is
+        lines = [stacks.format_frame(r) for r in more]
+        if has_more:
+            lines.append(BacktracePane.MSG_MORE_FRAMES)
+        self.buffer[-1:] = lines
+
+    def on_create(self):
+        self.map_select()
+
+    def line_selection(self, target, line):
+        """ Returns ('frame', frame ID) of the frame on line """
+        (thread, err) = get_selected_thread(target)
+        if thread is None or thread.GetIndexID() != self.threadID:
+            return None
+        records = self.get_frames(thread.GetProcess(), thread)[0]
+        if not 2 <= line < len(records) + 2:
+            return None
+        return ('frame', records[line - 2][0])
 
     def get_selected_line(self):
-        """ Returns the line number in the buffer with the selected frame.
-            Formula: selected_line = selected_frame_id + 2
-            FIXME: the above formula hack does not work when the function return
-                   value is printed in the bt window; the wrong line is highlighted.
+        """ Returns the line number in the buffer with the selected frame. """
+        return self.selectedLine
+
+
+class StacksPane(StoppedCommandPane):
+    """ Pane that displays each distinct stack once: the threads are grouped by the
+        PCs of their first s:lldb_stacks_depth frames, largest group first, with the
+        number of threads and their IDs.
+    """
+
+    # Thread IDs listed in the header of a group
+    MAX_GROUP_IDS = 32
+
+    def __init__(self, owner, name='stacks'):
+        StoppedCommandPane.__init__(self, owner, name, open_below=False)
+
+        # Frames of each thread that are compared
+        self.depth = int(vim.eval('s:lldb_stacks_depth'))
+
+        # The lines of the last stop drawn (see stacks.stop_key), and the thread each
+        # line selects
+        self.stopKey = None
+        self.lines = []
+        self.lineThreads = []
+
+    def format_group(self, thread, ids):
+        """ Formats a group of threads with the same stack as thread """
+        shown = " ".join("#%d" % i for i in ids[:StacksPane.MAX_GROUP_IDS])
+        if len(ids) > StacksPane.MAX_GROUP_IDS:
+            shown += " ..."
+        lines = ["%d thread%s: %s" % (len(ids), "s" if len(ids) > 1 else "", shown)]
+        (records, has_more) = stacks.thread_frames(thread, 0, self.depth)
+        lines.extend(stacks.format_frame(r) for r in records)
+        if has_more:
+            lines.append("  ...")
+        return lines
+
+    def get_content(self, target, controller):
+        """ Returns the groups of threads with the same stack when the process is
+            stopped, otherwise the process status.
         """
+        if target is None or not target.IsValid() or \
+                target.GetProcess().GetState() != lldb.eStateStopped:
+            self.stopKey = None
+            self.lines = []
+            self.lineThreads = []
+            return StoppedCommandPane.get_content(self, target, controller)
+
+        process = target.GetProcess()
+        if stacks.stop_key(process) != self.stopKey:
+            groups = stacks.unique_stacks(process, self.depth)
+            self.lines = ["Process %d: %d threads, %d stacks" % (
+                process.GetProcessID(), process.GetNumThreads(), len(groups))]
+            self.lineThreads = [None]
+            for (thread, ids) in groups:
+                group = self.format_group(thread, ids)
+                self.lines.extend(group)
+                self.lineThreads.extend([ids[0]] * len(group))
+            self.stopKey = stacks.stop_key(process)
+        return "\n".join(self.lines)
 
-        (frame, err) = get_selected_frame(self.target)
-        if frame is None:
+    def on_create(self):
+        self.map_select()
+
+    def line_selection(self, target, line):
+        """ Returns ('thread', index ID) of the first thread of the group on line """
+        if stacks.stop_key(target.GetProcess()) != self.stopKey or \
+                not 1 <= line <= len(self.lineThreads) or self.lineThreads[line - 1] is None:
             return None
-        else:
-            return frame.GetFrameID() + 2
+        return ('thread', self.lineThreads[line - 1])
+
+
+class ProfilePane(VimPane):
+    """ Pane that shows the last :Lsample profile. Like the output pane it is only
+        redrawn by show(). The call tree is folded by indent.
+    """
+
+    def __init__(self, owner, name='profile'):
+        VimPane.__init__(self, owner, name, open_below=True)
+
+    def on_create(self):
+        vim.command("setlocal foldmethod=indent shiftwidth=2 foldlevel=4 nowrap")
+
+    def update(self, target, controller):
+        pass
+
+    def show(self, lines):
+        """ Replaces the contents of the pane with lines, and shows it """
+        self.prepare()
+        try:
+            self.buffer[:] = lines
+        except vim.error:
+            return
+        self.window.cursor = (1, 0)
 
 
 class BreakpointsPane(CommandPane):
@@ -675,3 +1158,104 @@ class BreakpointsPane(CommandPane):
             open_below=False,
             process_required=False)
         self.setCommand("breakpoint", "list")
+
+
+class OutputPane(VimPane):
+    """ Pane that shows what the inferior writes to stdout and stderr or, named 'log',
+        the messages of logpoint hits. The text is kept in a bounded OutputRing;
+        update() appends the lines that are new since the last update and deletes the
+        ones that fell out of the ring, instead of rewriting the buffer.
+    """
+
+    def __init__(self, owner, name='stdout'):
+        VimPane.__init__(self, owner, name, open_below=True)
+        self.ring = OutputRing(int(vim.eval('s:lldb_output_lines')),
+                               int(vim.eval('s:lldb_output_bytes')))
+        self.reset_shown()
+
+    def reset_shown(self):
+        # Line numbers of the ring shown in the buffer, and whether its last line
+        # is the ring's partial line
+        self.shownFirst = self.shownEnd = self.ring.first
+        self.shownPartial = ""
+
+    def on_create(self):
+        self.reset_shown()
+
+    def update(self, target, controller):
+        """ Brings the buffer up to date with the ring """
+        ring = self.ring
+        if not self.isPrepared() or (
+                (self.shownFirst, self.shownEnd, self.shownPartial) ==
+                (ring.first, ring.end, ring.partial)):
+            return
+
+        with profiler.span("pane.%s.write" % self.name):
+            follow = self.window.cursor[0] == len(self.buffer)
+            shown = self.shownEnd - self.shownFirst
+            dropped = ring.first - self.shownFirst
+            try:
+                if dropped >= shown:
+                    # Nothing shown survives (this includes an empty buffer, which
+                    # has one empty line): replace it all
+                    lines = ring.lines_from(ring.first)
+                    if ring.partial:
+                        lines.append(ring.partial)
+                    self.buffer[:] = lines
+                else:
+                    if self.shownPartial:
+                        del self.buffer[-1]
+                    if dropped > 0:
+                        del self.buffer[0:dropped]
+                    lines = ring.lines_from(self.shownEnd)
+                    if ring.partial:
+                        lines.append(ring.partial)
+                    if len(lines) > 0:
+                        self.buffer.append(lines)
+            except vim.error:
+                # cannot update window; happens when vim is exiting.
+                return
+
+            self.shownFirst = ring.first
+            self.shownEnd = ring.end
+            self.shownPartial = ring.partial
+            if follow:
+                self.window.cursor = (len(self.buffer), 0)
+
+
+class CommandOutputPane(VimPane):
+    """ Pane that shows the output of a command that is too long to echo. Unlike the
+        other panes it is not redrawn on update, only by show(). The buffer is written
+        in chunks of lines, and output beyond max_bytes is only written to a file.
+    """
+
+    CHUNK_LINES = 10000
+
+    def __init__(self, owner, name='output'):
+        VimPane.__init__(self, owner, name, open_below=True)
+        self.maxBytes = int(vim.eval('s:lldb_output_buffer_bytes'))
+
+    def update(self, target, controller):
+        pass
+
+    def show(self, title, text):
+        """ Replaces the contents of the pane with title and text, and shows it """
+        spill = None
+        if self.maxBytes > 0 and len(text) > self.maxBytes:
+            (fd, spill) = tempfile.mkstemp(prefix="vim-lldb-output-", suffix=".txt")
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            cut = text.rfind("\n", 0, self.maxBytes)
+            text = text[:cut if cut > 0 else self.maxBytes]
+
+        self.prepare()
+        lines = text.rstrip("\n").split("\n")
+        try:
+            self.buffer[:] = [title]
+            for i in range(0, len(lines), self.CHUNK_LINES):
+                self.buffer.append(lines[i:i + self.CHUNK_LINES])
+            if spill is not None:
+                self.buffer.append("-- truncated at %d bytes, see %s --" % (self.maxBytes, spill))
+        except vim.error:
+            return
+        self.window.cursor = (1, 0)
@@ -2,6 +2,7 @@
 # Classes responsible for drawing signs in the Vim user interface.
 
 import vim
+from profiling import profiled
 
 class VimSign(object):
     SIGN_TEXT_BREAKPOINT_RESOLVED = "B>"
@@ -22,8 +23,10 @@ class VimSign(object):
     # Map of {(sign_text, highlight_colour) --> sign_name}
     defined_signs = {}
 
-    def __init__(self, sign_text, buffer, line_number, highlight_name=SIGN_DEFAULT_NAME):
-        """ Define the sign and highlight (if applicable) and show the sign. """
+    def __init__(self, sign_text, buffer, line_number, highlight_name=SIGN_DEFAULT_NAME, place=True):
+        """ Define the sign and highlight (if applicable) and show the sign. With
+            place=False, the sign is shown later by place_signs.
+        """
 
         # Get the sign name, either by defining it, or looking it up in the map
         # of defined signs
@@ -33,8 +36,10 @@ class VimSign(object):
         else:
             name = VimSign.defined_signs[key]
 
-        self.show(name, buffer.number, line_number)
-        pass
+        if place:
+            self.show(name, buffer.number, line_number)
+        else:
+            self.command = self.place_command(name, buffer.number, line_number)
 
     def define(self, sign_text, highlight_name):
         """ Defines sign and highlight (if highlight_colour is not None). """
@@ -43,34 +48,48 @@ class VimSign(object):
         vim.command("sign define %s text=%s linehl=%s texthl=%s" %
                 (sign_name, sign_text, highlight_name, highlight_name))
 
-        VimSign.defined_signs[(sign_text, self.highlight_name)] = sign_name
+        VimSign.defined_signs[(sign_text, highlight_name)] = sign_name
         VimSign.name_id += 1
         return sign_name
 
-    def show(self, name, buffer_number, line_number):
+    def place_command(self, name, buffer_number, line_number):
+        """ Returns the command that shows the sign """
         self.id = VimSign.sign_id
         VimSign.sign_id += 1
-        vim.command("sign place %d name=%s line=%d buffer=%s" %
-                    (self.id, name, line_number, buffer_number))
-        pass
+        self.bufferNumber = buffer_number
+        return "sign place %d name=%s line=%d buffer=%s" % (
+            self.id, name, line_number, buffer_number)
 
+    @profiled("sign.place")
+    def show(self, name, buffer_number, line_number):
+        vim.command(self.place_command(name, buffer_number, line_number))
+
+    @profiled("sign.unplace")
     def hide(self):
         vim.command("sign unplace %d" % self.id)
         pass
 
 
+@profiled("sign.place_batch")
+def place_signs(signs):
+    """ Shows signs created with place=False, with a single Vim command """
+    if len(signs) > 0:
+        vim.command(" | ".join(s.command for s in signs))
+
+
 class BreakpointSign(VimSign):
 
-    def __init__(self, buffer, line_number, is_resolved):
+    def __init__(self, buffer, line_number, is_resolved, place=True):
         txt = VimSign.SIGN_TEXT_BREAKPOINT_RESOLVED if is_resolved else VimSign.SIGN_TEXT_BREAKPOINT_UNRESOLVED
-        super(BreakpointSign, self).__init__(txt, buffer, line_number, VimSign.SIGN_BREAKPOINT)
+        super(BreakpointSign, self).__init__(txt, buffer, line_number, VimSign.SIGN_BREAKPOINT, place)
 
 
 class PCSign(VimSign):
 
-    def __init__(self, buffer, line_number, is_selected_thread):
+    def __init__(self, buffer, line_number, is_selected_thread, place=True):
         super( PCSign, self).__init__(
             VimSign.SIGN_TEXT_PC,
             buffer,
             line_number,
-            VimSign.SIGN_PC_ACTIVE if is_selected_thread else VimSign.SIGN_PC_INACTIVE)
+            VimSign.SIGN_PC_ACTIVE if is_selected_thread else VimSign.SIGN_PC_INACTIVE,
+            place)
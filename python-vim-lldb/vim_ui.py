@@ -3,11 +3,15 @@
 
 from __future__ import print_function
 
+import collections
+import functools
 import os
 import re
 import sys
+import time
 import lldb
 import vim
+from profiling import profiled
 from vim_panes import *
 from vim_signs import *
 
@@ -19,6 +23,24 @@ def is_same_file(a, b):
     return a in b or b in a
 
 
+def location_source(loc):
+    """ Returns (file, line) of a breakpoint location, or None if its description
+        has no line number
+    """
+    desc = get_description(loc, lldb.eDescriptionLevelFull)
+    match = re.search('at\ ([^:]+):([\d]+)', desc)
+    if match is None:
+        return None
+    try:
+        return (match.group(1), int(match.group(2).strip()))
+    except ValueError as e:
+        sys.stderr.write(
+            "unable to parse breakpoint location line number: '%s'" %
+            match.group(2))
+        sys.stderr.write(str(e))
+        return None
+
+
 class UI:
 
     def __init__(self):
@@ -31,7 +53,8 @@ class UI:
             'locals',
             'threads',
             'registers',
-            'disassembly']
+            'disassembly',
+            'stdout']
 
         # map of tuples (filename, line) --> SBBreakpoint
         self.markedBreakpoints = {}
@@ -40,6 +63,15 @@ class UI:
         self.breakpointSigns = {}
         self.pcSigns = []
 
+        # Source locations of the latest update, so that a buffer shown later gets
+        # its signs without asking LLDB. By real path of the file:
+        #   breakpointIndex: path --> (file, [(line, resolved, SBBreakpoint)])
+        #   pcIndex: path --> (file, [(line, is_selected_thread)])
+        self.breakpointIndex = {}
+        self.pcIndex = {}
+        # True while an update places signs itself
+        self.placingSigns = False
+
         # Container for panes
         self.paneCol = PaneLayout()
 
@@ -50,6 +82,21 @@ class UI:
         self.localsPane = LocalsPane(self.paneCol)
         self.registersPane = RegistersPane(self.paneCol)
         self.breakPane = BreakpointsPane(self.paneCol)
+        self.outputPane = OutputPane(self.paneCol)
+        self.logPane = OutputPane(self.paneCol, 'log')
+        self.triagePane = OutputPane(self.paneCol, 'triage')
+        self.stacksPane = StacksPane(self.paneCol)
+        self.profilePane = ProfilePane(self.paneCol)
+        self.commandOutputPane = CommandOutputPane(self.paneCol)
+
+        # Seconds an update may spend redrawing before it leaves the rest to the poll
+        # timer (0: no limit), and the redraws of the latest update that are left:
+        # deque of (what is redrawn: 'pc', 'breakpoints' or a pane name, function),
+        # in the order they run
+        self.refreshBudget = int(vim.eval('s:lldb_refresh_budget')) / 1000.0
+        if int(vim.eval("has('timers')")) == 0:
+            self.refreshBudget = 0
+        self.pendingRefresh = collections.deque()
 
     def activate(self):
         """ Activate UI: display default set of panes """
@@ -69,6 +116,7 @@ class UI:
                     ret.append(b)
         return ret
 
+    @profiled("update_pc")
     def update_pc(self, process, buffers, goto_file):
         """ Place the PC sign on the PC location of each thread's selected frame """
 
@@ -77,12 +125,13 @@ class UI:
                 the PC sign should be placed for a thread.
             """
 
+            # Walk frames one at a time rather than asking for GetNumFrames(), which
+            # unwinds the whole stack (slow for runaway recursion)
             frame = thread.GetSelectedFrame()
-            frame_num = frame.GetFrameID()
             le = frame.GetLineEntry()
-            while not le.IsValid() and frame_num < thread.GetNumFrames():
-                frame_num += 1
-                le = thread.GetFrameAtIndex(frame_num).GetLineEntry()
+            while not le.IsValid() and frame.IsValid():
+                frame = thread.GetFrameAtIndex(frame.GetFrameID() + 1)
+                le = frame.GetLineEntry()
 
             if le.IsValid():
                 path = os.path.join(
@@ -110,6 +159,7 @@ class UI:
             vim.command(":vsp")
 
         # Show a PC marker for each thread
+        self.pcIndex = {}
         for thread in process:
             loc = GetPCSourceLocation(thread)
             if not loc:
@@ -121,6 +171,7 @@ class UI:
             (tid, fname, line, col) = loc
             buffers = self.get_user_buffers(fname)
             is_selected = thread.GetIndexID() == process.GetSelectedThread().GetIndexID()
+            self.add_to_index(self.pcIndex, fname, (line, is_selected))
             if len(buffers) == 1:
                 buf = buffers[0]
                 if buf != vim.current.buffer:
@@ -149,6 +200,7 @@ class UI:
                 elif move_cursor:
                     print("FIXME: not sure where to move cursor because %s != %s " % (vim.current.buffer.name, fname))
 
+    @profiled("update_breakpoints")
     def update_breakpoints(self, target, buffers):
         """ Decorates buffer with signs corresponding to breakpoints in target. """
 
@@ -162,16 +214,9 @@ class UI:
             numLocs = bp.GetNumLocations()
             for i in range(numLocs):
                 loc = bp.GetLocationAtIndex(i)
-                desc = get_description(loc, lldb.eDescriptionLevelFull)
-                match = re.search('at\ ([^:]+):([\d]+)', desc)
-                try:
-                    lineNum = int(match.group(2).strip())
-                    ret.append((loc.IsResolved(), match.group(1), lineNum))
-                except ValueError as e:
-                    sys.stderr.write(
-                        "unable to parse breakpoint location line number: '%s'" %
-                        match.group(2))
-                    sys.stderr.write(str(e))
+                source = location_source(loc)
+                if source is not None:
+                    ret.append((loc.IsResolved(),) + source)
 
             return ret
 
@@ -179,10 +224,11 @@ class UI:
             return
 
         needed_bps = {}
+        self.breakpointIndex = {}
         for bp_index in range(target.GetNumBreakpoints()):
             bp = target.GetBreakpointAtIndex(bp_index)
-            locations = GetBreakpointLocations(bp)
             for (is_resolved, file, line) in GetBreakpointLocations(bp):
+                self.add_to_index(self.breakpointIndex, file, (line, is_resolved, bp))
                 for buf in buffers:
                     if file in buf.name:
                         needed_bps[(buf, line, is_resolved)] = bp
@@ -208,23 +254,195 @@ class UI:
                 s = BreakpointSign(b, l, r)
                 self.breakpointSigns[(b, l, r)] = s
 
-    def update(self, target, status, controller, goto_file=False):
+    def add_to_index(self, index, file, entry):
+        """ Adds entry to the entries of file in a location index """
+        path = os.path.realpath(file)
+        if path not in index:
+            index[path] = (file, [])
+        index[path][1].append(entry)
+
+    def find_in_index(self, index, name):
+        """ Returns the entries of the file of buffer name in a location index """
+        found = index.get(os.path.realpath(name))
+        if found is not None:
+            return found[1]
+        # The file LLDB gave is not the path of the buffer (a relative path, say):
+        # match it the way the updates do
+        ret = []
+        for (file, entries) in index.values():
+            if file in name:
+                ret.extend(entries)
+        return ret
+
+    @profiled("ui.buffer_shown")
+    def buffer_shown(self, buffer):
+        """ Places the breakpoint and PC signs of buffer, just read or shown in a
+            window, from the locations of the latest update, with one Vim command
+        """
+        name = buffer.name
+        if self.placingSigns or not name or self.paneCol.contains(name):
+            return
+        signs = []
+        for (line, is_resolved, bp) in self.find_in_index(self.breakpointIndex, name):
+            key = (buffer, line, is_resolved)
+            if key in self.breakpointSigns:
+                continue
+            sign = BreakpointSign(buffer, line, is_resolved, False)
+            self.breakpointSigns[key] = sign
+            signs.append(sign)
+            if self.haveBreakpoint(name, line):
+                self.markedBreakpoints[(name, line)].append(bp)
+            else:
+                self.markedBreakpoints[(name, line)] = [bp]
+        if not any(s.bufferNumber == buffer.number for s in self.pcSigns):
+            for (line, is_selected) in self.find_in_index(self.pcIndex, name):
+                sign = PCSign(buffer, line, is_selected, False)
+                self.pcSigns.append(sign)
+                signs.append(sign)
+        place_signs(signs)
+
+    def show_cached_breakpoints(self, locations):
+        """ Places breakpoint signs at locations [(file, line, resolved)] saved by an
+            earlier session, before the target exists. The next update_breakpoints
+            with the target removes the ones that are no longer there.
+        """
+        buffers = self.get_user_buffers()
+        for (file, line, is_resolved) in locations:
+            for b in buffers:
+                if file in b.name and (b, line, is_resolved) not in self.breakpointSigns:
+                    self.breakpointSigns[(b, line, is_resolved)] = BreakpointSign(b, line, is_resolved)
+
+    def shown_panes(self):
+        """ Returns the names of the panes shown in a window """
+        return [name for (name, p) in self.paneCol.panes.items() if p.isPrepared()]
+
+    def update_signs(self, update, *args):
+        """ Runs update, which places signs itself: the buffers it opens on the way
+            are not for buffer_shown
+        """
+        self.placingSigns = True
+        try:
+            update(*args)
+        finally:
+            self.placingSigns = False
+
+    @profiled("ui.update")
+    def update(self, target, status, controller, goto_file=False, budget=None):
         """ Updates debugger info panels and breakpoint/pc marks and prints
             status to the vim status line. If goto_file is True, the user's
             cursor is moved to the source PC location in the selected frame.
-        """
-
-        self.paneCol.update(target, controller)
-        self.update_breakpoints(target, self.get_user_buffers())
 
+            The PC sign is placed first, then the breakpoint signs and the panes
+            shown in a window; panes that are hidden only take note of target.
+            Whatever does not fit in budget seconds (by default refreshBudget, 0
+            for no limit) is left to controller's poll timer, and is dropped if
+            another update comes first: holding :Lnext only draws the last stop.
+        """
+        process = None
         if target is not None and target.IsValid():
             process = target.GetProcess()
-            if process is not None and process.IsValid():
-                self.update_pc(process, self.get_user_buffers, goto_file)
+
+        steps = collections.deque()
+        if process is not None and process.IsValid():
+            steps.append(('pc', lambda: self.update_signs(
+                self.update_pc, process, self.get_user_buffers, goto_file)))
+        else:
+            self.pcIndex = {}
+        steps.append(('breakpoints', lambda: self.update_signs(
+            self.update_breakpoints, target, self.get_user_buffers())))
+        panes = list(self.paneCol.panes.values())
+        for pane in [p for p in panes if p.isPrepared()] + [p for p in panes if not p.isPrepared()]:
+            steps.append((pane.name, functools.partial(pane.update, target, controller)))
+        self.pendingRefresh = steps
+
+        self.refresh(controller, budget)
 
         if status is not None and len(status) > 0:
             print(status)
 
+    @profiled("ui.refresh")
+    def refresh(self, controller, budget=None):
+        """ Runs the redraws left by the last update until budget seconds have passed
+            or, after the first one, a key is typed (the next :Lnext, say). If some
+            are left, controller's poll timer calls this again. Returns True if there
+            are redraws left.
+        """
+        if budget is None:
+            budget = self.refreshBudget
+        start = time.time()
+        first = True
+        while len(self.pendingRefresh) > 0:
+            self.pendingRefresh.popleft()[1]()
+            if budget > 0 and len(self.pendingRefresh) > 0 and (
+                    time.time() - start >= budget or
+                    (first and vim.eval("getchar(1)") != '0')):
+                controller.startPolling()
+                return True
+            first = False
+        return False
+
+    def line_selection(self, target):
+        """ Returns what the cursor line of the pane under the cursor shows that can
+            be selected: ('frame', frame ID), ('thread', thread index ID) or None
+        """
+        pane = self.paneCol.current_pane()
+        if pane is None or target is None or not target.IsValid():
+            return None
+        return pane.line_selection(target, vim.current.window.cursor[0])
+
+    @profiled("ui.update_selection")
+    def update_selection(self, target, controller, selected):
+        """ Redraws the PC sign and the shown panes that depend on the selected frame
+            or thread (selected: 'frame' or 'thread'), within the refresh budget.
+            The redraws left by the last update are kept, after these. The cursor
+            stays in the current window.
+        """
+        process = target.GetProcess()
+        steps = collections.deque([('pc', lambda: self.update_signs(
+            self.update_pc, process, self.get_user_buffers, True))])
+        for pane in self.paneCol.panes.values():
+            if selected in pane.dependsOn and pane.isPrepared():
+                steps.append((pane.name, functools.partial(pane.update, target, controller)))
+        redrawn = set(name for (name, step) in steps)
+        steps.extend(s for s in self.pendingRefresh if s[0] not in redrawn)
+        self.pendingRefresh = steps
+
+        window = winnr()
+        self.refresh(controller)
+        goto_window(window)
+
+    def appendOutput(self, text):
+        """ Adds output of the inferior to the stdout pane; it is shown on the next update """
+        self.outputPane.ring.append(text)
+
+    def appendLog(self, messages):
+        """ Adds messages of logpoint hits to the log pane; they are shown on the next update """
+        self.logPane.ring.append("".join(m + "\n" for m in messages))
+
+    def appendTriage(self, line):
+        """ Adds a line to the triage pane and shows it """
+        self.triagePane.ring.append(line + "\n")
+        self.triagePane.update(None, None)
+
+    def showCommandOutput(self, title, output):
+        """ Shows output that is too long to echo in the output pane """
+        self.commandOutputPane.show(title, output)
+
+    def showProfile(self, lines):
+        """ Shows the report of a sampling profile in the profile pane """
+        self.profilePane.show(lines)
+
+    def update_output(self, target, controller):
+        """ Shows new output of the inferior and new logpoint messages without updating
+            the other panes
+        """
+        self.outputPane.update(target, controller)
+        self.logPane.update(target, controller)
+
+    def cursor_moved(self, target, controller):
+        """ Lets the pane under the cursor (if any) load more content """
+        self.paneCol.cursor_moved(target, controller)
+
     def haveBreakpoint(self, file, line):
         """ Returns True if we have a breakpoint at file:line, False otherwise  """
         return (file, line) in self.markedBreakpoints
@@ -247,6 +465,44 @@ class UI:
         self.paneCol.prepare([name])
         return True
 
+    def setThreadFilter(self, field=None, pattern=None):
+        """ Filters the threads pane by field (name, reason, function or containing),
+            or removes the filter if field is None. Returns False if the filter is
+            invalid.
+        """
+        if field is not None and field not in ThreadPane.FILTERS and \
+                field != ThreadPane.STACK_FILTER:
+            sys.stderr.write("unknown thread filter: %s" % field)
+            return False
+        try:
+            self.threadPane.set_filter(field, pattern)
+        except re.error as e:
+            sys.stderr.write("invalid pattern '%s': %s" % (pattern, str(e)))
+            return False
+        return True
+
+    def show_stack_matches(self, process, query):
+        """ Fills a new quickfix list with the frames of the threads that match query
+            (a StackPattern) on the threads pane's stack index, innermost match
+            first. Returns the number of threads.
+        """
+        found = self.threadPane.stackIndex.find(process, query)
+        positions = self.threadPane.stackIndex.positions
+        items = []
+        for tid in sorted(found, key=lambda t: positions[t]):
+            frame = process.GetThreadAtIndex(positions[tid]).GetFrameAtIndex(found[tid][0])
+            item = "'text': %s" % vim_string("thread #%d frame #%d: %s" % (
+                tid, found[tid][0], frame.GetFunctionName()))
+            le = frame.GetLineEntry()
+            if le.IsValid():
+                path = os.path.join(le.GetFileSpec().GetDirectory() or "",
+                                    le.GetFileSpec().GetFilename())
+                item += ", 'filename': %s, 'lnum': %d" % (vim_string(path), le.GetLine())
+            items.append("{%s}" % item)
+        vim.eval("setqflist([], ' ', {'title': %s, 'items': [%s]})" % (
+            vim_string(":Lthreads containing " + query.pattern), ", ".join(items)))
+        return len(found)
+
     def hideWindow(self, name):
         """ Hides window pane specified by name """
         if not self.paneCol.havePane(name):